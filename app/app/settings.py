@@ -79,13 +79,35 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# DB_POOL_SIZE > 0 switches to the pooled backend in core.db.postgresql,
+# connections then go back to the pool at the end of every request unless
+# DB_CONN_MAX_AGE keeps them in their thread.
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 0))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': (
+            'core.db.postgresql' if DB_POOL_SIZE
+            else 'django.db.backends.postgresql'
+        ),
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),    
+        'CONN_MAX_AGE': int(
+            os.environ.get('DB_CONN_MAX_AGE', 0 if DB_POOL_SIZE else 60)
+        ),
+        'POOL': {
+            'SIZE': DB_POOL_SIZE,
+            # Seconds to wait for a free connection.
+            'TIMEOUT': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            # Seconds before a connection is closed and replaced.
+            'MAX_LIFETIME': int(os.environ.get('DB_POOL_MAX_LIFETIME', 1800)),
+            # Idle seconds after which a connection is checked before reuse.
+            'CHECK_INTERVAL': int(
+                os.environ.get('DB_POOL_CHECK_INTERVAL', 30)
+            ),
+        },
     }
 }
 
@@ -143,8 +165,116 @@ AUTH_USER_MODEL = 'core.User'
 
 REST_FRAMEWORK = {
 'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+'DEFAULT_AUTHENTICATION_CLASSES': [
+    'user.authentication.CachedTokenAuthentication',
+],
+}
+
+# Seconds an authenticated token is trusted from the cache.
+AUTH_TOKEN_CACHE = {
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': int(os.environ.get('AUTH_TOKEN_CACHE_TIMEOUT', 60)),
 }
 
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True,
 }
+
+# Cache for rendered snippet html, BACKEND is 'lru' or 'django'.
+HIGHLIGHT_CACHE = {
+    'BACKEND': os.environ.get('HIGHLIGHT_CACHE_BACKEND', 'lru'),
+    'MAX_BYTES': int(
+        os.environ.get('HIGHLIGHT_CACHE_MAX_BYTES', 32 * 1024 * 1024)
+    ),
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': None,
+}
+
+# Render highlighted html in the highlight_worker command instead of
+# inside the request.
+HIGHLIGHT_ASYNC = os.environ.get('HIGHLIGHT_ASYNC', '0') == '1'
+
+# Seconds the snippet wait endpoint holds a request without and with the
+# most a timeout may ask for. Each wait holds a worker thread, so clients
+# should poll again rather than wait long.
+HIGHLIGHT_WAIT_DEFAULT = 2
+HIGHLIGHT_WAIT_MAX = 5
+# First and longest pause between two reads of the highlight status.
+HIGHLIGHT_WAIT_POLL = (0.05, 1)
+
+# Store complete html documents in Snippet.highlighted instead of only the
+# token markup, compact snippets use /api/snippet/styles/<style>.css.
+HIGHLIGHT_FULL_HTML = os.environ.get('HIGHLIGHT_FULL_HTML', '0') == '1'
+HIGHLIGHT_CSS_MAX_AGE = 60 * 60 * 24 * 365
+
+# Default and largest number of rows in a page of a list endpoint.
+PAGE_SIZE = int(os.environ.get('PAGE_SIZE', 100))
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 1000))
+
+# Serve the snippet, source code and tag endpoints through the async views
+# of snippet.async_views, which run the viewsets in a pool of
+# ASYNC_VIEW_THREADS threads (0 uses Django's single sync thread).
+ASYNC_VIEWS = os.environ.get('SERVER_MODE', 'wsgi') == 'asgi'
+ASYNC_VIEW_THREADS = int(os.environ.get('ASYNC_VIEW_THREADS', 8))
+
+# Per-user cache of list responses. Generations are kept in the cache, so
+# use a cache shared by all processes (Redis, Memcached) in production.
+LIST_CACHE = {
+    'ENABLED': os.environ.get('LIST_CACHE_ENABLED', '1') == '1',
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': int(os.environ.get('LIST_CACHE_TIMEOUT', 300)),
+}
+
+# Process pool size for highlighting bulk requests, 0 renders inline.
+HIGHLIGHT_BULK_PROCESSES = int(os.environ.get('HIGHLIGHT_BULK_PROCESSES', 0))
+# Largest number of items accepted by the snippet bulk endpoint.
+BULK_MAX_ITEMS = 500
+
+# Snippet image uploads. Larger files or dimensions are refused, images
+# wider than a thumbnail width get a thumbnail of that width, and WebP
+# copies are made when Pillow supports WebP. Variants are rendered on
+# THREADS threads, 0 renders them in the request thread.
+IMAGE_UPLOAD = {
+    'MAX_BYTES': int(os.environ.get('IMAGE_MAX_BYTES', 5 * 1024 * 1024)),
+    'MAX_WIDTH': 8000,
+    'MAX_HEIGHT': 8000,
+    'MAX_PIXELS': 24_000_000,
+    'FORMATS': ['JPEG', 'PNG', 'GIF', 'WEBP'],
+    'THUMBNAIL_WIDTHS': [320, 960],
+    'WEBP': True,
+    'QUALITY': 82,
+    'THREADS': int(os.environ.get('IMAGE_THREADS', 4)),
+}
+
+# PNG and SVG images of snippets, stored in DIRECTORY once rendered.
+# Renders run on PROCESSES processes (0 renders in the request thread),
+# at most MAX_PENDING per API process at a time; more requests, and
+# renders taking longer than TIMEOUT seconds, get a 503. Snippets longer
+# than MAX_LINES are refused.
+RENDER_IMAGE = {
+    'DIRECTORY': os.environ.get('RENDER_IMAGE_DIR', '/vol/web/renders'),
+    'PROCESSES': int(os.environ.get('RENDER_IMAGE_PROCESSES', 2)),
+    'MAX_PENDING': int(os.environ.get('RENDER_IMAGE_MAX_PENDING', 4)),
+    'TIMEOUT': 10,
+    'MAX_LINES': 2000,
+    'FONT_SIZE': 14,
+    'MAX_AGE': int(os.environ.get('RENDER_IMAGE_MAX_AGE', 60 * 60 * 24)),
+    # Limits applied by `manage.py prune_renders`: images not requested
+    # for STORE_MAX_AGE seconds are deleted, then the least recently
+    # requested ones until the directory holds STORE_MAX_BYTES.
+    'STORE_MAX_BYTES': int(
+        os.environ.get('RENDER_IMAGE_STORE_MAX_BYTES', 512 * 1024 * 1024)
+    ),
+    'STORE_MAX_AGE': int(
+        os.environ.get('RENDER_IMAGE_STORE_MAX_AGE', 60 * 60 * 24 * 30)
+    ),
+}
+
+# Rows fetched per server-side cursor round trip when exporting.
+EXPORT_CHUNK_SIZE = 1000
+
+# Items written per transaction when importing archives.
+IMPORT_BATCH_SIZE = 500
+# Largest source file read from a zip archive, in bytes.
+IMPORT_MAX_FILE_SIZE = 1024 * 1024
+IMPORT_MAX_REPORTED_ERRORS = 100
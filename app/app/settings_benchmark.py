@@ -0,0 +1,37 @@
+"""
+Settings for `manage.py benchmark`.
+
+BENCHMARK_DATABASE=sqlite (default) keeps the data in benchmark.sqlite3 in
+the working directory, BENCHMARK_DATABASE=postgres uses the DB_* variables
+of app.settings with the database named by BENCHMARK_DB_NAME.
+"""
+import os
+import tempfile
+
+from app.settings import *  # noqa: F401,F403
+from app.settings import DATABASES as BASE_DATABASES
+
+
+# `manage.py benchmark` refuses other settings unless given --force.
+BENCHMARK_SETTINGS = True
+
+DEBUG = False
+ALLOWED_HOSTS = ['testserver']
+
+if os.environ.get('BENCHMARK_DATABASE', 'sqlite') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.abspath('benchmark.sqlite3'),
+        },
+    }
+else:
+    DATABASES = {
+        'default': {
+            **BASE_DATABASES['default'],
+            'NAME': os.environ.get('BENCHMARK_DB_NAME', 'benchmark'),
+        },
+    }
+
+# Images uploaded by the benchmark do not end up with the real media.
+MEDIA_ROOT = os.path.join(tempfile.gettempdir(), 'snippet-benchmark-media')
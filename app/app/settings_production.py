@@ -0,0 +1,50 @@
+"""
+Production settings for app project.
+
+Select them with DJANGO_SETTINGS_MODULE=app.settings_production, everything
+not overridden here comes from app.settings.
+"""
+import os
+
+from app.settings import *  # noqa: F401,F403
+from app.settings import LIST_CACHE, REST_FRAMEWORK
+
+
+DEBUG = False
+
+SECRET_KEY = os.environ['DJANGO_SECRET_KEY']
+
+ALLOWED_HOSTS = [
+    host.strip()
+    for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',')
+    if host.strip()
+]
+
+# The proxy terminates TLS and serves /static/ from /vol/web.
+SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+
+# JSON only, the browsable API renders templates on every request.
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+}
+
+# Generations of the list cache and cached tokens must be seen by every
+# worker process, so they need a shared cache. Without one the list cache
+# is turned off and tokens are checked in the database on every request,
+# as a token revoked in one worker would stay cached in the others.
+if os.environ.get('MEMCACHED_LOCATION'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': os.environ['MEMCACHED_LOCATION'],
+        },
+    }
+else:
+    LIST_CACHE = {**LIST_CACHE, 'ENABLED': False}
+    REST_FRAMEWORK = {
+        **REST_FRAMEWORK,
+        'DEFAULT_AUTHENTICATION_CLASSES': [
+            'rest_framework.authentication.TokenAuthentication',
+        ],
+    }
@@ -10,7 +10,7 @@ from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
 
-from app.views import index
+from app.views import index, MetricsView
 
 urlpatterns = [
     path('', index),
@@ -21,6 +21,7 @@ urlpatterns = [
         SpectacularSwaggerView.as_view(url_name='api-schema'),
         name='api-docs',
     ),
+    path('api/metrics/', MetricsView.as_view(), name='metrics'),
     path('api/user/', include('user.urls')),
     path('api/snippet/', include('snippet.urls')),
 ]
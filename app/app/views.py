@@ -1,4 +1,11 @@
+from django.db import connections
 from django.http import HttpResponse
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.db.pool import pool_stats as db_pool_stats
+from snippet.highlight import get_highlight_cache, pool_stats
 
 
 def index(request):
@@ -9,6 +16,7 @@ def index(request):
     http://127.0.0.1:8000/admin/
     http://127.0.0.1:8000/api/schema/ [name='api-schema']
     http://127.0.0.1:8000/api/docs/ [name='api-docs']
+    http://127.0.0.1:8000/api/metrics/
     http://127.0.0.1:8000/api/user/
     http://127.0.0.1:8000/api/user/me
     http://127.0.0.1:8000/api/user/token
@@ -17,4 +25,25 @@ def index(request):
     http://127.0.0.1:8000/api/snippet/snippets
     http://127.0.0.1:8000/api/snippet/source_codes
     http://127.0.0.1:8000/api/snippet/tags
+    http://127.0.0.1:8000/api/snippet/styles/{style}.css
     </pre>''')
+
+
+class MetricsView(APIView):
+    """Report the cache and connection pool statistics of this process."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, format=None):
+        return Response({
+            'databases': {
+                alias: {
+                    'engine': connections[alias].settings_dict['ENGINE'],
+                    'conn_max_age':
+                        connections[alias].settings_dict['CONN_MAX_AGE'],
+                }
+                for alias in connections
+            },
+            'db_pools': db_pool_stats(),
+            'highlight_cache': get_highlight_cache().stats(),
+            'highlight_pools': pool_stats(),
+        })
@@ -56,3 +56,4 @@ admin.site.register(models.User, UserAdmin)
 admin.site.register(models.Snippet)
 admin.site.register(models.Tag)
 admin.site.register(models.SourceCode, SourceCodeAdmin)
+admin.site.register(models.HighlightJob)
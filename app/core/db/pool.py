@@ -0,0 +1,150 @@
+"""
+In-process pool of database connections.
+
+Django opens a connection per thread and closes it at the end of the request
+once CONN_MAX_AGE is over. The pooled backend (core.db.postgresql) returns
+those connections here instead, so the next request, in any thread of the
+process, reuses one without paying for the connection setup.
+"""
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """No connection became available in time."""
+
+
+class ConnectionPool:
+    """
+    Bounded pool of DB-API connections.
+    At most size connections are open at once, acquire() waits up to
+    timeout seconds for one. Connections older than max_lifetime seconds
+    are closed, idle ones are passed to check() before reuse once they
+    have been idle for check_interval seconds.
+    """
+
+    def __init__(self, size, timeout=10, max_lifetime=None,
+                 check_interval=30, check=None):
+        self.size = size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_interval = check_interval
+        self.check = check
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle = deque()
+        self._opened_at = {}
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        self.timeouts = 0
+
+    def _expired(self, connection, now):
+        opened_at = self._opened_at.get(id(connection), now)
+        return bool(self.max_lifetime) and \
+            now - opened_at >= self.max_lifetime
+
+    def _usable(self, connection, idle_since, now):
+        if getattr(connection, 'closed', False) or \
+                self._expired(connection, now):
+            return False
+        if self.check and now - idle_since >= self.check_interval:
+            try:
+                return self.check(connection)
+            except Exception:
+                return False
+        return True
+
+    def _discard(self, connection):
+        with self._lock:
+            self._opened_at.pop(id(connection), None)
+            self.discarded += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def acquire(self, connect):
+        """Return an idle connection, or one made by calling connect."""
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeout(
+                f'No database connection available in {self.timeout}s.'
+            )
+        try:
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    connection, idle_since = self._idle.pop()
+                if self._usable(connection, idle_since, time.monotonic()):
+                    with self._lock:
+                        self.reused += 1
+                    return connection
+                self._discard(connection)
+
+            connection = connect()
+            with self._lock:
+                self._opened_at[id(connection)] = time.monotonic()
+                self.created += 1
+            return connection
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection, reusable=True):
+        """Give back a connection from acquire(), closing it if needed."""
+        try:
+            now = time.monotonic()
+            if reusable and not self._expired(connection, now):
+                with self._lock:
+                    self._idle.append((connection, now))
+            else:
+                self._discard(connection)
+        finally:
+            self._slots.release()
+
+    def clear(self):
+        """Close every idle connection."""
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        for connection, _ in idle:
+            self._discard(connection)
+
+    def stats(self):
+        """Return the pool counters."""
+        with self._lock:
+            idle = len(self._idle)
+            return {
+                'size': self.size,
+                'open': len(self._opened_at),
+                'idle': idle,
+                'in_use': len(self._opened_at) - idle,
+                'created': self.created,
+                'reused': self.reused,
+                'discarded': self.discarded,
+                'timeouts': self.timeouts,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, options):
+    """Return the pool named key, creating it from options on first use."""
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(**options)
+        return pool
+
+
+def pool_stats():
+    """Return the stats of every pool of this process."""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {key: pool.stats() for key, pool in pools.items()}
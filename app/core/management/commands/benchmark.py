@@ -0,0 +1,80 @@
+"""
+Django command to benchmark the API endpoints.
+"""
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from snippet import benchmark
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the API."""
+
+    help = (
+        'Seed benchmark data and report latency, throughput and queries of '
+        'every API endpoint. Run it with --settings app.settings_benchmark '
+        'to keep the data out of the main database.'
+    )
+    refusal = (
+        'The benchmark creates users with known passwords and a staff '
+        'token, and clears every cache. Run it with --settings '
+        'app.settings_benchmark, or pass --force to use these settings.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2)
+        parser.add_argument('--snippets', type=int, default=2000,
+                            help='Snippets seeded per user.')
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Timed requests per endpoint.')
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--cache', action='store_true',
+                            help='Keep caches warm between requests.')
+        parser.add_argument('--only', nargs='+', metavar='ENDPOINT',
+                            help='Names of the endpoints to run.')
+        parser.add_argument('--output', '-o',
+                            help='Write the results as JSON to this file.')
+        parser.add_argument('--baseline',
+                            help='Results file to compare against.')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed p50 slowdown, 0.25 is 25%%.')
+        parser.add_argument('--force', action='store_true',
+                            help='Run without the benchmark settings.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if not (getattr(settings, 'BENCHMARK_SETTINGS', False) or
+                options['force']):
+            raise CommandError(self.refusal)
+        benchmark.seed(
+            users=options['users'],
+            snippets=options['snippets'],
+            stdout=self.stdout,
+        )
+        results = benchmark.run(
+            requests=options['requests'],
+            warmup=options['warmup'],
+            use_cache=options['cache'],
+            only=options['only'],
+            stdout=self.stdout,
+        )
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+                output.write('\n')
+
+        if options['baseline']:
+            with open(options['baseline']) as baseline_file:
+                baseline = json.load(baseline_file)
+            regressions = benchmark.compare(
+                results, baseline, options['tolerance'],
+            )
+            if regressions:
+                raise CommandError(
+                    'Regressions against the baseline:\n  ' +
+                    '\n  '.join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS('No regressions.'))
@@ -0,0 +1,147 @@
+"""
+Django command to benchmark the highlighting engine.
+"""
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.registry import LANGUAGE_CHOICES, STYLE_CHOICES
+from snippet import highlight_benchmark
+
+
+class Command(BaseCommand):
+    """Django command to benchmark highlighting."""
+
+    help = (
+        'Report lines/s, bytes/s and peak memory of highlighting every '
+        'language and style at growing sizes, with and without line '
+        'numbers, and flag lexers whose time grows faster than linearly. '
+        'Styles only change the output with --full, compact snippets '
+        'share one stylesheet per style.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--languages', nargs='+', metavar='LANGUAGE',
+                            help='Languages to run, all by default.')
+        parser.add_argument('--styles', nargs='+', metavar='STYLE',
+                            default=['default'],
+                            help='Styles to run, or "all".')
+        parser.add_argument('--sizes', nargs='+', type=int,
+                            default=[10, 100, 1000],
+                            help='Corpus sizes in lines, up to 100000.')
+        parser.add_argument('--linenos', choices=['both', 'on', 'off'],
+                            default='both')
+        parser.add_argument('--full', action='store_true',
+                            default=settings.HIGHLIGHT_FULL_HTML,
+                            help='Render full HTML documents.')
+        parser.add_argument('--corpus', nargs='+', metavar='PATH',
+                            help='Files or directories of real-world code, '
+                                 'run in the language of each file.')
+        parser.add_argument('--real-world', action='store_true',
+                            help='Add the stdlib and Django sources to the '
+                                 'corpora.')
+        parser.add_argument('--no-synthetic', action='store_true',
+                            help='Skip the synthetic corpus.')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Renders per size, the fastest counts.')
+        parser.add_argument('--timeout', type=float, default=10,
+                            help='Seconds a render may take.')
+        parser.add_argument('--no-memory', action='store_true',
+                            help='Skip the peak memory measurement.')
+        parser.add_argument('--max-exponent', type=float, default=1.5,
+                            help='Flag lexers whose time grows faster than '
+                                 'lines to this power.')
+        parser.add_argument('--min-lines-per-sec', type=int, default=1000,
+                            help='Flag lexers slower than this at the '
+                                 'largest size.')
+        parser.add_argument('--output', '-o',
+                            help='Write the results as JSON to this file.')
+        parser.add_argument('--fail-on-flags', action='store_true',
+                            help='Exit with an error if a lexer is flagged.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1.')
+        sizes = sorted(set(options['sizes']))
+        if sizes[0] < 1:
+            raise CommandError('Sizes must be positive.')
+
+        languages = options['languages'] or [
+            value for value, _ in LANGUAGE_CHOICES
+        ]
+        known = {value for value, _ in LANGUAGE_CHOICES}
+        unknown = set(languages) - known
+        if unknown:
+            raise CommandError(
+                'Unknown languages: ' + ', '.join(sorted(unknown))
+            )
+        styles = options['styles']
+        if styles == ['all']:
+            styles = [value for value, _ in STYLE_CHOICES]
+        linenos = {
+            'both': [False, True], 'on': [True], 'off': [False],
+        }[options['linenos']]
+
+        corpora = []
+        if not options['no_synthetic']:
+            lines = highlight_benchmark.synthetic_corpus(sizes[-1])
+            corpora.extend(
+                ('synthetic', lines, language) for language in languages
+            )
+        paths = list(options['corpus'] or [])
+        if options['real_world']:
+            paths.extend(highlight_benchmark.real_world_paths())
+        if paths:
+            found = highlight_benchmark.load_corpora(paths, sizes[-1])
+            corpora.extend(
+                ('real', lines, language)
+                for language, lines in sorted(found.items())
+                if language in known
+            )
+
+        cases = [
+            (corpus, lines, {
+                'language': language,
+                'style': style,
+                'linenos': table,
+                'full': options['full'],
+            })
+            for corpus, lines, language in corpora
+            for style in styles
+            for table in linenos
+        ]
+        self.stdout.write(
+            f'{len(cases)} series at {sizes} lines, '
+            f"repeat {options['repeat']}"
+        )
+        results = highlight_benchmark.run(
+            cases, sizes,
+            repeat=options['repeat'],
+            timeout=options['timeout'],
+            memory=not options['no_memory'],
+            max_exponent=options['max_exponent'],
+            min_lines_per_sec=options['min_lines_per_sec'],
+            stdout=self.stdout,
+        )
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+                output.write('\n')
+
+        flagged = results['flagged']
+        if not flagged:
+            self.stdout.write(self.style.SUCCESS('No lexer flagged.'))
+            return
+        report = '\n  '.join(
+            '{corpus}/{language}: {reasons}'.format(
+                reasons='; '.join(entry['reasons']), **entry,
+            )
+            for entry in flagged
+        )
+        message = f'{len(flagged)} series flagged:\n  {report}'
+        if options['fail_on_flags']:
+            raise CommandError(message)
+        self.stdout.write(self.style.WARNING(message))
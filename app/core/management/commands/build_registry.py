@@ -0,0 +1,21 @@
+"""
+Django command to regenerate the Pygments registry snapshot.
+"""
+from django.core.management.base import BaseCommand
+
+from core import registry
+
+
+class Command(BaseCommand):
+    """Django command to write core/registry_snapshot.json."""
+
+    help = 'Snapshot the installed Pygments languages and styles.'
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        snapshot = registry.write_snapshot()
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(snapshot['lexers'])} languages and "
+            f"{len(snapshot['styles'])} styles for Pygments "
+            f"{snapshot['pygments_version']}."
+        ))
@@ -0,0 +1,49 @@
+"""
+Django command to export the snippets of a user as NDJSON.
+"""
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from snippet.export import iter_gzip, iter_ndjson, iter_snippet_records
+
+
+class Command(BaseCommand):
+    """Django command to export a snippet library."""
+
+    help = 'Export the snippets of a user as newline delimited JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Email of the user to export.')
+        parser.add_argument(
+            '--output', '-o',
+            help='File to write to, defaults to standard output.',
+        )
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--chunk-size', type=int)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User {options['email']} does not exist.")
+
+        records = iter_snippet_records(user, options['chunk_size'])
+        stream = iter_ndjson(records)
+        if options['gzip']:
+            stream = iter_gzip(stream)
+
+        if options['output']:
+            output = open(options['output'], 'wb')
+        else:
+            output = sys.stdout.buffer
+        try:
+            for chunk in stream:
+                output.write(chunk)
+        finally:
+            if options['output']:
+                output.close()
+            else:
+                output.flush()
@@ -0,0 +1,66 @@
+"""
+Django command to warm, purge or inspect the snippet highlight cache.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Snippet
+from snippet.highlight import (
+    DjangoCacheBackend,
+    get_highlight_cache,
+    pool_stats,
+)
+
+
+class Command(BaseCommand):
+    """Django command to manage the highlight cache."""
+
+    help = (
+        'Warm, purge or show stats of the snippet highlight cache. Warm and '
+        'purge need the shared django backend (HIGHLIGHT_CACHE_BACKEND='
+        'django), the lru backend lives in each process. Stats are those of '
+        'this process.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['warm', 'purge', 'stats'])
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        cache = get_highlight_cache()
+        action = options['action']
+        if action != 'stats' and \
+                not isinstance(cache.backend, DjangoCacheBackend):
+            raise CommandError(
+                f'{type(cache.backend).__name__} is private to each process, '
+                f'{action} would not reach the API workers. Set '
+                'HIGHLIGHT_CACHE_BACKEND=django to share the cache.'
+            )
+
+        if action == 'purge':
+            cache.clear()
+            self.stdout.write(self.style.SUCCESS('Highlight cache purged.'))
+        elif action == 'warm':
+            snippets = Snippet.objects.filter(
+                source_code__isnull=False
+            ).select_related('source_code')
+            count = 0
+            for snippet in snippets.iterator():
+                cache.get_or_render(
+                    snippet.source_code.code,
+                    snippet.language_name,
+                    snippet.style,
+                    snippet.linenos,
+                    snippet.source_code.title,
+                )
+                count += 1
+            self.stdout.write(
+                self.style.SUCCESS(f'Highlight cache warmed ({count}).')
+            )
+
+        for name, value in cache.stats().items():
+            self.stdout.write(f'{name}: {value}')
+        for pool, stats in pool_stats().items():
+            self.stdout.write(
+                '{}: created {created}, reused {reused}, '
+                'keys {keys}'.format(pool, **stats)
+            )
@@ -0,0 +1,104 @@
+"""
+Django command to render queued snippet highlighting jobs.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import HighlightJob, Snippet
+from snippet.highlight import get_highlight_cache
+from snippet.listcache import invalidate_user
+
+
+class Command(BaseCommand):
+    """Django command to drain the highlight job table."""
+
+    help = 'Render pending snippet highlighting jobs on a process pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help='Size of the process pool, 0 renders in this process.',
+        )
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument(
+            '--sleep', type=float, default=1.0,
+            help='Seconds to wait when the queue is empty.',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit once the queue is empty.',
+        )
+
+    def _render_inputs(self, snippet):
+        """Return the render inputs of a snippet."""
+        source_code = snippet.source_code
+        return (
+            source_code.code if source_code else '',
+            snippet.language_name,
+            snippet.style,
+            snippet.linenos,
+            source_code.title if source_code else '',
+        )
+
+    def process_batch(self, executor, batch_size):
+        """Render one batch of jobs and return how many were handled."""
+        with transaction.atomic():
+            jobs = list(
+                HighlightJob.objects.select_for_update(
+                    skip_locked=True, of=('self',)
+                ).select_related(
+                    'snippet__source_code'
+                ).order_by('id')[:batch_size]
+            )
+            if not jobs:
+                return 0
+
+            inputs = [self._render_inputs(job.snippet) for job in jobs]
+            results = get_highlight_cache().render_many(inputs, executor)
+            for job, result in zip(jobs, results):
+                snippets = Snippet.objects.filter(id=job.snippet_id)
+                if isinstance(result, Exception):
+                    self.stderr.write(f'{job.snippet} failed: {result}')
+                    snippets.update(
+                        highlight_status=Snippet.HIGHLIGHT_FAILED,
+                        modified=timezone.now(),
+                    )
+                else:
+                    snippets.update(
+                        highlighted=result,
+                        highlight_status=Snippet.HIGHLIGHT_READY,
+                        modified=timezone.now(),
+                    )
+            HighlightJob.objects.filter(
+                id__in=[job.id for job in jobs]
+            ).delete()
+
+        # update() sends no signals, the lists of the owners still change.
+        for user_id in {job.snippet.user_id for job in jobs}:
+            invalidate_user(user_id)
+        return len(jobs)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        processes = options['processes']
+        executor = ProcessPoolExecutor(processes) if processes > 0 else None
+        self.stdout.write('Waiting for highlight jobs...')
+        try:
+            while True:
+                count = self.process_batch(executor, options['batch_size'])
+                if count:
+                    self.stdout.write(f'Rendered {count} snippets.')
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(options['sleep'])
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        self.stdout.write(self.style.SUCCESS('Highlight queue empty!'))
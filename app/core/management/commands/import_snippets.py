@@ -0,0 +1,40 @@
+"""
+Django command to import snippets from an NDJSON or zip archive.
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from snippet.importer import import_archive
+
+
+class Command(BaseCommand):
+    """Django command to import a snippet archive."""
+
+    help = 'Import snippets for a user from an NDJSON or zip archive.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Email of the importing user.')
+        parser.add_argument('path', help='NDJSON, NDJSON.gz or zip file.')
+        parser.add_argument('--batch-size', type=int)
+
+    def _progress(self, summary):
+        self.stdout.write(
+            'Processed {processed}, created {created}, '
+            'duplicates {duplicates}, failed {failed}'.format(**summary)
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"User {options['email']} does not exist.")
+
+        with open(options['path'], 'rb') as archive:
+            summary = import_archive(
+                user, archive, options['batch_size'], self._progress,
+            )
+
+        for error in summary['errors']:
+            self.stderr.write(f"{error['item']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS('Import finished!'))
@@ -0,0 +1,37 @@
+"""
+Django command to delete old rendered snippet images.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from snippet import render
+
+
+class Command(BaseCommand):
+    """Django command to bound the rendered image directory."""
+
+    help = (
+        'Delete rendered snippet images not requested for --max-age '
+        'seconds, then the least recently requested ones until the '
+        'directory holds at most --max-bytes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-bytes', type=int,
+            default=settings.RENDER_IMAGE['STORE_MAX_BYTES'],
+        )
+        parser.add_argument(
+            '--max-age', type=int,
+            default=settings.RENDER_IMAGE['STORE_MAX_AGE'],
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        deleted, freed = render.prune(
+            max_bytes=options['max_bytes'],
+            max_age=options['max_age'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} rendered images ({freed} bytes).'
+        ))
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.25 on 2026-10-16 20:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='snippet',
+            name='highlight_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='ready', max_length=7),
+        ),
+        migrations.CreateModel(
+            name='HighlightJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('snippet', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='core.snippet')),
+            ],
+        ),
+    ]
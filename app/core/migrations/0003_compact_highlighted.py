@@ -0,0 +1,66 @@
+# Rewrites snippet html to the compact token markup form, unless the
+# deployment keeps full html documents (HIGHLIGHT_FULL_HTML).
+
+from django.conf import settings
+from django.db import migrations
+from pygments import highlight
+from pygments.formatters.html import HtmlFormatter
+from pygments.lexers import get_lexer_by_name
+from pygments.util import ClassNotFound
+
+
+def _rewrite(apps, full):
+    Snippet = apps.get_model('core', 'Snippet')
+    snippets = Snippet.objects.select_related('source_code').only(
+        'id', 'language_name', 'style', 'linenos', 'highlighted',
+        'source_code__code', 'source_code__title',
+    )
+    batch = []
+    for snippet in snippets.iterator(chunk_size=500):
+        if not snippet.highlighted:
+            continue
+        source_code = snippet.source_code
+        title = source_code.title if source_code and full else ''
+        options = {'title': title} if title else {}
+        try:
+            formatter = HtmlFormatter(
+                style=snippet.style,
+                linenos='table' if snippet.linenos else False,
+                full=full,
+                **options
+            )
+            snippet.highlighted = highlight(
+                source_code.code if source_code else '',
+                get_lexer_by_name(snippet.language_name),
+                formatter,
+            )
+        except ClassNotFound:
+            continue
+        batch.append(snippet)
+        if len(batch) >= 500:
+            Snippet.objects.bulk_update(batch, ['highlighted'])
+            batch = []
+    Snippet.objects.bulk_update(batch, ['highlighted'])
+
+
+def to_compact(apps, schema_editor):
+    if settings.HIGHLIGHT_FULL_HTML:
+        return
+    _rewrite(apps, full=False)
+
+
+def to_full(apps, schema_editor):
+    if settings.HIGHLIGHT_FULL_HTML:
+        return
+    _rewrite(apps, full=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_snippet_highlight_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(to_compact, to_full),
+    ]
@@ -0,0 +1,42 @@
+# Search indexes for source codes, only created on PostgreSQL.
+
+from django.db import migrations
+
+
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(author, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(notes, '')), 'C')"
+)
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS core_sourcecode_search_gin '
+        f'ON core_sourcecode USING gin (({SEARCH_VECTOR_SQL}))'
+    )
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS core_sourcecode_code_trgm '
+        'ON core_sourcecode USING gin (code gin_trgm_ops)'
+    )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS core_sourcecode_search_gin')
+    schema_editor.execute('DROP INDEX IF EXISTS core_sourcecode_code_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_compact_highlighted'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
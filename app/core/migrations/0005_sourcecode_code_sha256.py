@@ -0,0 +1,45 @@
+# Generated by Django 3.2.25 on 2026-10-16 20:37
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def hash_codes(apps, schema_editor):
+    SourceCode = apps.get_model('core', 'SourceCode')
+    batch = []
+    for source_code in SourceCode.objects.only('id', 'code').iterator():
+        source_code.code_sha256 = hashlib.sha256(
+            source_code.code.encode('utf-8')
+        ).hexdigest()
+        batch.append(source_code)
+        if len(batch) >= 500:
+            SourceCode.objects.bulk_update(batch, ['code_sha256'])
+            batch = []
+    SourceCode.objects.bulk_update(batch, ['code_sha256'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_sourcecode_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sourcecode',
+            name='code_sha256',
+            field=models.CharField(default='', editable=False, max_length=64),
+            preserve_default=False,
+        ),
+        migrations.RunPython(hash_codes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='sourcecode',
+            name='code',
+            field=models.TextField(),
+        ),
+        migrations.AddConstraint(
+            model_name='sourcecode',
+            constraint=models.UniqueConstraint(fields=('user', 'code_sha256'), name='unique_user_code_sha256'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-16 21:02
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_sourcecode_code_sha256'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='snippet',
+            name='modified',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
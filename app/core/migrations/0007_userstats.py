@@ -0,0 +1,50 @@
+# Generated by Django 3.2.25 on 2026-10-16 21:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def count_rows(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserStats = apps.get_model('core', 'UserStats')
+    SourceCode = apps.get_model('core', 'SourceCode')
+    Snippet = apps.get_model('core', 'Snippet')
+    Tag = apps.get_model('core', 'Tag')
+    for user_id in User.objects.values_list('id', flat=True).iterator():
+        codes = SourceCode.objects.filter(user_id=user_id)
+        source_codes = codes.count()
+        UserStats.objects.create(
+            user_id=user_id,
+            source_codes=source_codes,
+            snippets=Snippet.objects.filter(user_id=user_id).count(),
+            tags=Tag.objects.filter(user_id=user_id).count(),
+            code_bytes=sum(
+                len(code.encode('utf-8'))
+                for code in codes.values_list('code', flat=True).iterator()
+            ),
+            last_title=source_codes,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0006_snippet_modified'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('source_codes', models.IntegerField(default=0)),
+                ('snippets', models.IntegerField(default=0)),
+                ('tags', models.IntegerField(default=0)),
+                ('code_bytes', models.BigIntegerField(default=0)),
+                ('last_title', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_rows, migrations.RunPython.noop),
+    ]
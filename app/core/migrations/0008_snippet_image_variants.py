@@ -0,0 +1,24 @@
+# Generated by Django 3.2.25 on 2026-10-16 21:23
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_userstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='snippet',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AlterField(
+            model_name='snippet',
+            name='image',
+            field=models.ImageField(null=True, storage=core.models.snippet_image_storage, upload_to=core.models.snippet_image_file_path),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.25 on 2026-10-16 21:48
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_snippet_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='list_version',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='lists_modified',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,7 +1,9 @@
+import hashlib
 import uuid
 import os
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models.fields.files import FieldFile
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
@@ -10,18 +12,33 @@ from django.contrib.auth.models import (
 from django.conf import settings
 from django.utils import timezone
 
-from pygments.lexers import get_all_lexers
-from pygments.styles import get_all_styles
+from core import registry
+from core.storage import ContentAddressedStorage
 
 
 def snippet_image_file_path(instance, filename):
-    """Generates fie path for new snippet image."""
-    ext = os.path.splitext(filename)[1]
-    filename = f'{uuid.uuid4()}{ext}'
+    """
+    Generates file path for new snippet image, named by the sha256 of its
+    content so identical uploads share one file.
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    image = getattr(instance, 'image', None)
+    if image and not image._committed:
+        digest = hashlib.sha256()
+        for chunk in image.chunks():
+            digest.update(chunk)
+        filename = f'{digest.hexdigest()}{ext}'
+    else:
+        filename = f'{uuid.uuid4()}{ext}'
 
     return os.path.join('uploads', 'snippet', filename)
 
 
+def snippet_image_storage():
+    """Return the storage of snippet images and their variants."""
+    return ContentAddressedStorage()
+
+
 class UserManager(BaseUserManager):
     """Manager for users."""
     def create_user(self, email, password=None, **extra_fields):
@@ -54,6 +71,69 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
 
 
+class DirtyFieldsMixin:
+    """
+    Remember the field values loaded from or saved to the database, so
+    save() on a stored instance writes only the fields that changed.
+    """
+
+    def _tracked_values(self, names=None):
+        """Return {field name: value} of the loaded concrete fields."""
+        values = {}
+        for field in self._meta.concrete_fields:
+            if field.primary_key or field.attname not in self.__dict__:
+                continue
+            if names is not None and field.name not in names and \
+                    field.attname not in names:
+                continue
+            value = self.__dict__[field.attname]
+            if isinstance(value, FieldFile):
+                # A file not stored yet is always a change.
+                value = value.name if value._committed else object()
+            values[field.name] = value
+        return values
+
+    def _snapshot(self, names=None):
+        loaded = getattr(self, '_loaded_values', None) or {}
+        if names is None:
+            loaded = {}
+        self._loaded_values = {**loaded, **self._tracked_values(names)}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self._snapshot(fields)
+
+    def get_dirty_fields(self):
+        """Return {field name: stored value} of the changed fields."""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return dict.fromkeys(self._tracked_values())
+        return {
+            name: loaded.get(name)
+            for name, value in self._tracked_values().items()
+            if name not in loaded or loaded[name] != value
+        }
+
+    def is_dirty(self, *names):
+        """Return whether any of the named fields changed."""
+        dirty = self.get_dirty_fields()
+        return any(name in dirty for name in names)
+
+    def save(self, *args, **kwargs):
+        if not args and kwargs.get('update_fields') is None and \
+                not kwargs.get('force_insert') and not self._state.adding \
+                and getattr(self, '_loaded_values', None) is not None:
+            kwargs['update_fields'] = list(self.get_dirty_fields())
+        super().save(*args, **kwargs)
+        self._snapshot(kwargs.get('update_fields'))
+
+
 class Tag(models.Model):
     """Tag for filtering snippets."""
     user = models.ForeignKey(
@@ -66,7 +146,7 @@ class Tag(models.Model):
         return self.name
 
 
-class SourceCode(models.Model):
+class SourceCode(DirtyFieldsMixin, models.Model):
     """Model to store detailed information for snippet source code."""
 
     todo_statuses = [
@@ -89,7 +169,8 @@ class SourceCode(models.Model):
 
     title = models.CharField(max_length=255, null=True, blank=True)
     author = models.CharField(max_length=255, default='Unknown')
-    code = models.TextField(unique=True)
+    code = models.TextField()
+    code_sha256 = models.CharField(max_length=64, editable=False)
     notes = models.TextField(default="Notes not added!")
     url = models.URLField(max_length=255, default="http://example.com")
     status = models.CharField(max_length=1, choices=todo_statuses, default='U')
@@ -99,36 +180,58 @@ class SourceCode(models.Model):
     created = models.DateTimeField()
     modified = models.DateTimeField()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'code_sha256'],
+                name='unique_user_code_sha256',
+            ),
+        ]
+
+    @staticmethod
+    def hash_code(code):
+        """Return the hex sha256 of code, used to dedupe source codes."""
+        return hashlib.sha256(code.encode('utf-8')).hexdigest()
+
     def settitle(self):
-        try:
-            row_no = SourceCode.objects.filter(user=self.user).count()
-            return f"title {row_no+1}"
-        except Exception:
-            return 'title 1'
+        return f"title {UserStats.reserve_titles(self.user_id)}"
 
-    def save(self, *args, **kwargs):
+    def set_computed_fields(self):
+        """Set the fields computed on save, also used before bulk_create."""
         if not self.id:
             self.created = timezone.now()
         self.modified = timezone.now()
 
         if not self.code:
             raise ValueError('code content is required')
+        self.code_sha256 = self.hash_code(self.code)
         if not self.title:
             self.title = self.settitle()
 
         self.count_updated = self.count_updated + 1
+
+    def save(self, *args, **kwargs):
+        self.set_computed_fields()
         super(SourceCode, self).save(*args, **kwargs)
 
     def __str__(self):
         return self.title
 
 
-class Snippet(models.Model):
+class Snippet(DirtyFieldsMixin, models.Model):
     """Model to stores snippets with various styles in html format."""
 
-    LEXERS = [item for item in get_all_lexers() if item[1]]
-    LANGUAGE_CHOICES = sorted([(item[1][0], item[0]) for item in LEXERS])
-    STYLE_CHOICES = sorted([(item, item) for item in get_all_styles()])
+    LANGUAGE_CHOICES = registry.LANGUAGE_CHOICES
+    STYLE_CHOICES = registry.STYLE_CHOICES
+
+    HIGHLIGHT_PENDING = 'pending'
+    HIGHLIGHT_READY = 'ready'
+    HIGHLIGHT_FAILED = 'failed'
+    highlight_statuses = [
+        (HIGHLIGHT_PENDING, 'Pending'),
+        (HIGHLIGHT_READY, 'Ready'),
+        (HIGHLIGHT_FAILED, 'Failed'),
+    ]
 
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -146,24 +249,142 @@ class Snippet(models.Model):
     )
     linenos = models.BooleanField(default=False)
     highlighted = models.TextField()
+    highlight_status = models.CharField(
+        max_length=7,
+        choices=highlight_statuses,
+        default=HIGHLIGHT_READY,
+    )
     source_code = models.OneToOneField(
         SourceCode,
         on_delete=models.CASCADE,
         null=True,
         blank=True
     )
-    image = models.ImageField(null=True, upload_to=snippet_image_file_path)
+    image = models.ImageField(
+        null=True,
+        upload_to=snippet_image_file_path,
+        storage=snippet_image_storage,
+    )
+    # Names of the thumbnails and WebP copies of image, by variant.
+    image_variants = models.JSONField(default=dict, blank=True)
     tags = models.ManyToManyField(Tag)
+    modified = models.DateTimeField(default=timezone.now)
 
     def save(self, *args, **kwargs):
-        lang_choice = self.language_name
-        style_choice = self.style
-        if not any(lang_choice in _tuple for _tuple in self.LANGUAGE_CHOICES):
+        if not registry.is_language(self.language_name):
             raise ValueError('Language not set correctly')
-        if not any(style_choice in _tuple for _tuple in self.STYLE_CHOICES):
+        if not registry.is_style(self.style):
             raise ValueError('Style not set correctly')
 
+        self.modified = timezone.now()
         super(Snippet, self).save(*args, **kwargs)
 
     def __str__(self):
         return f"snippet {self.id}"
+
+
+class HighlightJob(models.Model):
+    """Queued request to render the highlighted html of a snippet."""
+    snippet = models.OneToOneField(Snippet, on_delete=models.CASCADE)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"highlight job for {self.snippet}"
+
+
+class UserStats(models.Model):
+    """Counters of the rows of a user, kept current on every write."""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    source_codes = models.IntegerField(default=0)
+    snippets = models.IntegerField(default=0)
+    tags = models.IntegerField(default=0)
+    code_bytes = models.BigIntegerField(default=0)
+    # Last number used in the generated "title N" source code titles.
+    last_title = models.IntegerField(default=0)
+    # Bumped with any change to the rows of the user, validates list
+    # responses (see snippet.conditional.list_version).
+    list_version = models.BigIntegerField(default=0)
+    lists_modified = models.DateTimeField(default=timezone.now)
+
+    @staticmethod
+    def code_size(code):
+        """Return the size of code in bytes as counted in code_bytes."""
+        return len(code.encode('utf-8'))
+
+    @classmethod
+    def count_rows(cls, user_id):
+        """Return the counters of a user computed from their rows."""
+        codes = SourceCode.objects.filter(user_id=user_id).values_list(
+            'code', flat=True,
+        )
+        source_codes = SourceCode.objects.filter(user_id=user_id).count()
+        return {
+            'source_codes': source_codes,
+            'snippets': Snippet.objects.filter(user_id=user_id).count(),
+            'tags': Tag.objects.filter(user_id=user_id).count(),
+            'code_bytes': sum(
+                cls.code_size(code) for code in codes.iterator()
+            ),
+            'last_title': source_codes,
+        }
+
+    @classmethod
+    def for_user(cls, user_id):
+        """Return the stats of a user, counting their rows if missing."""
+        stats = cls.objects.filter(user_id=user_id).first()
+        if stats is None:
+            stats, _ = cls.objects.get_or_create(
+                user_id=user_id, defaults=cls.count_rows(user_id),
+            )
+        return stats
+
+    @classmethod
+    def adjust(cls, user_id, create=True, **deltas):
+        """
+        Add deltas to the counters of a user in one UPDATE. A missing row
+        is counted from the rows, which already include the change,
+        unless create is false.
+        """
+        deltas = {name: value for name, value in deltas.items() if value}
+        if not deltas:
+            return
+        updated = cls.objects.filter(user_id=user_id).update(**{
+            name: models.F(name) + value for name, value in deltas.items()
+        })
+        if not updated and create:
+            cls.for_user(user_id)
+
+    @classmethod
+    def touch(cls, user_id):
+        """Bump the list version of a user."""
+        cls.objects.filter(user_id=user_id).update(
+            list_version=models.F('list_version') + 1,
+            lists_modified=timezone.now(),
+        )
+
+    @classmethod
+    def reserve_titles(cls, user_id, count=1):
+        """Return the first of count new title numbers of a user."""
+        with transaction.atomic(savepoint=False):
+            # The UPDATE locks the row until the transaction ends, so
+            # concurrent writers never get the same numbers.
+            updated = cls.objects.filter(user_id=user_id).update(
+                last_title=models.F('last_title') + count,
+            )
+            if not updated:
+                cls.for_user(user_id)
+                cls.objects.filter(user_id=user_id).update(
+                    last_title=models.F('last_title') + count,
+                )
+            last_title = cls.objects.filter(user_id=user_id).values_list(
+                'last_title', flat=True,
+            ).get()
+        return last_title - count + 1
+
+    def __str__(self):
+        return f"stats of {self.user_id}"
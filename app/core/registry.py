@@ -0,0 +1,99 @@
+"""
+Registry of the Pygments languages and styles snippets can use.
+
+Walking the Pygments plugins and importing every style module is slow, so
+the tables are built once per process and, when registry_snapshot.json
+was generated for the installed Pygments version, loaded from that file.
+Run `manage.py build_registry` after upgrading Pygments or adding plugins.
+"""
+import json
+import os
+
+import pygments
+
+
+SNAPSHOT_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'registry_snapshot.json'
+)
+
+
+def build_snapshot():
+    """Return the registry tables read from Pygments."""
+    from pygments.lexers import get_all_lexers
+    from pygments.styles import get_all_styles
+
+    return {
+        'pygments_version': pygments.__version__,
+        'lexers': sorted(
+            [name, list(aliases)]
+            for name, aliases, _, _ in get_all_lexers() if aliases
+        ),
+        'styles': sorted(get_all_styles()),
+    }
+
+
+def write_snapshot(path=SNAPSHOT_PATH):
+    """Write a snapshot for the installed Pygments version."""
+    snapshot = build_snapshot()
+    lexers = ',\n'.join(json.dumps(lexer) for lexer in snapshot['lexers'])
+    with open(path, 'w') as snapshot_file:
+        snapshot_file.write(
+            '{\n'
+            f'"pygments_version": {json.dumps(snapshot["pygments_version"])},'
+            f'\n"styles": {json.dumps(snapshot["styles"])},'
+            f'\n"lexers": [\n{lexers}\n]\n}}\n'
+        )
+    return snapshot
+
+
+def load_snapshot(path=SNAPSHOT_PATH):
+    """Return the snapshot at path if it matches the installed Pygments."""
+    try:
+        with open(path) as snapshot_file:
+            snapshot = json.load(snapshot_file)
+    except (OSError, ValueError):
+        return None
+    if snapshot.get('pygments_version') != pygments.__version__:
+        return None
+    return snapshot
+
+
+_snapshot = load_snapshot() or build_snapshot()
+
+LANGUAGE_CHOICES = sorted(
+    (aliases[0], name) for name, aliases in _snapshot['lexers']
+)
+STYLE_CHOICES = [(style, style) for style in _snapshot['styles']]
+
+# Values accepted by Snippet.save, as in the (value, label) choices.
+LANGUAGE_VALUES = frozenset(
+    value for choice in LANGUAGE_CHOICES for value in choice
+)
+STYLE_NAMES = frozenset(_snapshot['styles'])
+
+
+def _build_aliases(lexers):
+    """Map every lower cased alias and language name to its first alias."""
+    aliases = {}
+    for name, lexer_aliases in lexers:
+        for alias in lexer_aliases + [name]:
+            aliases.setdefault(alias.lower(), lexer_aliases[0])
+    return aliases
+
+
+LANGUAGE_ALIASES = _build_aliases(_snapshot['lexers'])
+
+
+def is_language(value):
+    """Return True if value is a language choice value or label."""
+    return value in LANGUAGE_VALUES
+
+
+def is_style(value):
+    """Return True if value is a style name."""
+    return value in STYLE_NAMES
+
+
+def resolve_language(value):
+    """Return the canonical language alias for value, or None."""
+    return LANGUAGE_ALIASES.get((value or '').lower())
@@ -0,0 +1,66 @@
+"""
+Signal handlers keeping the per-user stats current.
+Bulk writes send no signals and adjust the stats themselves.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import Snippet, SourceCode, Tag, UserStats
+
+
+@receiver(post_save, sender=get_user_model())
+def create_stats(sender, instance, created, raw=False, **kwargs):
+    """Start the stats of a new user at zero."""
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=SourceCode)
+def count_saved_source_code(sender, instance, created, raw=False,
+                            **kwargs):
+    """Count a new source code, or the size change of its code."""
+    if raw:
+        return
+    if created:
+        UserStats.adjust(
+            instance.user_id, source_codes=1,
+            code_bytes=UserStats.code_size(instance.code),
+        )
+        return
+    old_code = instance.get_dirty_fields().get('code')
+    if old_code is not None:
+        UserStats.adjust(
+            instance.user_id,
+            code_bytes=(
+                UserStats.code_size(instance.code) -
+                UserStats.code_size(old_code)
+            ),
+        )
+
+
+@receiver(post_save, sender=Snippet)
+@receiver(post_save, sender=Tag)
+def count_saved_row(sender, instance, created, raw=False, **kwargs):
+    """Count a new snippet or tag."""
+    if created and not raw:
+        field = 'snippets' if sender is Snippet else 'tags'
+        UserStats.adjust(instance.user_id, **{field: 1})
+
+
+@receiver(post_delete, sender=SourceCode)
+def count_deleted_source_code(sender, instance, **kwargs):
+    """Uncount a deleted source code."""
+    # Never recreate the stats of a user being deleted.
+    UserStats.adjust(
+        instance.user_id, create=False, source_codes=-1,
+        code_bytes=-UserStats.code_size(instance.code),
+    )
+
+
+@receiver(post_delete, sender=Snippet)
+@receiver(post_delete, sender=Tag)
+def count_deleted_row(sender, instance, **kwargs):
+    """Uncount a deleted snippet or tag."""
+    field = 'snippets' if sender is Snippet else 'tags'
+    UserStats.adjust(instance.user_id, create=False, **{field: -1})
@@ -0,0 +1,28 @@
+"""
+Storage of content-addressed files.
+"""
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage for files named by a hash of their content.
+    A name that exists already holds the same content, so it is reused
+    instead of being renamed and written again.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        if self.exists(name):
+            return name
+        # Write under a unique name and rename, so concurrent uploads of
+        # the same content never see a partial file.
+        root, ext = os.path.splitext(name)
+        temp_name = super()._save(f'{root}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(temp_name), self.path(name))
+        return name
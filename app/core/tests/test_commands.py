@@ -1,13 +1,24 @@
 """
 Test custom Django management commands.
 """
+import io
+import json
+import os
+import tempfile
 from unittest.mock import patch
 
 from psycopg2 import OperationalError as Psycopg2OpError
 
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.models import Snippet, SourceCode
+from snippet import highlight, highlight_benchmark
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -32,3 +43,160 @@ class CommandTests(SimpleTestCase):
 
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
+
+
+@override_settings(HIGHLIGHT_CACHE={
+    'BACKEND': 'django', 'CACHE_ALIAS': 'default', 'TIMEOUT': None,
+})
+class HighlightCacheCommandTests(TestCase):
+    """Test the highlight cache command against a shared backend."""
+
+    def setUp(self):
+        # A fresh process wide cache built from the overridden settings.
+        patcher = patch.object(highlight, '_cache', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(cache.clear)
+        user = get_user_model().objects.create_user(
+            'cache@example.com', 'testpass123',
+        )
+        source_code = SourceCode.objects.create(
+            user=user, code="print('warm')", title='Warm',
+        )
+        Snippet.objects.create(
+            user=user, source_code=source_code, language_name='python',
+            style='colorful', linenos=True,
+        )
+        self.key = highlight.make_key(*highlight.render_inputs(
+            "print('warm')", 'python', 'colorful', True, 'Warm',
+        ))
+
+    def other_process_cache(self):
+        """Return a cache built like the one of another process."""
+        return highlight.build_backend(settings.HIGHLIGHT_CACHE)
+
+    def test_warm_and_purge_reach_other_processes(self):
+        """Test warm and purge are seen by another cache instance."""
+        self.assertIsNone(self.other_process_cache().get(self.key))
+
+        call_command('highlight_cache', 'warm', stdout=io.StringIO())
+        self.assertIn('warm', self.other_process_cache().get(self.key))
+
+        call_command('highlight_cache', 'purge', stdout=io.StringIO())
+        self.assertIsNone(self.other_process_cache().get(self.key))
+
+    @override_settings(HIGHLIGHT_CACHE={'BACKEND': 'lru'})
+    def test_process_local_backend_refused(self):
+        """Test warm and purge refuse the per process lru backend."""
+        for action in ('warm', 'purge'):
+            with self.assertRaisesMessage(CommandError, 'django'):
+                call_command('highlight_cache', action, stdout=io.StringIO())
+
+        call_command('highlight_cache', 'stats', stdout=io.StringIO())
+
+
+class BenchmarkCommandTests(TestCase):
+    """Test the benchmark command."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.output = os.path.join(self.tmpdir.name, 'results.json')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def run_benchmark(self, *args):
+        call_command(
+            'benchmark', '--users', '1', '--snippets', '12',
+            '--requests', '2', '--warmup', '0', '-o', self.output,
+            '--only', 'snippet-list', 'source-code-detail', 'user-me',
+            '--force', *args, stdout=io.StringIO(),
+        )
+        with open(self.output) as output:
+            return json.load(output)
+
+    def test_benchmark_results(self):
+        """Test results are written for the selected endpoints."""
+        results = self.run_benchmark()
+
+        self.assertEqual(results['meta']['snippets'], 12)
+        self.assertEqual(
+            sorted(results['endpoints']),
+            ['snippet-list', 'source-code-detail', 'user-me'],
+        )
+        result = results['endpoints']['snippet-list']
+        self.assertEqual(result['status'], 200)
+        self.assertGreater(result['queries'], 0)
+        self.assertGreater(result['p99_ms'], 0)
+
+    def test_benchmark_refused_without_settings(self):
+        """Test the benchmark only runs with its settings or --force."""
+        with patch('snippet.benchmark.seed') as seed, \
+                self.assertRaisesMessage(CommandError, 'settings_benchmark'):
+            call_command('benchmark', stdout=io.StringIO())
+
+        seed.assert_not_called()
+
+    @override_settings(BENCHMARK_SETTINGS=True)
+    def test_benchmark_runs_with_settings(self):
+        """Test the benchmark settings allow runs without --force."""
+        with patch('snippet.benchmark.seed') as seed, \
+                patch('snippet.benchmark.run', return_value={}) as run:
+            call_command('benchmark', stdout=io.StringIO())
+
+        seed.assert_called_once()
+        run.assert_called_once()
+
+    def test_benchmark_regression(self):
+        """Test running more queries than the baseline fails."""
+        baseline = os.path.join(self.tmpdir.name, 'baseline.json')
+        with open(baseline, 'w') as baseline_file:
+            json.dump({'endpoints': {'user-me': {
+                'queries': 0, 'p50_ms': 1000,
+            }}}, baseline_file)
+
+        with self.assertRaisesMessage(CommandError, 'user-me'):
+            self.run_benchmark('--baseline', baseline)
+
+
+class BenchmarkHighlightCommandTests(SimpleTestCase):
+    """Test the highlighting benchmark command."""
+
+    def test_benchmark_highlight_results(self):
+        """Test every size of every series is measured."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output = os.path.join(tmpdir, 'results.json')
+            call_command(
+                'benchmark_highlight', '--languages', 'python', 'css',
+                '--sizes', '10', '20', '--repeat', '1', '-o', output,
+                stdout=io.StringIO(),
+            )
+            with open(output) as output_file:
+                results = json.load(output_file)
+
+        self.assertEqual(len(results['series']), 4)
+        series = results['series'][0]
+        self.assertEqual(series['language'], 'python')
+        self.assertEqual([r['lines'] for r in series['results']], [10, 20])
+        self.assertGreater(series['results'][0]['lines_per_sec'], 0)
+        self.assertGreater(series['results'][0]['peak_memory_bytes'], 0)
+
+    def test_benchmark_highlight_flags_superlinear(self):
+        """Test a render time growing as lines squared is flagged."""
+        results = [
+            {'lines': 100, 'seconds': 0.01, 'lines_per_sec': 10000},
+            {'lines': 1000, 'seconds': 1.0, 'lines_per_sec': 1000},
+        ]
+        reasons = highlight_benchmark.flag(
+            {'results': results}, None, 10, 1.5, 100,
+        )
+
+        self.assertEqual(reasons, ['time grows as lines^2.00'])
+
+    def test_benchmark_highlight_unknown_language(self):
+        """Test unknown languages are refused."""
+        with self.assertRaisesMessage(CommandError, 'nosuchlanguage'):
+            call_command(
+                'benchmark_highlight', '--languages', 'nosuchlanguage',
+                stdout=io.StringIO(),
+            )
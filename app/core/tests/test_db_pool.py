@@ -0,0 +1,191 @@
+"""
+Tests for the database connection pool.
+"""
+from unittest import mock
+
+from psycopg2 import OperationalError, extensions
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.db.pool import ConnectionPool, PoolTimeout
+from core.db.postgresql.base import check_connection, reset_connection
+
+
+METRICS_URL = reverse('metrics')
+
+
+class FakeConnection:
+    """Stand in for a DB-API connection."""
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """Test the bounded connection pool."""
+
+    def test_connections_reused(self):
+        """Test a released connection is handed out again."""
+        pool = ConnectionPool(size=2)
+
+        connection = pool.acquire(FakeConnection)
+        pool.release(connection)
+
+        self.assertIs(pool.acquire(FakeConnection), connection)
+        stats = pool.stats()
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['reused'], 1)
+        self.assertEqual(stats['in_use'], 1)
+
+    def test_size_bounded(self):
+        """Test acquire times out when every connection is in use."""
+        pool = ConnectionPool(size=1, timeout=0.01)
+        pool.acquire(FakeConnection)
+
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(FakeConnection)
+
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_unusable_connection_discarded(self):
+        """Test broken and not reusable connections are closed."""
+        pool = ConnectionPool(size=2)
+        broken = pool.acquire(FakeConnection)
+        dirty = pool.acquire(FakeConnection)
+
+        broken.closed = True
+        pool.release(broken)
+        pool.release(dirty, reusable=False)
+
+        self.assertTrue(dirty.closed)
+        connection = pool.acquire(FakeConnection)
+        self.assertIsNot(connection, broken)
+        self.assertIsNot(connection, dirty)
+        self.assertEqual(pool.stats()['discarded'], 2)
+
+    def test_max_lifetime(self):
+        """Test connections are replaced after their maximum lifetime."""
+        pool = ConnectionPool(size=1, max_lifetime=60)
+        with mock.patch('core.db.pool.time.monotonic', return_value=0):
+            connection = pool.acquire(FakeConnection)
+        with mock.patch('core.db.pool.time.monotonic', return_value=61):
+            pool.release(connection)
+
+        self.assertTrue(connection.closed)
+
+    def test_health_check_after_idle(self):
+        """Test idle connections failing the check are replaced."""
+        check = mock.Mock(side_effect=Exception('server closed'))
+        pool = ConnectionPool(size=1, check=check, check_interval=30)
+        with mock.patch('core.db.pool.time.monotonic', return_value=0):
+            connection = pool.acquire(FakeConnection)
+            pool.release(connection)
+        with mock.patch('core.db.pool.time.monotonic', return_value=10):
+            self.assertIs(pool.acquire(FakeConnection), connection)
+            pool.release(connection)
+        check.assert_not_called()
+
+        with mock.patch('core.db.pool.time.monotonic', return_value=100):
+            replacement = pool.acquire(FakeConnection)
+
+        check.assert_called_once_with(connection)
+        self.assertIsNot(replacement, connection)
+        self.assertTrue(connection.closed)
+
+    def test_failed_connect_frees_slot(self):
+        """Test a failing connect does not leak a pool slot."""
+        pool = ConnectionPool(size=1, timeout=0.01)
+
+        with self.assertRaises(OSError):
+            pool.acquire(mock.Mock(side_effect=OSError))
+
+        self.assertIsNotNone(pool.acquire(FakeConnection))
+
+
+class PostgresConnectionTests(SimpleTestCase):
+    """Test the state pooled psycopg2 connections are returned in."""
+
+    def psycopg2_connection(self, status, autocommit):
+        connection = mock.MagicMock(closed=0, autocommit=autocommit)
+        connection.get_transaction_status.return_value = status
+        return connection
+
+    def test_reset_restores_autocommit(self):
+        """Test a connection released in a transaction is reusable."""
+        connection = self.psycopg2_connection(
+            extensions.TRANSACTION_STATUS_INTRANS, autocommit=False,
+        )
+
+        self.assertTrue(reset_connection(connection))
+
+        connection.rollback.assert_called_once()
+        self.assertTrue(connection.autocommit)
+
+    def test_reset_discards_broken_connection(self):
+        """Test a connection that cannot roll back is not reused."""
+        connection = self.psycopg2_connection(
+            extensions.TRANSACTION_STATUS_INERROR, autocommit=False,
+        )
+        connection.rollback.side_effect = OperationalError
+
+        self.assertFalse(reset_connection(connection))
+
+    def test_check_leaves_no_transaction_open(self):
+        """Test the health check rolls back outside autocommit."""
+        connection = self.psycopg2_connection(
+            extensions.TRANSACTION_STATUS_IDLE, autocommit=False,
+        )
+
+        self.assertTrue(check_connection(connection))
+
+        connection.rollback.assert_called_once()
+
+    def test_check_in_autocommit(self):
+        """Test the health check has nothing to roll back in autocommit."""
+        connection = self.psycopg2_connection(
+            extensions.TRANSACTION_STATUS_IDLE, autocommit=True,
+        )
+
+        self.assertTrue(check_connection(connection))
+
+        connection.rollback.assert_not_called()
+
+
+class MetricsApiTests(TestCase):
+    """Test the metrics endpoint."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_admin_required(self):
+        """Test the metrics are only shown to admin users."""
+        user = get_user_model().objects.create_user(
+            'user@example.com', 'testpass123',
+        )
+        self.client.force_authenticate(user)
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_metrics(self):
+        """Test the pool and cache statistics are reported."""
+        admin = get_user_model().objects.create_superuser(
+            'admin@example.com', 'testpass123',
+        )
+        self.client.force_authenticate(admin)
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('default', res.data['databases'])
+        self.assertIn('db_pools', res.data)
+        self.assertIn('hits', res.data['highlight_cache'])
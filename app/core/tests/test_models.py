@@ -1,8 +1,13 @@
 """
 Tests for models.
 """
+import hashlib
+from importlib import import_module
 from unittest.mock import patch
-from django.test import TestCase
+from django.apps import apps
+from django.db import DatabaseError, IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 
 from core import models
@@ -267,6 +272,27 @@ class ModelTests(TestCase):
         snippet_obj = "snippet {}".format(snippet.id)
         self.assertEqual(str(snippet), snippet_obj)
 
+    def test_source_code_hash(self):
+        """Test source code stores the sha256 of its code."""
+        user = create_user()
+        code = 'x' * 10000
+        source_code = models.SourceCode.objects.create(user=user, code=code)
+
+        self.assertEqual(
+            source_code.code_sha256,
+            hashlib.sha256(code.encode('utf-8')).hexdigest(),
+        )
+
+    def test_same_code_for_different_users(self):
+        """Test the same code is unique per user only."""
+        user = create_user()
+        user2 = create_user(email='user2@example.com')
+        models.SourceCode.objects.create(user=user, code='shared code')
+        models.SourceCode.objects.create(user=user2, code='shared code')
+
+        with self.assertRaises(IntegrityError):
+            models.SourceCode.objects.create(user=user, code='shared code')
+
     @patch('core.models.uuid.uuid4')
     def test_snippet_file_name_uuid(self, mock_uuid):
         """Test genrating image path."""
@@ -274,3 +300,192 @@ class ModelTests(TestCase):
         mock_uuid.return_value = uuid
         file_path = models.snippet_image_file_path(None, 'example.jpg')
         self.assertEqual(file_path, f'uploads/snippet/{uuid}.jpg')
+
+
+class DirtyFieldsTests(TestCase):
+    """Test change tracking of snippets and source codes."""
+
+    def setUp(self):
+        self.user = create_user()
+        models.Snippet.objects.create(
+            user=self.user, highlighted='<pre>code</pre>',
+        )
+        self.snippet = models.Snippet.objects.get()
+
+    def test_loaded_snippet_is_clean(self):
+        """Test a snippet read from the database has no changes."""
+        self.assertEqual(self.snippet.get_dirty_fields(), {})
+
+    def test_dirty_fields_keep_stored_values(self):
+        """Test changed fields are reported with their stored value."""
+        self.snippet.style = 'monokai'
+        self.snippet.linenos = False
+
+        self.assertEqual(
+            self.snippet.get_dirty_fields(), {'style': 'friendly'},
+        )
+        self.assertTrue(self.snippet.is_dirty('style', 'language_name'))
+        self.assertFalse(self.snippet.is_dirty('language_name'))
+
+    def test_save_writes_changed_columns(self):
+        """Test save only updates the changed fields and modified."""
+        self.snippet.style = 'monokai'
+        with CaptureQueriesContext(connection) as queries:
+            self.snippet.save()
+
+        # The second query bumps the list version of the user.
+        self.assertEqual(len(queries), 2)
+        self.assertIn('"list_version"', queries[1]['sql'])
+        sql = queries[0]['sql']
+        self.assertIn('"style"', sql)
+        self.assertIn('"modified"', sql)
+        self.assertNotIn('"highlighted"', sql)
+        self.assertNotIn('"language_name"', sql)
+        self.assertEqual(self.snippet.get_dirty_fields(), {})
+        self.snippet.refresh_from_db()
+        self.assertEqual(self.snippet.style, 'monokai')
+
+    def test_source_code_save_writes_changed_columns(self):
+        """Test a source code rating change leaves the code alone."""
+        models.SourceCode.objects.create(user=self.user, code='x = 1')
+        source_code = models.SourceCode.objects.get()
+        source_code.rating = 5
+        with CaptureQueriesContext(connection) as queries:
+            source_code.save()
+
+        sql = queries[0]['sql']
+        self.assertIn('"rating"', sql)
+        self.assertIn('"count_updated"', sql)
+        self.assertNotIn('"code"', sql)
+        self.assertNotIn('"code_sha256"', sql)
+        self.assertEqual(source_code.count_updated, 2)
+
+    def test_new_instance_is_saved_whole(self):
+        """Test unsaved instances report every field and are inserted."""
+        snippet = models.Snippet(user=self.user)
+
+        self.assertIn('highlighted', snippet.get_dirty_fields())
+        snippet.save()
+        self.assertEqual(models.Snippet.objects.count(), 2)
+        self.assertEqual(snippet.get_dirty_fields(), {})
+
+
+class UserStatsTests(TestCase):
+    """Test the per-user counters."""
+
+    def setUp(self):
+        self.user = create_user()
+
+    def stats(self):
+        return models.UserStats.objects.get(user=self.user)
+
+    def test_counters_follow_writes(self):
+        """Test creating, editing and deleting rows updates the stats."""
+        source_code = models.SourceCode.objects.create(
+            user=self.user, code='é = 1',
+        )
+        snippet = models.Snippet.objects.create(
+            user=self.user, source_code=source_code,
+        )
+        models.Tag.objects.create(user=self.user, name='tag')
+        stats = self.stats()
+        self.assertEqual(
+            (stats.source_codes, stats.snippets, stats.tags), (1, 1, 1),
+        )
+        self.assertEqual(stats.code_bytes, 6)
+
+        source_code = models.SourceCode.objects.get()
+        source_code.code = 'x = 10'
+        source_code.save()
+        self.assertEqual(self.stats().code_bytes, 6)
+        source_code.code = 'x = 100'
+        source_code.save()
+        self.assertEqual(self.stats().code_bytes, 7)
+
+        snippet.delete()
+        source_code.delete()
+        stats = self.stats()
+        self.assertEqual(
+            (stats.source_codes, stats.snippets, stats.code_bytes),
+            (0, 0, 0),
+        )
+
+    def test_titles_are_not_reused(self):
+        """Test generated titles keep counting after deletes."""
+        first = models.SourceCode.objects.create(user=self.user, code='a')
+        second = models.SourceCode.objects.create(user=self.user, code='b')
+        first.delete()
+        third = models.SourceCode.objects.create(user=self.user, code='c')
+
+        self.assertEqual(
+            [second.title, third.title], ['title 2', 'title 3'],
+        )
+        self.assertEqual(
+            models.UserStats.reserve_titles(self.user.id, 5), 4,
+        )
+        self.assertEqual(self.stats().last_title, 8)
+
+    def test_title_errors_propagate(self):
+        """Test a failure to reserve a title is not hidden."""
+        with patch.object(models.UserStats, 'reserve_titles',
+                          side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                models.SourceCode.objects.create(user=self.user, code='a')
+
+    def test_missing_stats_are_counted(self):
+        """Test stats lost or predating the table are counted again."""
+        models.SourceCode.objects.create(user=self.user, code='abc')
+        models.Tag.objects.create(user=self.user, name='tag')
+        models.UserStats.objects.all().delete()
+
+        stats = models.UserStats.for_user(self.user.id)
+
+        self.assertEqual(
+            (stats.source_codes, stats.tags, stats.code_bytes), (1, 1, 3),
+        )
+        self.assertEqual(stats.last_title, 1)
+
+    def test_delete_user_with_rows(self):
+        """Test deleting a user does not recreate their stats."""
+        models.SourceCode.objects.create(user=self.user, code='abc')
+        models.Tag.objects.create(user=self.user, name='tag')
+
+        self.user.delete()
+
+        self.assertFalse(models.UserStats.objects.exists())
+
+
+class CompactHighlightedMigrationTests(TestCase):
+    """Test the data migration to compact highlighted html."""
+
+    def setUp(self):
+        self.migration = import_module(
+            'core.migrations.0003_compact_highlighted'
+        )
+        user = create_user()
+        source_code = models.SourceCode.objects.create(
+            user=user, code="print('full')",
+        )
+        self.snippet = models.Snippet.objects.create(
+            user=user, source_code=source_code, language_name='python',
+            style='colorful', highlighted='<!DOCTYPE html><html></html>',
+        )
+
+    def test_rewrites_to_compact(self):
+        """Test stored documents are rewritten as token markup."""
+        self.migration.to_compact(apps, None)
+
+        self.snippet.refresh_from_db()
+        self.assertTrue(
+            self.snippet.highlighted.startswith('<div class="highlight">')
+        )
+
+    @override_settings(HIGHLIGHT_FULL_HTML=True)
+    def test_full_html_kept(self):
+        """Test deployments keeping full html are left alone."""
+        self.migration.to_compact(apps, None)
+
+        self.snippet.refresh_from_db()
+        self.assertEqual(
+            self.snippet.highlighted, '<!DOCTYPE html><html></html>',
+        )
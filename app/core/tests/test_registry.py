@@ -0,0 +1,40 @@
+"""
+Tests for the Pygments registry.
+"""
+import json
+import tempfile
+
+from django.test import SimpleTestCase
+
+from core import registry
+
+
+class RegistryTests(SimpleTestCase):
+    """Test the language and style registry."""
+
+    def test_snapshot_matches_pygments(self):
+        """Test the committed snapshot is current."""
+        self.assertEqual(registry.load_snapshot(), registry.build_snapshot())
+
+    def test_snapshot_for_other_version_ignored(self):
+        """Test a snapshot of another Pygments version is not used."""
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as snapshot:
+            json.dump({'pygments_version': '0.0', 'lexers': []}, snapshot)
+            snapshot.flush()
+
+            self.assertIsNone(registry.load_snapshot(snapshot.name))
+
+    def test_resolve_language(self):
+        """Test aliases and names resolve to the canonical alias."""
+        self.assertEqual(registry.resolve_language('python'), 'python')
+        self.assertEqual(registry.resolve_language('py'), 'python')
+        self.assertEqual(registry.resolve_language('C++'), 'cpp')
+        self.assertIsNone(registry.resolve_language('not-a-language'))
+
+    def test_choice_lookups(self):
+        """Test values and labels of the choices are accepted."""
+        self.assertTrue(registry.is_language('python'))
+        self.assertTrue(registry.is_language('Python'))
+        self.assertFalse(registry.is_language('py'))
+        self.assertTrue(registry.is_style('friendly'))
+        self.assertFalse(registry.is_style('Friendly'))
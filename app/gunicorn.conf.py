@@ -0,0 +1,37 @@
+"""
+Gunicorn settings of the production profile, started by scripts/run.sh.
+
+SERVER_MODE=wsgi (default) serves app.wsgi with threaded workers,
+SERVER_MODE=asgi serves app.asgi with uvicorn workers.
+"""
+import multiprocessing
+import os
+
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:9000')
+
+# Requests are mostly CPU bound (serializing, Pygments), so one process per
+# core; threads overlap the time spent waiting on PostgreSQL.
+workers = int(
+    os.environ.get('GUNICORN_WORKERS') or multiprocessing.cpu_count()
+)
+threads = int(os.environ.get('GUNICORN_THREADS') or 4)
+
+if os.environ.get('SERVER_MODE', 'wsgi') == 'asgi':
+    wsgi_app = 'app.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'app.wsgi:application'
+    worker_class = 'gthread'
+
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+
+# Recycle workers now and then to bound the growth of in-process caches.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = max_requests // 10
+
+# Heartbeat files on tmpfs, a slow /tmp can make workers look stuck.
+worker_tmp_dir = '/dev/shm'
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SnippetConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'snippet'
+
+    def ready(self):
+        from snippet import signals  # noqa: F401
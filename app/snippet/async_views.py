@@ -0,0 +1,125 @@
+"""
+Async entry points for the snippet, source code and tag endpoints.
+
+Django 3.2 has no async ORM and runs every sync view of an ASGI worker in
+one shared thread, so a few slow requests hold up all the others. These
+views run the DRF viewsets in a pool of ASYNC_VIEW_THREADS threads instead
+and hand the rendered response back to the event loop, which streams the
+body to slow clients without holding a thread. snippet.urls mounts them in
+front of the router when ASYNC_VIEWS is set.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import path
+
+from snippet import views
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the thread pool running the viewsets."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.ASYNC_VIEW_THREADS,
+                thread_name_prefix='async-view',
+            )
+        return _executor
+
+
+def _render_view(view, request, kwargs):
+    """Run a sync view and render its response in the calling thread."""
+    response = view(request, **kwargs)
+    if hasattr(response, 'render') and not response.is_rendered:
+        response.render()
+    return response
+
+
+def _call_view(view, request, kwargs):
+    """Run a sync view in a pool thread, as a request would."""
+    # Pool threads do not see request_started/finished, so apply
+    # CONN_MAX_AGE and drop broken connections here.
+    close_old_connections()
+    try:
+        return _render_view(view, request, kwargs)
+    finally:
+        close_old_connections()
+
+
+def async_view(viewset, actions, **initkwargs):
+    """Return an async view running a viewset in the thread pool."""
+    view = viewset.as_view(actions, **initkwargs)
+
+    async def wrapper(request, **kwargs):
+        if not settings.ASYNC_VIEW_THREADS:
+            return await sync_to_async(_render_view, thread_sensitive=True)(
+                view, request, kwargs,
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            get_executor(), _call_view, view, request, kwargs,
+        )
+
+    wrapper.csrf_exempt = True
+    return wrapper
+
+
+LIST_ACTIONS = {'get': 'list', 'post': 'create'}
+DETAIL_ACTIONS = {
+    'get': 'retrieve',
+    'put': 'update',
+    'patch': 'partial_update',
+    'delete': 'destroy',
+}
+
+snippet_list = async_view(
+    views.SnippetViewSet, LIST_ACTIONS, basename='snippet', detail=False,
+)
+snippet_detail = async_view(
+    views.SnippetViewSet, DETAIL_ACTIONS, basename='snippet', detail=True,
+)
+snippet_wait = async_view(
+    views.SnippetViewSet, {'get': 'wait'}, basename='snippet', detail=True,
+)
+snippet_render = async_view(
+    views.SnippetViewSet, {'get': 'render_image'},
+    basename='snippet', detail=True,
+)
+source_code_list = async_view(
+    views.SourceCodeViewSet, {'get': 'list'},
+    basename='sourcecode', detail=False,
+)
+source_code_detail = async_view(
+    views.SourceCodeViewSet, DETAIL_ACTIONS,
+    basename='sourcecode', detail=True,
+)
+tag_list = async_view(
+    views.TagViewSet, {'get': 'list'}, basename='tag', detail=False,
+)
+tag_detail = async_view(
+    views.TagViewSet, DETAIL_ACTIONS, basename='tag', detail=True,
+)
+
+# Integer pks so list actions such as snippets/bulk/ reach the router.
+urlpatterns = [
+    path('snippets/', snippet_list),
+    path('snippets/<int:pk>/', snippet_detail),
+    path('snippets/<int:pk>/wait/', snippet_wait),
+    path(
+        'snippets/<int:pk>/render.<str:image_format>', snippet_render,
+        name='snippet-render',
+    ),
+    path('source_codes/', source_code_list),
+    path('source_codes/<int:pk>/', source_code_detail),
+    path('tags/', tag_list),
+    path('tags/<int:pk>/', tag_detail),
+]
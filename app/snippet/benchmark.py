@@ -0,0 +1,366 @@
+"""
+Benchmark of the snippet and user API endpoints.
+
+seed() fills the database with users owning thousands of snippets across
+languages and code sizes, run() times every endpoint of snippet.urls and
+user.urls in process with the test client and compare() checks a result
+against a stored baseline. Used by `manage.py benchmark`.
+"""
+import io
+import json
+import platform
+import random
+import statistics
+import time
+from collections import namedtuple
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Snippet, SourceCode, Tag, UserStats
+from snippet.highlight import render_highlighted
+
+
+SEED_EMAIL = 'bench{}@example.com'
+SEED_PASSWORD = 'benchpass123'
+
+LANGUAGE_LINES = {
+    'python': 'def f{n}(x):\n    return [i * {n} for i in range(x)]',
+    'c': 'int f{n}(int x) {{ return x * {n}; }}',
+    'javascript': 'const f{n} = (x) => x.map((i) => i * {n});',
+    'go': 'func f{n}(x int) int {{ return x * {n} }}',
+    'rust': 'fn f{n}(x: i64) -> i64 {{ x * {n} }}',
+    'java': 'static int f{n}(int x) {{ return x * {n}; }}',
+    'ruby': 'def f{n}(x) = x.map {{ |i| i * {n} }}',
+    'sql': 'SELECT id, name FROM t{n} WHERE id > {n} ORDER BY name;',
+    'html': '<div class="row-{n}"><span>{n}</span></div>',
+    'bash': 'for i in $(seq {n}); do echo "$i"; done',
+}
+# (name, lines, weight) of the generated code sizes.
+CODE_SIZES = [('small', 10, 6), ('medium', 100, 3), ('large', 1000, 1)]
+TAG_NAMES = ['work', 'home', 'algorithms', 'web', 'database', 'scripts']
+
+
+def make_code(language, lines, seed):
+    template = LANGUAGE_LINES[language]
+    return '\n'.join(
+        template.format(n=seed * 10000 + line) for line in range(lines)
+    )
+
+
+def seed(users=2, snippets=2000, batch_size=500, stdout=None):
+    """
+    Create the benchmark users and their snippets unless they exist.
+    Highlighted html is rendered once per language and size and shared,
+    only its size matters to the endpoints.
+    """
+    rng = random.Random(0)
+    highlighted = {}
+    languages = sorted(LANGUAGE_LINES)
+    sizes = [size for size in CODE_SIZES for _ in range(size[2])]
+
+    for index in range(users):
+        user, created = get_user_model().objects.get_or_create(
+            email=SEED_EMAIL.format(index),
+        )
+        if created:
+            user.set_password(SEED_PASSWORD)
+            user.save()
+        Token.objects.get_or_create(user=user)
+        existing = Snippet.objects.filter(user=user).count()
+        if existing >= snippets:
+            continue
+
+        tags = [
+            Tag.objects.get_or_create(user=user, name=name)[0]
+            for name in TAG_NAMES
+        ]
+        for start in range(existing, snippets, batch_size):
+            count = min(batch_size, snippets - start)
+            items = []
+            for number in range(start, start + count):
+                language = languages[number % len(languages)]
+                size, lines, _ = rng.choice(sizes)
+                if (language, size) not in highlighted:
+                    highlighted[language, size] = render_highlighted(
+                        make_code(language, lines, 0), language,
+                        'default', True,
+                    )
+                source_code = SourceCode(
+                    user=user,
+                    title=f'{language} {size} {number}',
+                    author='benchmark',
+                    code=make_code(language, lines, number + 1),
+                    notes=f'Generated {size} {language} snippet.',
+                )
+                source_code.set_computed_fields()
+                items.append((source_code, language, size))
+
+            with transaction.atomic():
+                source_codes = SourceCode.objects.bulk_create(
+                    [item[0] for item in items]
+                )
+                if source_codes and source_codes[0].pk is None:
+                    source_codes = list(SourceCode.objects.filter(
+                        user=user,
+                        code_sha256__in=[
+                            item.code_sha256 for item in source_codes
+                        ],
+                    ).order_by('id'))
+                objs = Snippet.objects.bulk_create([
+                    Snippet(
+                        user=user,
+                        source_code=source_code,
+                        language_name=language,
+                        highlighted=highlighted[language, size],
+                    )
+                    for source_code, (_, language, size)
+                    in zip(source_codes, items)
+                ])
+                if objs and objs[0].pk is None:
+                    objs = list(Snippet.objects.filter(
+                        user=user, source_code__in=source_codes,
+                    ).order_by('id'))
+                UserStats.adjust(
+                    user.id,
+                    source_codes=len(source_codes),
+                    snippets=len(objs),
+                    code_bytes=sum(
+                        UserStats.code_size(item.code)
+                        for item in source_codes
+                    ),
+                )
+                Snippet.tags.through.objects.bulk_create([
+                    Snippet.tags.through(
+                        snippet_id=snippet.pk,
+                        tag_id=tags[snippet.pk % len(tags)].pk,
+                    )
+                    for snippet in objs
+                ])
+            if stdout:
+                stdout.write(f'{user.email}: {start + count} snippets')
+
+
+Endpoint = namedtuple(
+    'Endpoint', 'name method path data format admin',
+    defaults=(None, None, False),
+)
+
+
+def _bulk_payload(context, iteration):
+    return {'create': [{
+        'language_name': 'python',
+        'source_code': {'code': f'print({iteration}, {time.time_ns()})'},
+    }]}
+
+
+def _import_payload(context, iteration):
+    record = {
+        'language_name': 'python',
+        'source_code': {'code': f'import_{iteration}_{time.time_ns()} = 1'},
+    }
+    archive = io.BytesIO(json.dumps(record).encode('utf-8'))
+    archive.name = 'snippets.ndjson'
+    return {'file': archive}
+
+
+def _image_payload(context, iteration):
+    from PIL import Image
+
+    image = io.BytesIO()
+    Image.new('RGB', (64, 64), (iteration % 256, 0, 0)).save(image, 'PNG')
+    image.seek(0)
+    image.name = 'benchmark.png'
+    return {'image': image}
+
+
+def endpoints(context):
+    """Return the benchmarked endpoints."""
+    snippet_id = context['snippet_id']
+    source_code_id = context['source_code_id']
+    return [
+        Endpoint('snippet-list', 'get', reverse('snippet:snippet-list')),
+        Endpoint('snippet-list-tags', 'get',
+                 reverse('snippet:snippet-list') +
+                 f"?tags={context['tag_id']}"),
+        Endpoint('snippet-detail', 'get',
+                 reverse('snippet:snippet-detail', args=[snippet_id])),
+        Endpoint('snippet-wait', 'get',
+                 reverse('snippet:snippet-wait', args=[snippet_id]) +
+                 '?timeout=0'),
+        Endpoint('snippet-create', 'post', reverse('snippet:snippet-list'),
+                 lambda context, i: {
+                     'language_name': 'python',
+                     'source_code': {'code': f'x = {i}  # {time.time_ns()}'},
+                     'tags': [{'name': 'benchmark'}],
+                 }, 'json'),
+        Endpoint('snippet-update', 'patch',
+                 reverse('snippet:snippet-detail', args=[snippet_id]),
+                 lambda context, i: {'linenos': bool(i % 2)}, 'json'),
+        Endpoint('snippet-upload-image', 'post',
+                 reverse('snippet:snippet-upload-image', args=[snippet_id]),
+                 _image_payload, 'multipart'),
+        Endpoint('snippet-bulk', 'post', reverse('snippet:snippet-bulk'),
+                 _bulk_payload, 'json'),
+        Endpoint('source-code-list', 'get',
+                 reverse('snippet:sourcecode-list')),
+        Endpoint('source-code-detail', 'get',
+                 reverse('snippet:sourcecode-detail', args=[source_code_id])),
+        Endpoint('source-code-search', 'get',
+                 reverse('snippet:sourcecode-search') + '?q=python+medium'),
+        Endpoint('source-code-lookup', 'get',
+                 reverse('snippet:sourcecode-lookup') +
+                 f"?sha256={context['code_sha256']}"),
+        Endpoint('tag-list', 'get', reverse('snippet:tag-list')),
+        Endpoint('tag-list-assigned', 'get',
+                 reverse('snippet:tag-list') + '?assigned_only=1'),
+        Endpoint('style-css', 'get',
+                 reverse('snippet:style-css', args=['monokai'])),
+        Endpoint('export', 'get', reverse('snippet:export')),
+        Endpoint('import', 'post', reverse('snippet:import'),
+                 _import_payload, 'multipart'),
+        Endpoint('user-me', 'get', reverse('user:me')),
+        Endpoint('user-token', 'post', reverse('user:token'),
+                 lambda context, i: {
+                     'email': context['email'], 'password': SEED_PASSWORD,
+                 }, 'json'),
+        Endpoint('user-create', 'post', reverse('user:create'),
+                 lambda context, i: {
+                     'email': f'bench-new-{time.time_ns()}@example.com',
+                     'password': SEED_PASSWORD, 'name': 'Benchmark',
+                 }, 'json'),
+        Endpoint('user-list', 'get', reverse('user:users'), admin=True),
+    ]
+
+
+def _request(clients, endpoint, context, iteration):
+    method = getattr(clients[endpoint.admin], endpoint.method)
+    if endpoint.data is None:
+        response = method(endpoint.path)
+    else:
+        response = method(
+            endpoint.path, endpoint.data(context, iteration),
+            format=endpoint.format,
+        )
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(requests=50, warmup=5, use_cache=False, only=None, stdout=None):
+    """Time every endpoint and return the machine readable results."""
+    user = get_user_model().objects.get(email=SEED_EMAIL.format(0))
+    token = Token.objects.get(user=user)
+    snippet = Snippet.objects.filter(
+        user=user, source_code__isnull=False,
+    ).select_related('source_code').order_by('id').first()
+    context = {
+        'email': user.email,
+        'snippet_id': snippet.id,
+        'source_code_id': snippet.source_code.id,
+        'code_sha256': snippet.source_code.code_sha256,
+        'tag_id': Tag.objects.filter(user=user).order_by('id').first().id,
+    }
+    admin, _ = get_user_model().objects.get_or_create(
+        email='bench-admin@example.com', is_staff=True,
+    )
+    admin_token, _ = Token.objects.get_or_create(user=admin)
+    clients = {}
+    for is_admin, key in [(False, token.key), (True, admin_token.key)]:
+        clients[is_admin] = APIClient()
+        clients[is_admin].credentials(HTTP_AUTHORIZATION=f'Token {key}')
+
+    def clear_caches():
+        if not use_cache:
+            for cache in caches.all():
+                cache.clear()
+
+    results = {}
+    for endpoint in endpoints(context):
+        if only and endpoint.name not in only:
+            continue
+        for iteration in range(warmup):
+            clear_caches()
+            _request(clients, endpoint, context, iteration)
+
+        clear_caches()
+        with CaptureQueriesContext(connection) as queries:
+            response = _request(clients, endpoint, context, warmup)
+        query_count = len(queries)
+
+        timings = []
+        for iteration in range(requests):
+            clear_caches()
+            start = time.perf_counter()
+            _request(clients, endpoint, context, warmup + 1 + iteration)
+            timings.append(time.perf_counter() - start)
+
+        total = sum(timings)
+        results[endpoint.name] = {
+            'method': endpoint.method.upper(),
+            'path': endpoint.path,
+            'status': response.status_code,
+            'queries': query_count,
+            'mean_ms': round(statistics.mean(timings) * 1000, 3),
+            'p50_ms': round(percentile(timings, 0.5) * 1000, 3),
+            'p90_ms': round(percentile(timings, 0.9) * 1000, 3),
+            'p99_ms': round(percentile(timings, 0.99) * 1000, 3),
+            'rps': round(len(timings) / total, 1) if total else None,
+        }
+        if stdout:
+            stdout.write(format_result(endpoint.name, results[endpoint.name]))
+
+    return {
+        'meta': {
+            'database': connection.vendor,
+            'snippets': Snippet.objects.filter(user=user).count(),
+            'requests': requests,
+            'cache': use_cache,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+        },
+        'endpoints': results,
+    }
+
+
+def format_result(name, result):
+    return (
+        '{:<20} {:>3} {:>4} queries  p50 {:>8.2f} ms  p99 {:>8.2f} ms  '
+        '{:>7} req/s'.format(
+            name, result['status'], result['queries'], result['p50_ms'],
+            result['p99_ms'], result['rps'],
+        )
+    )
+
+
+def compare(results, baseline, tolerance=0.25):
+    """
+    Return the regressions of results against baseline: endpoints running
+    more queries, or with a p50 more than tolerance slower.
+    """
+    regressions = []
+    for name, result in results['endpoints'].items():
+        base = baseline.get('endpoints', {}).get(name)
+        if base is None:
+            continue
+        if result['queries'] > base['queries']:
+            regressions.append(
+                f"{name}: {base['queries']} -> {result['queries']} queries"
+            )
+        if result['p50_ms'] > base['p50_ms'] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p50 {base['p50_ms']} -> {result['p50_ms']} ms"
+            )
+    return regressions
@@ -0,0 +1,142 @@
+"""
+Conditional requests for the snippet APIs.
+
+ETags and Last-Modified dates are derived from the stored modification
+stamps of details and the per-user version of lists (UserStats), so a
+matching If-None-Match is answered with 304 before the serializer runs and
+a stale If-Match on PUT/PATCH is refused with 412.
+"""
+import hashlib
+
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from core.models import UserStats
+
+
+def make_etag(*parts):
+    """Return a strong ETag for the given version parts."""
+    digest = hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()
+    return quote_etag(digest[:40])
+
+
+def _latest(*dates):
+    dates = [date for date in dates if date is not None]
+    return max(dates) if dates else None
+
+
+def snippet_version(snippet, renderer_format):
+    """
+    Return the (etag, last modified) pair of a snippet detail rendered
+    in renderer_format.
+    """
+    source_code = snippet.source_code
+    source_version = (
+        source_code.id, source_code.count_updated, source_code.modified,
+    ) if source_code else None
+    tags = sorted((tag.id, tag.name) for tag in snippet.tags.all())
+    etag = make_etag(
+        'snippet', snippet.id, snippet.modified, source_version, tags,
+        renderer_format,
+    )
+    return etag, _latest(
+        snippet.modified, source_code.modified if source_code else None,
+    )
+
+
+def source_code_version(source_code, renderer_format):
+    """
+    Return the (etag, last modified) pair of a source code detail
+    rendered in renderer_format.
+    """
+    etag = make_etag(
+        'source_code', source_code.id, source_code.count_updated,
+        source_code.modified, renderer_format,
+    )
+    return etag, source_code.modified
+
+
+def list_version(request):
+    """
+    Return the (etag, last modified) pair of a list response of the
+    authenticated user. Their list version is bumped by every write to
+    their rows (see snippet.listcache.invalidate_user), so one primary key
+    lookup validates any page of any list.
+    """
+    stats = UserStats.for_user(request.user.id)
+    etag = make_etag(
+        'list', request.user.id, request.get_full_path(),
+        request.accepted_renderer.format, stats.list_version,
+    )
+    return etag, stats.lists_modified
+
+
+class ConditionalMixin:
+    """
+    Add ETag and Last-Modified handling to retrieve, list and update.
+    Subclasses implement get_object_version.
+    """
+
+    def get_object_version(self, instance):
+        """Return the (etag, last modified) pair of instance."""
+        raise NotImplementedError
+
+    def conditional_response(self, request, etag, last_modified):
+        """Return a 304 or 412 response if the preconditions say so."""
+        return get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified and int(last_modified.timestamp()),
+        )
+
+    def set_validators(self, response, etag, last_modified):
+        """Set the cache validators of response."""
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        version = self.get_object_version(instance)
+        response = self.conditional_response(request, *version)
+        if response is None:
+            serializer = self.get_serializer(instance)
+            response = Response(serializer.data)
+        return self.set_validators(response, *version)
+
+    def list(self, request, *args, **kwargs):
+        version = list_version(request)
+        response = self.conditional_response(request, *version)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        return self.set_validators(response, *version)
+
+    def update(self, request, *args, **kwargs):
+        partial = kwargs.pop('partial', False)
+        instance = self.get_object()
+        response = self.conditional_response(
+            request, *self.get_object_version(instance)
+        )
+        if response is not None:
+            return response
+
+        serializer = self.get_serializer(
+            instance, data=request.data, partial=partial,
+        )
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        if getattr(instance, '_prefetched_objects_cache', None):
+            instance._prefetched_objects_cache = {}
+
+        response = Response(serializer.data)
+        return self.set_validators(
+            response, *self.get_object_version(instance)
+        )
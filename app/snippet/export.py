@@ -0,0 +1,100 @@
+"""
+Streaming export of snippet libraries as NDJSON.
+"""
+import json
+import zlib
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+from core.models import Snippet
+
+
+SOURCE_CODE_FIELDS = [
+    'title', 'author', 'code', 'notes', 'url', 'status', 'rating',
+    'is_favorite', 'created', 'modified',
+]
+
+
+def snippet_record(snippet, tags):
+    """Return the exported representation of a snippet."""
+    source_code = snippet.source_code
+    return {
+        'id': snippet.id,
+        'language_name': snippet.language_name,
+        'style': snippet.style,
+        'linenos': snippet.linenos,
+        'source_code': {
+            field: getattr(source_code, field)
+            for field in SOURCE_CODE_FIELDS
+        } if source_code else None,
+        'tags': tags,
+    }
+
+
+def _records_for_chunk(chunk):
+    """Return the records of a chunk of snippets with one tag query."""
+    tags = {snippet.id: [] for snippet in chunk}
+    for snippet_id, name in Snippet.tags.through.objects.filter(
+        snippet_id__in=tags,
+    ).order_by('tag__name').values_list('snippet_id', 'tag__name'):
+        tags[snippet_id].append(name)
+    return [snippet_record(snippet, tags[snippet.id]) for snippet in chunk]
+
+
+def iter_snippet_records(user, chunk_size=None):
+    """
+    Yield the export records of every snippet of user.
+    Rows are read through a server-side cursor so memory use does not
+    depend on the size of the library.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    snippets = Snippet.objects.filter(user=user).select_related(
+        'source_code'
+    ).defer('highlighted', 'image').order_by('id')
+
+    chunk = []
+    for snippet in snippets.iterator(chunk_size=chunk_size):
+        chunk.append(snippet)
+        if len(chunk) >= chunk_size:
+            yield from _records_for_chunk(chunk)
+            chunk = []
+    if chunk:
+        yield from _records_for_chunk(chunk)
+
+
+def iter_ndjson(records):
+    """Yield each record as one encoded JSON line."""
+    for record in records:
+        line = json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False)
+        yield (line + '\n').encode('utf-8')
+
+
+def iter_gzip(chunks, flush_size=64 * 1024):
+    """Gzip compress a stream of byte strings on the fly."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    pending = 0
+    for chunk in chunks:
+        pending += len(chunk)
+        data = compressor.compress(chunk)
+        if pending >= flush_size:
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Render a list as newline delimited JSON, one item per line."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if not isinstance(data, list):
+            data = [data]
+        return b''.join(iter_ndjson(data))
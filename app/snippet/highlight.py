@@ -0,0 +1,409 @@
+"""
+Highlighting helpers for snippets.
+
+Rendered HTML is content-addressed: the cache key is a hash of every input
+that affects the output, so identical snippets are highlighted only once.
+
+Unless HIGHLIGHT_FULL_HTML is set, snippets only store the highlighted
+token markup and the per style stylesheet is served by style_css().
+
+The other formats of ALTERNATE_FORMATS are never stored with the snippet,
+render_format() output is rendered when first asked for and kept in the
+highlight cache.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+
+from pygments import highlight
+from pygments.formatters.html import HtmlFormatter, _get_ttype_class
+from pygments.formatters.latex import LatexFormatter
+from pygments.formatters.terminal256 import Terminal256Formatter
+from pygments.lexers import get_lexer_by_name
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+CSS_CLASS = 'highlight'
+
+# Formats of the highlighted code rendered on request: the compact token
+# markup, 256 color terminal output, a LaTeX document and a JSON array of
+# tokens (see render_tokens) styled by the style_css() stylesheet.
+ALTERNATE_FORMATS = ('fragment', 'ansi', 'latex', 'tokens')
+
+
+def render_inputs(code, language_name, style, linenos, title=''):
+    """Return render_highlighted() arguments for the configured mode."""
+    full = getattr(settings, 'HIGHLIGHT_FULL_HTML', False)
+    return (code, language_name, style, linenos, title if full else '', full)
+
+
+class InstancePool:
+    """
+    Thread-safe pool of reusable objects, grouped by key.
+    An instance is used by one caller at a time. At most max_keys keys
+    and max_idle idle instances per key are kept, least recently used
+    keys are dropped first.
+    """
+
+    def __init__(self, factory, max_keys=64, max_idle=4):
+        self.factory = factory
+        self.max_keys = max_keys
+        self.max_idle = max_idle
+        self.created = 0
+        self.reused = 0
+        self._idle = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        """Return an idle instance for key or a new one."""
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self._idle.move_to_end(key)
+                self.reused += 1
+                return idle.pop()
+            self.created += 1
+        return self.factory(*key)
+
+    def release(self, key, instance):
+        """Return an instance to the pool."""
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            self._idle.move_to_end(key)
+            if len(idle) < self.max_idle:
+                idle.append(instance)
+            while len(self._idle) > self.max_keys:
+                self._idle.popitem(last=False)
+
+    @contextmanager
+    def borrow(self, key):
+        """Use an instance for key inside a with block."""
+        instance = self.acquire(key)
+        try:
+            yield instance
+        finally:
+            self.release(key, instance)
+
+    def clear(self):
+        with self._lock:
+            self._idle.clear()
+            self.created = 0
+            self.reused = 0
+
+    def stats(self):
+        """Return the pool counters."""
+        with self._lock:
+            return {
+                'created': self.created,
+                'reused': self.reused,
+                'keys': len(self._idle),
+            }
+
+
+def _new_formatter(style, linenos, full, title):
+    options = {'title': title} if title else {}
+    return HtmlFormatter(
+        style=style,
+        linenos='table' if linenos else False,
+        full=full,
+        cssclass=CSS_CLASS,
+        **options
+    )
+
+
+lexer_pool = InstancePool(get_lexer_by_name, max_keys=128)
+formatter_pool = InstancePool(_new_formatter, max_keys=64)
+
+
+def render_highlighted(code, language_name, style, linenos, title='',
+                       full=False):
+    """Return highlighted HTML for code without using the cache."""
+    formatter_key = (style, bool(linenos), full, title if full else '')
+    with lexer_pool.borrow((language_name,)) as lexer, \
+            formatter_pool.borrow(formatter_key) as formatter:
+        return highlight(code, lexer, formatter)
+
+
+def render_tokens(code, language_name):
+    """
+    Return the tokens of code as [css class, text] pairs, or as plain
+    strings for text without a class, merging neighbouring tokens of the
+    same class.
+    """
+    tokens = []
+    last_class = None
+    with lexer_pool.borrow((language_name,)) as lexer:
+        for ttype, value in lexer.get_tokens(code):
+            css_class = _get_ttype_class(ttype)
+            if tokens and css_class == last_class:
+                if css_class:
+                    tokens[-1][1] += value
+                else:
+                    tokens[-1] += value
+            else:
+                tokens.append([css_class, value] if css_class else value)
+            last_class = css_class
+    return tokens
+
+
+def render_format(code, language_name, style, linenos, highlight_format):
+    """Return code highlighted in one of ALTERNATE_FORMATS."""
+    if highlight_format == 'fragment':
+        return render_highlighted(code, language_name, style, linenos)
+    if highlight_format == 'tokens':
+        return json.dumps(
+            render_tokens(code, language_name),
+            ensure_ascii=False, separators=(',', ':'),
+        )
+    if highlight_format == 'ansi':
+        formatter = Terminal256Formatter(style=style, linenos=bool(linenos))
+    elif highlight_format == 'latex':
+        formatter = LatexFormatter(
+            style=style, linenos=bool(linenos), full=True,
+        )
+    else:
+        raise ValueError(f'Unknown highlight format: {highlight_format}')
+    with lexer_pool.borrow((language_name,)) as lexer:
+        return highlight(code, lexer, formatter)
+
+
+def pool_stats():
+    """Return the lexer and formatter pool counters."""
+    return {
+        'lexers': lexer_pool.stats(),
+        'formatters': formatter_pool.stats(),
+    }
+
+
+@lru_cache(maxsize=None)
+def style_css(style):
+    """Return the stylesheet and its ETag for compact snippets of a style."""
+    formatter = HtmlFormatter(style=style, cssclass=CSS_CLASS)
+    prefix = f'.{CSS_CLASS}'
+    # get_style_defs() leaves the line number rules global (pre, td.linenos),
+    # they are scoped to the snippet like the token rules.
+    css = '\n'.join(
+        [f'{prefix} {rule}' for rule in formatter.get_linenos_style_defs()] +
+        formatter.get_background_style_defs(prefix) +
+        formatter.get_token_style_defs(prefix)
+    )
+    etag = hashlib.sha256(css.encode('utf-8')).hexdigest()[:32]
+    return css, f'"{etag}"'
+
+
+def make_key(code, language_name, style, linenos, title='', full=False):
+    """Return the content hash identifying a rendered snippet."""
+    digest = hashlib.sha256()
+    parts = (language_name, style, str(bool(linenos)), str(bool(full)),
+             title, code)
+    for part in parts:
+        part = (part or '').encode('utf-8')
+        digest.update(str(len(part)).encode('ascii') + b':' + part)
+    return digest.hexdigest()
+
+
+class LRUBackend:
+    """In-process LRU cache bounded by the total size of stored values."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        value_size = len(value.encode('utf-8'))
+        if value_size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= len(old.encode('utf-8'))
+            self._data[key] = value
+            self.size += value_size
+            while self.size > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.size -= len(evicted.encode('utf-8'))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DjangoCacheBackend:
+    """
+    Store rendered snippets in a Django cache.
+    Keys are namespaced by a generation number so clear() only drops
+    highlight entries instead of flushing the whole cache.
+    """
+    prefix = 'highlight'
+
+    def __init__(self, alias='default', timeout=None):
+        self.cache = caches[alias]
+        self.timeout = timeout
+
+    def _generation(self):
+        return self.cache.get_or_set(f'{self.prefix}:gen', 1, None)
+
+    def _key(self, key):
+        return f'{self.prefix}:{self._generation()}:{key}'
+
+    def get(self, key):
+        return self.cache.get(self._key(key))
+
+    def set(self, key, value):
+        self.cache.set(self._key(key), value, self.timeout)
+
+    def clear(self):
+        try:
+            self.cache.incr(f'{self.prefix}:gen')
+        except ValueError:
+            self.cache.set(f'{self.prefix}:gen', 2, None)
+
+
+class HighlightCache:
+    """Render-through cache for highlighted HTML with hit/miss counters."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _get_or_render(self, key, render, *args):
+        value = self.backend.get(key)
+        if value is not None:
+            with self._lock:
+                self.hits += 1
+            return value
+
+        with self._lock:
+            self.misses += 1
+        value = render(*args)
+        self.backend.set(key, value)
+        return value
+
+    def get_or_render(self, code, language_name, style, linenos, title=''):
+        """Return cached HTML, rendering and storing it on a miss."""
+        args = render_inputs(code, language_name, style, linenos, title)
+        return self._get_or_render(make_key(*args), render_highlighted, *args)
+
+    def get_or_render_format(self, code, language_name, style, linenos,
+                             highlight_format):
+        """
+        Return code in one of ALTERNATE_FORMATS from the cache, rendering
+        and storing it on a miss. Fragments share the entries of compact
+        snippets.
+        """
+        key = make_key(code, language_name, style, linenos)
+        if highlight_format != 'fragment':
+            key = f'{highlight_format}:{key}'
+        return self._get_or_render(
+            key, render_format,
+            code, language_name, style, linenos, highlight_format,
+        )
+
+    def render_many(self, inputs, executor=None):
+        """
+        Render a list of render input tuples.
+        Cache misses are rendered on executor when one is given.
+        Returns html strings, or the raised exceptions, in input order.
+        """
+        inputs = [render_inputs(*args) for args in inputs]
+        results = [None] * len(inputs)
+        pending = {}
+        for i, args in enumerate(inputs):
+            key = make_key(*args)
+            html = self.backend.get(key)
+            with self._lock:
+                if html is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            if html is not None:
+                results[i] = html
+            elif executor is not None:
+                pending[i] = key, executor.submit(render_highlighted, *args)
+            else:
+                pending[i] = key, None
+
+        for i, (key, future) in pending.items():
+            try:
+                if future is None:
+                    html = render_highlighted(*inputs[i])
+                else:
+                    html = future.result()
+            except Exception as exc:
+                results[i] = exc
+                continue
+            self.backend.set(key, html)
+            results[i] = html
+
+        return results
+
+    def clear(self):
+        """Drop every cached entry and reset the counters."""
+        self.backend.clear()
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Return the cache counters."""
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+_cache = None
+_executor = None
+
+
+def build_backend(config):
+    """Create the cache backend described by a HIGHLIGHT_CACHE setting."""
+    backend = config.get('BACKEND', 'lru')
+    if backend == 'lru':
+        return LRUBackend(config.get('MAX_BYTES', 32 * 1024 * 1024))
+    if backend == 'django':
+        return DjangoCacheBackend(
+            alias=config.get('CACHE_ALIAS', 'default'),
+            timeout=config.get('TIMEOUT'),
+        )
+    raise ValueError(f'Unknown highlight cache backend: {backend}')
+
+
+def get_highlight_cache():
+    """Return the process wide highlight cache."""
+    global _cache
+    if _cache is None:
+        config = getattr(settings, 'HIGHLIGHT_CACHE', {})
+        _cache = HighlightCache(build_backend(config))
+    return _cache
+
+
+def get_bulk_executor():
+    """Return the process pool highlighting bulk requests, or None."""
+    global _executor
+    processes = getattr(settings, 'HIGHLIGHT_BULK_PROCESSES', 0)
+    if processes and _executor is None:
+        _executor = ProcessPoolExecutor(processes)
+    return _executor
@@ -0,0 +1,251 @@
+"""
+Microbenchmarks of the highlighting engine.
+
+Every (language, style, linenos) series renders a corpus at growing sizes
+in a child process through render_highlighted(), the function behind
+SnippetDetailSerializer._create_highlighted once the cache is bypassed.
+A series is stopped when one render exceeds the timeout, and a series
+whose render time grows clearly faster than its size is flagged, since
+some Pygments lexers are quadratic on some inputs. Used by
+`manage.py benchmark_highlight`.
+"""
+import math
+import multiprocessing
+import os
+import sysconfig
+import time
+import tracemalloc
+
+import django
+
+from snippet.highlight import render_highlighted
+from snippet.importer import language_for_filename
+
+
+SYNTHETIC_LINES = [
+    'def function_{n}(value, *args, **kwargs):',
+    '    return {{"key_{n}": [value, {n}, 0x{n:x}, 3.14e-5]}}  # note {n}',
+    'int var_{n} = (a_{n} + b) * c / 2; // line {n}',
+    '<div class="item-{n}" data-id=\'{n}\'>text &amp; more</div>',
+    "SELECT * FROM table_{n} WHERE name = 'x' AND id > {n};",
+    '    if (x_{n} >= 10 && y != "str\\"{n}") {{ call(x); }}',
+    '/* block comment {n} */ let s = `template ${{v_{n}}}`;',
+    '$var_{n} = @array[{n}] =~ s/foo(\\d+)/bar$1/g;',
+    '',
+]
+REAL_WORLD_EXTENSIONS = ('.py', '.js', '.css', '.html')
+
+
+def synthetic_corpus(lines):
+    """Return lines of code-like text mixing common syntaxes."""
+    return [
+        SYNTHETIC_LINES[index % len(SYNTHETIC_LINES)].format(n=index)
+        for index in range(lines)
+    ]
+
+
+def real_world_paths():
+    """Return source trees always installed: the stdlib and Django."""
+    return [
+        os.path.join(sysconfig.get_paths()['stdlib'], 'json'),
+        os.path.join(sysconfig.get_paths()['stdlib'], 'email'),
+        os.path.join(os.path.dirname(django.__file__), 'contrib', 'admin'),
+    ]
+
+
+def load_corpora(paths, max_lines):
+    """
+    Return {language: lines} read from the files under paths, with the
+    language of each file inferred from its name.
+    """
+    corpora = {}
+    for path in paths:
+        if os.path.isfile(path):
+            files = [path]
+        else:
+            files = sorted(
+                os.path.join(root, name)
+                for root, _, names in os.walk(path) for name in names
+                if name.endswith(REAL_WORLD_EXTENSIONS)
+            )
+        for filename in files:
+            language = language_for_filename(filename)
+            lines = corpora.setdefault(language, [])
+            if len(lines) >= max_lines:
+                continue
+            try:
+                with open(filename, encoding='utf-8') as source:
+                    lines.extend(source.read().splitlines())
+            except (OSError, UnicodeDecodeError):
+                continue
+    return {language: lines for language, lines in corpora.items() if lines}
+
+
+def sized(lines, size):
+    """Return the first size lines of a corpus, repeating it if short."""
+    repeats = -(-size // len(lines))
+    return '\n'.join((lines * repeats)[:size]) + '\n'
+
+
+def _run_series(conn, lines, case, sizes, repeat, memory):
+    """Child process: render every size and send one result per size."""
+    render_highlighted('', case['language'], case['style'], case['linenos'],
+                       full=case['full'])
+    for size in sizes:
+        code = sized(lines, size)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            html = render_highlighted(
+                code, case['language'], case['style'], case['linenos'],
+                full=case['full'],
+            )
+            timings.append(time.perf_counter() - start)
+
+        peak = None
+        if memory:
+            tracemalloc.start()
+            render_highlighted(
+                code, case['language'], case['style'], case['linenos'],
+                full=case['full'],
+            )
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        seconds = min(timings)
+        code_bytes = len(code.encode('utf-8'))
+        conn.send({
+            'lines': size,
+            'bytes': code_bytes,
+            'output_bytes': len(html.encode('utf-8')),
+            'seconds': round(seconds, 6),
+            'lines_per_sec': round(size / seconds) if seconds else None,
+            'bytes_per_sec': round(code_bytes / seconds) if seconds else None,
+            'peak_memory_bytes': peak,
+        })
+    conn.close()
+
+
+def run_series(lines, case, sizes, repeat=3, timeout=10, memory=True):
+    """
+    Render a case at every size in a child process and return its results
+    and, if a render took longer than timeout seconds, the size it hit.
+    """
+    context = multiprocessing.get_context(
+        'fork' if 'fork' in multiprocessing.get_all_start_methods()
+        else None
+    )
+    parent, child = context.Pipe(duplex=False)
+    process = context.Process(
+        target=_run_series,
+        args=(child, lines, case, sizes, repeat, memory),
+        daemon=True,
+    )
+    process.start()
+    child.close()
+
+    results = []
+    timed_out = None
+    try:
+        for size in sizes:
+            # A render runs repeat times, plus once for the memory peak.
+            if not parent.poll(timeout * (repeat + memory)):
+                timed_out = size
+                break
+            try:
+                results.append(parent.recv())
+            except EOFError:
+                timed_out = size
+                break
+    finally:
+        if process.is_alive():
+            process.terminate()
+        process.join()
+        parent.close()
+    return results, timed_out
+
+
+def growth_exponent(results, min_seconds=0.005):
+    """
+    Return the largest exponent k of time ~ lines ** k between consecutive
+    sizes, ignoring renders too fast to time reliably.
+    """
+    exponent = None
+    for small, large in zip(results, results[1:]):
+        if small['seconds'] < min_seconds:
+            continue
+        value = math.log(large['seconds'] / small['seconds']) / \
+            math.log(large['lines'] / small['lines'])
+        exponent = value if exponent is None else max(exponent, value)
+    return exponent
+
+
+def flag(series, timed_out, timeout, max_exponent, min_lines_per_sec):
+    """Return the reasons a series looks pathological."""
+    reasons = []
+    if timed_out:
+        reasons.append(f'render of {timed_out} lines exceeded {timeout}s')
+    exponent = growth_exponent(series['results'])
+    if exponent is not None and exponent > max_exponent:
+        reasons.append(f'time grows as lines^{exponent:.2f}')
+    if series['results']:
+        last = series['results'][-1]
+        if last['lines_per_sec'] and \
+                last['lines_per_sec'] < min_lines_per_sec:
+            reasons.append(
+                f"{last['lines_per_sec']} lines/s at {last['lines']} lines"
+            )
+    return reasons
+
+
+def run(cases, sizes, repeat=3, timeout=10, memory=True, max_exponent=1.5,
+        min_lines_per_sec=1000, stdout=None):
+    """
+    Run the benchmark series and return the machine readable results.
+    cases are (corpus name, lines, case) tuples, case holding the
+    render_highlighted() arguments.
+    """
+    all_series = []
+    flagged = []
+    for corpus, lines, case in cases:
+        results, timed_out = run_series(
+            lines, case, sizes, repeat=repeat, timeout=timeout,
+            memory=memory,
+        )
+        series = {'corpus': corpus, **case, 'results': results}
+        reasons = flag(
+            series, timed_out, timeout, max_exponent, min_lines_per_sec,
+        )
+        if reasons:
+            series['flags'] = reasons
+            flagged.append({
+                'corpus': corpus, **case, 'reasons': reasons,
+            })
+        all_series.append(series)
+        if stdout:
+            stdout.write(format_series(series))
+
+    return {
+        'meta': {
+            'sizes': sizes,
+            'repeat': repeat,
+            'timeout': timeout,
+            'memory': memory,
+        },
+        'series': all_series,
+        'flagged': flagged,
+    }
+
+
+def format_series(series):
+    """Return a one line summary of a series."""
+    name = '{corpus}/{language}/{style}{table}'.format(
+        table='/table' if series['linenos'] else '', **series,
+    )
+    rates = ' '.join(
+        f"{result['lines']}:{result['lines_per_sec']}"
+        for result in series['results']
+    )
+    flags = ('  !! ' + '; '.join(series['flags'])) \
+        if series.get('flags') else ''
+    return f'{name:<40} lines/s {rates}{flags}'
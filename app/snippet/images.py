@@ -0,0 +1,171 @@
+"""
+Processing of snippet image uploads.
+
+Uploads are streamed to a temporary file and refused once they pass
+IMAGE_UPLOAD['MAX_BYTES']. Accepted images are checked for format and
+dimensions, stored under the hash of their content (see
+core.models.snippet_image_file_path) and given resized thumbnails and
+WebP copies, rendered on a thread pool as Pillow releases the GIL while
+resizing and encoding. Variants are content-addressed too, so images
+uploaded twice are stored and processed once.
+"""
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image, ImageOps, features
+from rest_framework import serializers
+
+
+# Extension and variant format of the accepted image formats.
+IMAGE_FORMATS = {
+    'JPEG': ('.jpg', 'JPEG'),
+    'PNG': ('.png', 'PNG'),
+    'GIF': ('.gif', 'PNG'),
+    'WEBP': ('.webp', 'WEBP'),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """Stream uploads to a temporary file, up to the image size limit."""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        max_bytes = settings.IMAGE_UPLOAD['MAX_BYTES']
+        if self.received > max_bytes:
+            raise serializers.ValidationError({'image': [
+                f'Images are limited to {max_bytes} bytes.'
+            ]})
+        return super().receive_data_chunk(raw_data, start)
+
+
+def validate_image(upload):
+    """
+    Check the format, size and dimensions of an uploaded image, which
+    has already been opened by the image field, and name it after its
+    format.
+    """
+    config = settings.IMAGE_UPLOAD
+    if upload.size > config['MAX_BYTES']:
+        raise serializers.ValidationError(
+            f"Images are limited to {config['MAX_BYTES']} bytes."
+        )
+    image = upload.image
+    if image.format not in config['FORMATS']:
+        raise serializers.ValidationError(
+            f'{image.format} images are not accepted.'
+        )
+    width, height = image.size
+    if width > config['MAX_WIDTH'] or height > config['MAX_HEIGHT'] or \
+            width * height > config['MAX_PIXELS']:
+        raise serializers.ValidationError(
+            f"Images are limited to {config['MAX_WIDTH']}x"
+            f"{config['MAX_HEIGHT']} pixels."
+        )
+    upload.name = 'image' + IMAGE_FORMATS[image.format][0]
+    return upload
+
+
+def webp_enabled():
+    """Return whether WebP variants are made."""
+    return settings.IMAGE_UPLOAD['WEBP'] and features.check('webp')
+
+
+def get_executor():
+    """Return the thread pool making image variants, or None."""
+    global _executor
+    threads = settings.IMAGE_UPLOAD['THREADS']
+    if not threads:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=threads, thread_name_prefix='image',
+            )
+        return _executor
+
+
+def variant_jobs(name, width, image_format):
+    """
+    Return (key, variant name, width, format) tuples of the variants of
+    a stored image that is width pixels wide. Variants with a width of
+    None keep the size of the image.
+    """
+    root, _ = os.path.splitext(name)
+    variant_format = IMAGE_FORMATS[image_format][1]
+    extension = '.jpg' if variant_format == 'JPEG' else \
+        f'.{variant_format.lower()}'
+    webp = webp_enabled()
+    jobs = []
+    for size in settings.IMAGE_UPLOAD['THUMBNAIL_WIDTHS']:
+        if size >= width:
+            continue
+        jobs.append((str(size), f'{root}_{size}{extension}', size,
+                     variant_format))
+        if webp and variant_format != 'WEBP':
+            jobs.append((f'{size}_webp', f'{root}_{size}.webp', size,
+                         'WEBP'))
+    if webp and image_format != 'WEBP':
+        jobs.append(('webp', f'{root}.webp', None, 'WEBP'))
+    return jobs
+
+
+def make_variant(storage, name, variant_name, width, variant_format):
+    """Render one variant of a stored image unless it exists."""
+    if storage.exists(variant_name):
+        return variant_name
+    with storage.open(name) as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        if width is not None:
+            image.thumbnail((width, image.height), Image.LANCZOS)
+
+    if variant_format == 'JPEG':
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        image = image.convert('RGBA')
+    output = io.BytesIO()
+    # Metadata such as EXIF is not copied to the variants.
+    image.save(
+        output, variant_format,
+        quality=settings.IMAGE_UPLOAD['QUALITY'], optimize=True,
+    )
+    return storage.save(variant_name, ContentFile(output.getvalue()))
+
+
+def make_variants(field_file, image_format, width):
+    """Render the variants of a stored image and return {key: name}."""
+    jobs = variant_jobs(field_file.name, width, image_format)
+    args = [
+        (field_file.storage, field_file.name, variant_name, size, fmt)
+        for _, variant_name, size, fmt in jobs
+    ]
+    executor = get_executor()
+    if executor is None:
+        names = [make_variant(*item) for item in args]
+    else:
+        names = list(executor.map(lambda item: make_variant(*item), args))
+    return {job[0]: name for job, name in zip(jobs, names)}
+
+
+def variant_urls(snippet, request=None):
+    """Return {key: url} of the image variants of a snippet."""
+    if not snippet.image:
+        return {}
+    storage = snippet.image.storage
+    urls = {}
+    for key, name in sorted(snippet.image_variants.items()):
+        url = storage.url(name)
+        urls[key] = request.build_absolute_uri(url) if request else url
+    return urls
@@ -0,0 +1,151 @@
+"""
+Streaming import of snippet archives.
+
+Archives are NDJSON files as written by the export (optionally gzipped) or
+zip files of source files. Items are parsed one at a time and written in
+batches through SnippetBulkSerializer.
+"""
+import gzip
+import io
+import json
+import os
+import zipfile
+
+from django.conf import settings
+from pygments.lexers import get_lexer_for_filename
+from pygments.util import ClassNotFound
+
+from snippet.serializers import DUPLICATE_CODE_ERROR, SnippetBulkSerializer
+
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZIP_MAGIC = b'PK\x03\x04'
+
+
+def record_to_item(record):
+    """Convert an exported snippet record to a bulk create item."""
+    item = {
+        key: record[key]
+        for key in ('language_name', 'style', 'linenos', 'source_code')
+        if record.get(key) is not None
+    }
+    item['tags'] = [{'name': name} for name in record.get('tags') or []]
+    return item
+
+
+def iter_ndjson_items(fileobj):
+    """Yield (line number, item) pairs of an NDJSON file."""
+    for lineno, line in enumerate(io.TextIOWrapper(fileobj, 'utf-8'), 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield f'line {lineno}', exc
+            continue
+        if not isinstance(record, dict):
+            yield f'line {lineno}', ValueError('Expected a JSON object.')
+            continue
+        yield f'line {lineno}', record_to_item(record)
+
+
+def language_for_filename(filename):
+    """Return the language name inferred from a file name."""
+    try:
+        return get_lexer_for_filename(filename).aliases[0]
+    except (ClassNotFound, IndexError):
+        return 'text'
+
+
+def iter_zip_items(fileobj):
+    """Yield (file name, item) pairs of the source files in a zip file."""
+    with zipfile.ZipFile(fileobj) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            if info.file_size > settings.IMPORT_MAX_FILE_SIZE:
+                yield info.filename, ValueError('File is too large.')
+                continue
+            try:
+                code = archive.read(info).decode('utf-8')
+            except UnicodeDecodeError:
+                yield info.filename, ValueError('File is not UTF-8 text.')
+                continue
+            yield info.filename, {
+                'language_name': language_for_filename(info.filename),
+                'source_code': {
+                    'title': os.path.basename(info.filename)[:255],
+                    'code': code,
+                },
+            }
+
+
+def iter_archive_items(fileobj):
+    """Yield (reference, item) pairs, detecting the archive format."""
+    magic = fileobj.read(4)
+    fileobj.seek(0)
+    if magic.startswith(ZIP_MAGIC):
+        return iter_zip_items(fileobj)
+    if magic.startswith(GZIP_MAGIC):
+        return iter_ndjson_items(gzip.GzipFile(fileobj=fileobj))
+    return iter_ndjson_items(fileobj)
+
+
+def _import_batch(user, batch, summary):
+    """Write one batch of items and add the outcome to summary."""
+    serializer = SnippetBulkSerializer(
+        data={'create': [item for _, item in batch]},
+        context={'user': user},
+    )
+    serializer.is_valid(raise_exception=True)
+    result = serializer.save()
+    summary['created'] += sum(1 for pk in result['created'] if pk)
+    for error in result['errors']:
+        code_errors = error['errors'].get('source_code', {})
+        if isinstance(code_errors, dict) and \
+                code_errors.get('code') == [DUPLICATE_CODE_ERROR]:
+            summary['duplicates'] += 1
+        else:
+            _add_error(summary, batch[error['index']][0], error['errors'])
+
+
+def _add_error(summary, reference, errors):
+    summary['failed'] += 1
+    if len(summary['errors']) < settings.IMPORT_MAX_REPORTED_ERRORS:
+        summary['errors'].append({'item': reference, 'errors': errors})
+
+
+def import_archive(user, fileobj, batch_size=None, progress=None):
+    """
+    Import the snippets of an archive for user and return a summary.
+    progress is called with the summary after every batch.
+    """
+    batch_size = min(
+        batch_size or settings.IMPORT_BATCH_SIZE, settings.BULK_MAX_ITEMS,
+    )
+    summary = {
+        'processed': 0, 'created': 0, 'duplicates': 0, 'failed': 0,
+        'errors': [],
+    }
+    batch = []
+    try:
+        for reference, item in iter_archive_items(fileobj):
+            summary['processed'] += 1
+            if isinstance(item, Exception):
+                _add_error(summary, reference, [str(item)])
+                continue
+            batch.append((reference, item))
+            if len(batch) >= batch_size:
+                _import_batch(user, batch, summary)
+                batch = []
+                if progress:
+                    progress(summary)
+    except (zipfile.BadZipFile, OSError, EOFError,
+            UnicodeDecodeError) as exc:
+        _add_error(summary, 'archive', [str(exc)])
+    if batch:
+        _import_batch(user, batch, summary)
+    if progress:
+        progress(summary)
+    return summary
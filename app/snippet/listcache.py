@@ -0,0 +1,111 @@
+"""
+Per-user cache of list responses.
+
+Every user has a generation counter in the cache that is bumped whenever
+one of their snippets, source codes or tags changes (see snippet.signals).
+List responses are stored under the generation, so a write makes all the
+cached lists of that user unreachable without having to find them.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.models import UserStats
+
+
+# Response headers stored with the cached data.
+CACHED_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control', 'Vary')
+
+
+def get_cache():
+    return caches[settings.LIST_CACHE['CACHE_ALIAS']]
+
+
+def _generation_key(user_id):
+    return f'snippet-list:gen:{user_id}'
+
+
+def get_generation(user_id):
+    """Return the list cache generation of a user."""
+    # Start from the clock so an evicted counter never restarts at a
+    # generation whose entries may still be cached.
+    return get_cache().get_or_set(
+        _generation_key(user_id), time.time_ns(), None
+    )
+
+
+def bump_generation(user_id):
+    """Make every cached list of a user stale."""
+    cache = get_cache()
+    try:
+        cache.incr(_generation_key(user_id))
+    except ValueError:
+        cache.set(_generation_key(user_id), time.time_ns(), None)
+
+
+def invalidate_user(user_id):
+    """
+    Bump the list version of a user and their generation, now and again
+    when the transaction commits, so lists read before the commit are not
+    cached as current.
+    """
+    if user_id is None:
+        return
+    UserStats.touch(user_id)
+    bump_generation(user_id)
+    transaction.on_commit(lambda: bump_generation(user_id))
+
+
+def list_cache_key(request, basename):
+    """Return the cache key of a list request of the authenticated user."""
+    user_id = request.user.id
+    path = hashlib.md5(request.get_full_path().encode('utf-8')).hexdigest()
+    return 'snippet-list:{}:{}:{}:{}:{}'.format(
+        user_id, get_generation(user_id), basename,
+        request.accepted_renderer.format, path,
+    )
+
+
+class CachedListMixin:
+    """Serve list responses from the per-user list cache."""
+
+    def list(self, request, *args, **kwargs):
+        if not settings.LIST_CACHE['ENABLED']:
+            return super().list(request, *args, **kwargs)
+
+        cache = get_cache()
+        key = list_cache_key(request, self.basename)
+        entry = cache.get(key)
+        if entry is None:
+            response = super().list(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                headers = {
+                    name: response[name] for name in CACHED_HEADERS
+                    if response.has_header(name)
+                }
+                cache.set(
+                    key, (response.data, headers),
+                    settings.LIST_CACHE['TIMEOUT'],
+                )
+            return response
+
+        data, headers = entry
+        response = get_conditional_response(
+            request,
+            etag=headers.get('ETag'),
+            last_modified=parse_http_date_safe(
+                headers.get('Last-Modified', '')
+            ),
+        )
+        if response is None:
+            response = Response(data)
+        for name, value in headers.items():
+            response[name] = value
+        return response
@@ -0,0 +1,152 @@
+"""
+Keyset pagination for the snippet APIs.
+"""
+import base64
+import binascii
+import json
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginate by the values of the view ordering instead of an OFFSET.
+    The cursor holds the ordering values of the last row on a page, so
+    every page costs the same index range scan and rows inserted while a
+    client pages through a list do not shift later pages.
+    The last ordering field must be unique, such as the primary key.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self):
+        self.page_size = settings.PAGE_SIZE
+        self.max_page_size = settings.MAX_PAGE_SIZE
+
+    def get_page_size(self, request):
+        """Return the requested page size, capped to max_page_size."""
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def encode_cursor(self, values):
+        data = json.dumps(values, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, request):
+        """Return the ordering values stored in the request cursor."""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded))
+        except (binascii.Error, ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or \
+                len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def clean_cursor(self, queryset, values):
+        """Return the cursor values converted to their ordering fields."""
+        cleaned = []
+        for field, value in zip(self.ordering, values):
+            if value is None or not isinstance(value, (str, int, float)):
+                raise NotFound(self.invalid_cursor_message)
+            model_field = queryset.model._meta.get_field(field.lstrip('-'))
+            try:
+                value = model_field.to_python(value)
+                model_field.get_prep_value(value)
+            except (ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+            cleaned.append(value)
+        return cleaned
+
+    def _after(self, values):
+        """Return a filter selecting the rows after the cursor values."""
+        conditions = []
+        for i, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {
+                prev.lstrip('-'): value
+                for prev, value in zip(self.ordering[:i], values)
+            }
+            conditions.append(Q(**equal, **{f'{name}__{lookup}': values[i]}))
+        return reduce(or_, conditions)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = list(getattr(view, 'ordering', ('-id',)))
+        self.page_size = self.get_page_size(request)
+
+        values = self.decode_cursor(request)
+        queryset = queryset.order_by(*self.ordering)
+        if values is not None:
+            values = self.clean_cursor(queryset, values)
+            queryset = queryset.filter(self._after(values))
+
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        if self.has_next:
+            last = page[-1]
+            self.next_cursor = self.encode_cursor([
+                getattr(last, field.lstrip('-')) for field in self.ordering
+            ])
+        return page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.next_cursor
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of results to return per page.',
+                'schema': {'type': 'integer'},
+            },
+        ]
@@ -0,0 +1,215 @@
+"""
+PNG and SVG images of highlighted snippets.
+
+Images are rendered with Pygments' ImageFormatter and SvgFormatter and
+stored on disk under the hash of the inputs of the highlighted html (see
+snippet.highlight.make_key) and their format, so each is rendered once.
+Renders run on a pool of RENDER_IMAGE['PROCESSES'] processes and each API
+process keeps at most RENDER_IMAGE['MAX_PENDING'] of them in flight;
+requests past that are refused instead of queued, so a burst of image
+requests cannot hold every API thread.
+
+Serving an image updates its modification time, and prune() deletes the
+images of old inputs by that time (see `manage.py prune_renders`).
+"""
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from pygments import highlight
+from pygments.formatters.img import FontNotFound, ImageFormatter
+from pygments.formatters.svg import SvgFormatter
+
+from core.storage import ContentAddressedStorage
+from snippet.highlight import lexer_pool, make_key
+
+
+IMAGE_FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+_executor = None
+_pending = 0
+_lock = threading.Lock()
+
+
+class RenderBusy(Exception):
+    """Every render slot of the process is taken."""
+
+
+class RenderUnavailable(Exception):
+    """The image format cannot be rendered here, e.g. fonts are missing."""
+
+
+def get_storage():
+    """Return the storage of rendered images."""
+    return ContentAddressedStorage(
+        location=settings.RENDER_IMAGE['DIRECTORY'],
+    )
+
+
+def get_executor():
+    """Return the process pool rendering images, or None."""
+    global _executor
+    processes = settings.RENDER_IMAGE['PROCESSES']
+    if not processes:
+        return None
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(processes)
+        return _executor
+
+
+def render_name(code, language_name, style, linenos, image_format):
+    """Return the file name of a rendered image."""
+    key = make_key(code, language_name, style, linenos)
+    return f'{key}.{image_format}'
+
+
+def render_image(code, language_name, style, linenos, image_format):
+    """Return the bytes of an image of highlighted code."""
+    font_size = settings.RENDER_IMAGE['FONT_SIZE']
+    if image_format == 'png':
+        try:
+            formatter = ImageFormatter(
+                style=style,
+                line_numbers=bool(linenos),
+                font_size=font_size,
+                image_format='png',
+            )
+        except (FontNotFound, OSError) as exc:
+            raise RenderUnavailable(f'PNG images need fonts: {exc}')
+    else:
+        formatter = SvgFormatter(
+            style=style,
+            linenos=bool(linenos),
+            fontsize=f'{font_size}px',
+            encoding='utf-8',
+        )
+    with lexer_pool.borrow((language_name,)) as lexer:
+        return highlight(code, lexer, formatter)
+
+
+def render_to_storage(name, code, language_name, style, linenos,
+                      image_format):
+    """Render an image into the storage unless it is there already."""
+    storage = get_storage()
+    if not storage.exists(name):
+        data = render_image(code, language_name, style, linenos,
+                            image_format)
+        storage.save(name, ContentFile(data))
+    return name
+
+
+def _acquire():
+    global _pending
+    with _lock:
+        if _pending >= settings.RENDER_IMAGE['MAX_PENDING']:
+            raise RenderBusy()
+        _pending += 1
+
+
+def _release(*args):
+    global _pending
+    with _lock:
+        _pending -= 1
+
+
+def touch(storage, name):
+    """Mark a stored image as requested, return False if it is missing."""
+    try:
+        os.utime(storage.path(name))
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def prune(max_bytes=None, max_age=None):
+    """
+    Delete the stored images not requested for max_age seconds, then the
+    least recently requested ones until at most max_bytes are stored.
+    Return the number of files and bytes deleted.
+    """
+    try:
+        entries = list(os.scandir(settings.RENDER_IMAGE['DIRECTORY']))
+    except FileNotFoundError:
+        return 0, 0
+    files = []
+    for entry in entries:
+        try:
+            if entry.is_file():
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry))
+        except FileNotFoundError:
+            continue
+    files.sort(key=lambda item: item[0])
+
+    now = time.time()
+    total = sum(size for _, size, _ in files)
+    deleted = freed = 0
+    for mtime, size, entry in files:
+        expired = max_age is not None and now - mtime > max_age
+        if not expired and (max_bytes is None or total <= max_bytes):
+            break
+        # Temporary files are renamed into place once written.
+        if entry.name.endswith('.tmp') and not expired:
+            continue
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            continue
+        total -= size
+        deleted += 1
+        freed += size
+    return deleted, freed
+
+
+def render_args(snippet, image_format):
+    """Return the render_image() arguments of a snippet."""
+    source_code = snippet.source_code
+    return (
+        source_code.code if source_code else '',
+        snippet.language_name,
+        snippet.style,
+        snippet.linenos,
+        image_format,
+    )
+
+
+def get_or_render(name, args):
+    """
+    Return the storage of a rendered image, rendering it under name first
+    if needed. Raises RenderBusy when no render slot is free or the render
+    takes longer than RENDER_IMAGE['TIMEOUT'] seconds.
+    """
+    storage = get_storage()
+    if touch(storage, name):
+        return storage
+
+    _acquire()
+    executor = get_executor()
+    if executor is None:
+        try:
+            render_to_storage(name, *args)
+        finally:
+            _release()
+        return storage
+
+    # The slot is held until the render ends, even if the request has
+    # given up on it; the image is stored for the next request anyway.
+    try:
+        future = executor.submit(render_to_storage, name, *args)
+    except Exception:
+        _release()
+        raise
+    future.add_done_callback(_release)
+    try:
+        future.result(timeout=settings.RENDER_IMAGE['TIMEOUT'])
+    except FutureTimeoutError:
+        raise RenderBusy()
+    return storage
@@ -0,0 +1,33 @@
+"""
+Renderers serving the highlighted code of a snippet on its own.
+"""
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class HighlightedRenderer(BaseRenderer):
+    """
+    Render the highlighted field of a snippet detail as the response
+    body. Other data, such as errors, is rendered as JSON text.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if isinstance(data, dict) and 'highlighted' in data:
+            return data['highlighted'].encode(self.charset)
+        return (json.dumps(data) + '\n').encode(self.charset)
+
+
+class ANSIRenderer(HighlightedRenderer):
+    """Render a snippet for 256 color terminals."""
+    media_type = 'text/x-ansi'
+    format = 'ansi'
+
+
+class LaTeXRenderer(HighlightedRenderer):
+    """Render a snippet as a LaTeX document."""
+    media_type = 'application/x-latex'
+    format = 'latex'
@@ -0,0 +1,183 @@
+"""
+Full text search over source codes.
+
+On PostgreSQL the prose fields are matched with a weighted tsvector and the
+code with ILIKE, both served by GIN indexes created in migration 0004.
+Other databases fall back to in-process inverted indexes, kept for the
+MAX_CACHED_INDEXES most recent users.
+"""
+import html
+import re
+import threading
+from collections import OrderedDict, defaultdict
+
+from django.db import connection
+from django.db.models import BooleanField, F, FloatField, Max, Q
+from django.db.models.expressions import RawSQL
+
+from core.models import SourceCode
+
+
+# Must stay identical to the expression indexed by migration 0004.
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(author, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(notes, '')), 'C')"
+)
+SEARCH_QUERY_SQL = "websearch_to_tsquery('english', %s)"
+# A plain ILIKE on the column, which the gin_trgm_ops index serves, unlike
+# the UPPER(...) LIKE UPPER(...) that icontains compiles to.
+CODE_MATCH_SQL = "code ILIKE %s"
+
+FIELD_WEIGHTS = {'title': 3.0, 'author': 2.0, 'notes': 1.0, 'code': 1.0}
+FRAGMENT_CONTEXT = 40
+MAX_CACHED_INDEXES = 32
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Return the lower case word tokens of text."""
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def like_pattern(query):
+    """Return a LIKE pattern matching query anywhere, wildcards escaped."""
+    for char in ('\\', '%', '_'):
+        query = query.replace(char, '\\' + char)
+    return f'%{query}%'
+
+
+def make_fragment(text, terms):
+    """Return an escaped excerpt of text around the first matching term."""
+    lowered = (text or '').lower()
+    matches = [(lowered.find(term), term) for term in terms]
+    matches = [(pos, term) for pos, term in matches if pos >= 0]
+    if not matches:
+        return None
+    pos, term = min(matches)
+    start = max(0, pos - FRAGMENT_CONTEXT)
+    end = min(len(text), pos + len(term) + FRAGMENT_CONTEXT)
+    return ''.join([
+        '...' if start else '',
+        html.escape(text[start:pos]),
+        '<mark>', html.escape(text[pos:pos + len(term)]), '</mark>',
+        html.escape(text[pos + len(term):end]),
+        '...' if end < len(text) else '',
+    ])
+
+
+def add_fragments(source_codes, query):
+    """Set the highlighted match fragments of each source code."""
+    terms = tokenize(query) or [query.lower()]
+    for source_code in source_codes:
+        source_code.fragments = {}
+        for field in FIELD_WEIGHTS:
+            fragment = make_fragment(getattr(source_code, field), terms)
+            if fragment:
+                source_code.fragments[field] = fragment
+    return source_codes
+
+
+class InvertedIndex:
+    """Token to source code postings for one user's source codes."""
+
+    def __init__(self, rows):
+        self.postings = defaultdict(dict)
+        self.size = 0
+        for row in rows:
+            self.size += 1
+            for field, weight in FIELD_WEIGHTS.items():
+                for token in tokenize(row[field]):
+                    scores = self.postings[token]
+                    scores[row['id']] = scores.get(row['id'], 0) + weight
+
+    def search(self, query):
+        """Return (id, score) pairs matching every query token."""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        matched = None
+        scores = defaultdict(float)
+        for token in tokens:
+            postings = self.postings.get(token, {})
+            ids = set(postings)
+            matched = ids if matched is None else matched & ids
+            idf = 1.0 / (1 + len(postings))
+            for source_code_id, score in postings.items():
+                scores[source_code_id] += score * idf
+        return sorted(
+            ((i, scores[i]) for i in matched),
+            key=lambda item: (-item[1], -item[0]),
+        )
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_inverted_index(user):
+    """
+    Return the inverted index of user, rebuilt after any change. Only the
+    indexes of the MAX_CACHED_INDEXES most recently searching users are
+    kept.
+    """
+    queryset = SourceCode.objects.filter(user=user)
+    version = tuple(queryset.aggregate(
+        latest=Max('modified'), last_id=Max('id'),
+    ).values()) + (queryset.count(),)
+    with _indexes_lock:
+        cached = _indexes.get(user.id)
+        if cached:
+            _indexes.move_to_end(user.id)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    index = InvertedIndex(queryset.values('id', *FIELD_WEIGHTS).iterator())
+    with _indexes_lock:
+        _indexes[user.id] = (version, index)
+        _indexes.move_to_end(user.id)
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def _postgres_search(user, query, limit):
+    match = RawSQL(
+        f'({SEARCH_VECTOR_SQL}) @@ {SEARCH_QUERY_SQL}', [query],
+        output_field=BooleanField(),
+    )
+    rank = RawSQL(
+        f'ts_rank({SEARCH_VECTOR_SQL}, {SEARCH_QUERY_SQL})', [query],
+        output_field=FloatField(),
+    )
+    code_match = RawSQL(
+        CODE_MATCH_SQL, [like_pattern(query)], output_field=BooleanField(),
+    )
+    queryset = SourceCode.objects.filter(user=user).annotate(
+        matched=match,
+        code_matched=code_match,
+        rank=rank,
+        snippet_pk=F('snippet__id'),
+    ).filter(Q(matched=True) | Q(code_matched=True))
+    return list(queryset.order_by('-rank', '-id')[:limit])
+
+
+def _fallback_search(user, query, limit):
+    hits = get_inverted_index(user).search(query)[:limit]
+    ranks = dict(hits)
+    source_codes = SourceCode.objects.filter(
+        id__in=ranks
+    ).annotate(snippet_pk=F('snippet__id'))
+    results = sorted(source_codes, key=lambda obj: (-ranks[obj.id], -obj.id))
+    for source_code in results:
+        source_code.rank = ranks[source_code.id]
+    return results
+
+
+def search_source_codes(user, query, limit):
+    """Return the best matching source codes of user for query."""
+    if connection.vendor == 'postgresql':
+        results = _postgres_search(user, query, limit)
+    else:
+        results = _fallback_search(user, query, limit)
+    return add_fragments(results, query)
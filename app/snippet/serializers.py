@@ -2,16 +2,72 @@
 Serializer for snippet API
 """
 
-from pygments.lexers import get_lexer_by_name
-from pygments.formatters.html import HtmlFormatter
-from pygments import highlight
+import json
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
 
 from rest_framework import serializers
+from core import registry
 from core.models import (
+    HighlightJob,
     Snippet,
     Tag,
-    SourceCode
+    SourceCode,
+    UserStats,
 )
+from snippet import images
+from snippet.highlight import get_bulk_executor, get_highlight_cache
+from snippet.listcache import invalidate_user
+
+
+DUPLICATE_CODE_ERROR = 'This code already exists.'
+
+# Snippet fields the highlighted html is rendered from.
+SNIPPET_RENDER_FIELDS = ('language_name', 'style', 'linenos', 'source_code')
+
+
+def source_code_render_fields():
+    """Return the source code fields the highlighted html depends on."""
+    # Titles are only rendered into full HTML documents.
+    if settings.HIGHLIGHT_FULL_HTML:
+        return ('code', 'title')
+    return ('code',)
+
+
+def check_duplicate_code(source_code):
+    """Refuse changing the code of a source code to one already stored."""
+    if not source_code.is_dirty('code'):
+        return
+    duplicate = SourceCode.objects.filter(
+        user_id=source_code.user_id,
+        code_sha256=SourceCode.hash_code(source_code.code),
+    ).exclude(pk=source_code.pk)
+    if duplicate.exists():
+        raise serializers.ValidationError({'code': [DUPLICATE_CODE_ERROR]})
+
+
+def rehighlight(snippet):
+    """
+    Render the highlighted html of a snippet again, or queue it when
+    highlighting is asynchronous. The caller saves the snippet.
+    """
+    if settings.HIGHLIGHT_ASYNC:
+        snippet.highlight_status = Snippet.HIGHLIGHT_PENDING
+        # A job being rendered may have read the old inputs.
+        HighlightJob.objects.filter(snippet=snippet).delete()
+        HighlightJob.objects.create(snippet=snippet)
+        return
+
+    source_code = snippet.source_code
+    snippet.highlighted = get_highlight_cache().get_or_render(
+        source_code.code if source_code else '',
+        snippet.language_name,
+        snippet.style,
+        snippet.linenos,
+        source_code.title if source_code else '',
+    )
+    snippet.highlight_status = Snippet.HIGHLIGHT_READY
 
 
 class SourceCodeSerializer(serializers.ModelSerializer):
@@ -25,12 +81,30 @@ class SourceCodeSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'title', 'code', 'notes', 'url', 'author',
             'status', 'rating', 'is_favorite', 'count_updated',
-            'created', 'modified',
+            'created', 'modified', 'code_sha256',
         ]
         read_only_fields = [
-            'id', 'count_updated', 'created', 'modified'
+            'id', 'count_updated', 'created', 'modified', 'code_sha256',
             ]
 
+    def update(self, instance, validated_data):
+        """Update a source code and re-highlight its snippet if needed."""
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        check_duplicate_code(instance)
+        render = instance.is_dirty(*source_code_render_fields())
+        instance.save()
+
+        if render:
+            try:
+                snippet = instance.snippet
+            except Snippet.DoesNotExist:
+                return instance
+            snippet.source_code = instance
+            rehighlight(snippet)
+            snippet.save()
+        return instance
+
 
 class SourceCodeBriefSerializer(serializers.ModelSerializer):
     """Serializer displsys source codes in brief"""
@@ -44,10 +118,12 @@ class SourceCodeBriefSerializer(serializers.ModelSerializer):
         return obj.code
 
     def get_snippet_id(self, obj):
-        snippet = Snippet.objects.filter(source_code__id=obj.id).first()
-        if snippet:
-            return snippet.id
-        return
+        if hasattr(obj, 'snippet_pk'):
+            return obj.snippet_pk
+        try:
+            return obj.snippet.id
+        except Snippet.DoesNotExist:
+            return
 
     class Meta:
         model = SourceCode
@@ -55,6 +131,19 @@ class SourceCodeBriefSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
+class SourceCodeSearchSerializer(SourceCodeBriefSerializer):
+    """Serializer for source code search results."""
+
+    rank = serializers.FloatField(read_only=True)
+    fragments = serializers.DictField(
+        child=serializers.CharField(),
+        read_only=True,
+    )
+
+    class Meta(SourceCodeBriefSerializer.Meta):
+        fields = SourceCodeBriefSerializer.Meta.fields + ['rank', 'fragments']
+
+
 class TagSerializer(serializers.ModelSerializer):
     """Serializer for tags."""
 
@@ -83,14 +172,48 @@ class SnippetDetailSerializer(serializers.ModelSerializer):
 
     tags = TagSerializer(many=True, required=False)
     source_code = SourceCodeSerializer(required=False)
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Snippet
         fields = [
             'id', 'language_name', 'style', 'linenos',
-            'highlighted', 'tags', 'source_code', 'image',
+            'highlighted', 'highlight_status', 'tags', 'source_code',
+            'image', 'image_variants',
         ]
-        read_only_fields = ['id', 'highlighted']
+        read_only_fields = ['id', 'highlighted', 'highlight_status']
+
+    def validate_language_name(self, value):
+        language_name = registry.resolve_language(value)
+        if language_name is None:
+            raise serializers.ValidationError('Unknown language.')
+        return language_name
+
+    def validate_style(self, value):
+        if not registry.is_style(value):
+            raise serializers.ValidationError('Unknown style.')
+        return value
+
+    def get_image_variants(self, obj):
+        return images.variant_urls(obj, self.context.get('request'))
+
+    def to_representation(self, instance):
+        """Replace the highlighted html with the requested format."""
+        data = super().to_representation(instance)
+        highlight_format = self.context.get('highlight_format')
+        if highlight_format:
+            source_code = instance.source_code
+            highlighted = get_highlight_cache().get_or_render_format(
+                source_code.code if source_code else '',
+                instance.language_name,
+                instance.style,
+                instance.linenos,
+                highlight_format,
+            )
+            if highlight_format == 'tokens':
+                highlighted = json.loads(highlighted)
+            data['highlighted'] = highlighted
+        return data
 
     def _get_or_create_tags(self, tags, snippet_object):
         """Handle adding tags to snippet object."""
@@ -146,18 +269,16 @@ class SnippetDetailSerializer(serializers.ModelSerializer):
         else:
             is_favorite = False
 
-        source_code_obj = SourceCode.objects.create(
-            user=auth_user,
-            title=title,
-            code=code,
-            notes=notes,
-            url=url,
-            author=author,
-            status=status,
-            rating=rating,
-            is_favorite=is_favorite,
-        )
-        source_code_obj.save()
+        source_code_obj = self._get_or_create_by_code(auth_user, {
+            'title': title,
+            'code': code,
+            'notes': notes,
+            'url': url,
+            'author': author,
+            'status': status,
+            'rating': rating,
+            'is_favorite': is_favorite,
+        })
         snippet_object.source_code = source_code_obj
 
     def _create_highlighted(self, source_code_obj=None):
@@ -174,18 +295,48 @@ class SnippetDetailSerializer(serializers.ModelSerializer):
         self.style = self.validated_data['style']
         self.linenos = self.validated_data['linenos']
 
-        lexer = get_lexer_by_name(self.language_name)
-        linenos = 'table' if self.linenos else False
-        options = {'title': self.title} if self.title else {}
-        formatter = HtmlFormatter(
-            style=self.style,
-            linenos=linenos,
-            full=True,
-            **options
+        self.highlighted = get_highlight_cache().get_or_render(
+            self.code,
+            self.language_name,
+            self.style,
+            self.linenos,
+            self.title,
         )
-        self.highlighted = highlight(self.code, lexer, formatter)
         return self.highlighted
 
+    def _get_or_create_by_code(self, user, source_code_dict):
+        """
+        Return the source code of user storing the given code, creating it
+        if missing. Stored code is only reused when no snippet shows it and
+        the other fields match, otherwise it is refused as duplicate code.
+        """
+        duplicate = serializers.ValidationError(
+            {'source_code': {'code': [DUPLICATE_CODE_ERROR]}}
+        )
+        source_code = SourceCode.objects.filter(
+            user=user,
+            code_sha256=SourceCode.hash_code(source_code_dict.get('code', '')),
+        ).first()
+        if source_code is None:
+            try:
+                with transaction.atomic():
+                    return SourceCode.objects.create(
+                        user=user, **source_code_dict
+                    )
+            except IntegrityError:
+                # Stored by a concurrent request since the lookup.
+                raise duplicate
+
+        unchanged = all(
+            getattr(source_code, name) == value
+            for name, value in source_code_dict.items()
+        )
+        if not unchanged or Snippet.objects.filter(
+            source_code=source_code,
+        ).exists():
+            raise duplicate
+        return source_code
+
     def create(self, validated_data):
         """Create a snippet"""
         user = self.context['request'].user
@@ -193,63 +344,359 @@ class SnippetDetailSerializer(serializers.ModelSerializer):
         source_code = validated_data.pop('source_code', None)
 
         if source_code:
-            source_code, created = SourceCode.objects.get_or_create(
-                user=user,
-                **source_code
-            )
-            if not created:
-                source_code.save()
-
+            source_code = self._get_or_create_by_code(user, source_code)
             snippet = Snippet.objects.create(
                 user=user,
                 source_code=source_code
             )
+        else:
+            snippet = Snippet.objects.create(user=user)
 
-            self._get_or_create_tags(tags, snippet)
-            snippet.language_name = validated_data['language_name']
-            snippet.style = validated_data['style']
-            snippet.linenos = validated_data['linenos']
-            snippet.highlighted = self._create_highlighted(source_code)
-            snippet.user = user
+        self._get_or_create_tags(tags, snippet)
+        snippet.language_name = validated_data['language_name']
+        snippet.style = validated_data['style']
+        snippet.linenos = validated_data['linenos']
+        snippet.user = user
 
+        if settings.HIGHLIGHT_ASYNC:
+            snippet.highlight_status = Snippet.HIGHLIGHT_PENDING
+            snippet.save()
+            HighlightJob.objects.create(snippet=snippet)
         else:
-            snippet = Snippet.objects.create(user=user)
-            self._get_or_create_tags(tags, snippet)
-            snippet.language_name = validated_data['language_name']
-            snippet.style = validated_data['style']
-            snippet.linenos = validated_data['linenos']
             snippet.highlighted = self._create_highlighted(source_code)
-            snippet.user = user
+            snippet.save()
 
-        snippet.save()
         return snippet
 
+    def _update_source_code(self, source_code_dict, snippet_object):
+        """
+        Apply source code changes to the snippet source code and return
+        whether they change the highlighted html.
+        """
+        source_code_obj = snippet_object.source_code
+        if source_code_obj is None:
+            self._get_or_create_source_code(source_code_dict, snippet_object)
+            return True
+
+        for attr, value in source_code_dict.items():
+            setattr(source_code_obj, attr, value)
+        try:
+            check_duplicate_code(source_code_obj)
+        except serializers.ValidationError as exc:
+            raise serializers.ValidationError({'source_code': exc.detail})
+        if not source_code_obj.get_dirty_fields():
+            return False
+        render = source_code_obj.is_dirty(*source_code_render_fields())
+        source_code_obj.save()
+        return render
+
     def update(self, instance, validated_data):
-        """Update a snippet."""
+        """
+        Update a snippet, writing only the changed fields and rendering
+        the highlighted html again only when one of its inputs changed.
+        """
+        render = False
+        source_code = validated_data.pop('source_code', None)
+        if source_code is not None:
+            render = self._update_source_code(source_code, instance)
+
         tags = validated_data.pop('tags', None)
         if tags is not None:
             instance.tags.clear()
             self._get_or_create_tags(tags, instance)
 
-        source_code = validated_data.pop('source_code', None)
-        if source_code is not None:
-            self._get_or_create_source_code(source_code, instance)
-
         auth_user = self.context['request'].user
         instance.user = auth_user
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
 
-        instance.save()
+        if render or instance.is_dirty(*SNIPPET_RENDER_FIELDS):
+            rehighlight(instance)
+        # Tag changes also bump modified, which the list ETags depend on.
+        if tags is not None or instance.get_dirty_fields():
+            instance.save()
         return instance
 
 
+class SnippetBulkSerializer(serializers.Serializer):
+    """
+    Serializer to create, update and delete many snippets at once.
+    Every item is validated on its own and reported in errors, the valid
+    items are written in one transaction.
+    """
+    create = serializers.ListField(
+        child=serializers.DictField(), required=False, default=list,
+    )
+    update = serializers.ListField(
+        child=serializers.DictField(), required=False, default=list,
+    )
+    delete = serializers.ListField(
+        child=serializers.IntegerField(), required=False, default=list,
+    )
+
+    def validate(self, attrs):
+        size = sum(len(items) for items in attrs.values())
+        if size > settings.BULK_MAX_ITEMS:
+            raise serializers.ValidationError(
+                f'At most {settings.BULK_MAX_ITEMS} items are allowed.'
+            )
+        return attrs
+
+    def _validate_items(self, operation, items, instances=None):
+        """Validate items and return the valid (index, serializer) pairs."""
+        valid = []
+        for index, item in enumerate(items):
+            instance = None
+            if instances is not None:
+                instance = instances.get(item.get('id'))
+                if instance is None:
+                    self.errors_list.append({
+                        'operation': operation, 'index': index,
+                        'errors': {'id': ['Snippet not found.']},
+                    })
+                    continue
+            serializer = SnippetDetailSerializer(
+                instance, data=item, partial=instance is not None,
+                context=self.context,
+            )
+            if serializer.is_valid():
+                valid.append((index, serializer))
+            else:
+                self.errors_list.append({
+                    'operation': operation, 'index': index,
+                    'errors': serializer.errors,
+                })
+        return valid
+
+    def _create_source_codes(self, user, valid):
+        """Bulk create the source codes of valid create items."""
+        hashes = {}
+        existing = set(SourceCode.objects.filter(
+            user=user,
+            code_sha256__in=[
+                SourceCode.hash_code(serializer.validated_data[
+                    'source_code'].get('code', ''))
+                for _, serializer in valid
+            ],
+        ).values_list('code_sha256', flat=True))
+        untitled = sum(
+            1 for _, serializer in valid
+            if not serializer.validated_data['source_code'].get('title')
+        )
+        if untitled:
+            title_no = UserStats.reserve_titles(user.id, untitled) - 1
+
+        items = []
+        for index, serializer in valid:
+            data = dict(serializer.validated_data['source_code'])
+            source_code = SourceCode(user=user, **data)
+            if not source_code.title:
+                title_no += 1
+                source_code.title = f'title {title_no}'
+            try:
+                source_code.set_computed_fields()
+            except ValueError as exc:
+                error = str(exc)
+            else:
+                digest = source_code.code_sha256
+                error = None
+                if digest in existing or digest in hashes:
+                    error = DUPLICATE_CODE_ERROR
+            if error:
+                self.errors_list.append({
+                    'operation': 'create', 'index': index,
+                    'errors': {'source_code': {'code': [error]}},
+                })
+                continue
+            hashes[digest] = source_code
+            items.append((index, serializer, source_code))
+
+        SourceCode.objects.bulk_create([item[2] for item in items])
+        if items and items[0][2].pk is None:
+            ids = dict(SourceCode.objects.filter(
+                user=user, code_sha256__in=hashes,
+            ).values_list('code_sha256', 'id'))
+            for digest, source_code in hashes.items():
+                source_code.pk = ids[digest]
+        return items
+
+    def _resolve_tags(self, user, names):
+        """Return a name to tag mapping, creating the missing tags."""
+        tags = {}
+        for tag in Tag.objects.filter(
+            user=user, name__in=names,
+        ).order_by('-id'):
+            tags[tag.name] = tag
+        missing = [name for name in names if name not in tags]
+        if missing:
+            Tag.objects.bulk_create(
+                [Tag(user=user, name=name) for name in missing]
+            )
+            UserStats.adjust(user.id, tags=len(missing))
+            for tag in Tag.objects.filter(
+                user=user, name__in=missing,
+            ).order_by('-id'):
+                tags[tag.name] = tag
+        return tags
+
+    def _create(self, user, items):
+        """Bulk create snippets, highlighting and tags for items."""
+        items = self._create_source_codes(user, items)
+        pending = settings.HIGHLIGHT_ASYNC
+        if pending:
+            rendered = [''] * len(items)
+        else:
+            rendered = get_highlight_cache().render_many([
+                (
+                    source_code.code,
+                    serializer.validated_data['language_name'],
+                    serializer.validated_data['style'],
+                    serializer.validated_data['linenos'],
+                    source_code.title,
+                )
+                for _, serializer, source_code in items
+            ], get_bulk_executor())
+
+        snippets = {}
+        for (index, serializer, source_code), html in zip(items, rendered):
+            if isinstance(html, Exception):
+                self.errors_list.append({
+                    'operation': 'create', 'index': index,
+                    'errors': {'highlighted': [str(html)]},
+                })
+                continue
+            data = serializer.validated_data
+            snippets[source_code.pk] = (index, data, Snippet(
+                user=user,
+                source_code=source_code,
+                language_name=data['language_name'],
+                style=data['style'],
+                linenos=data['linenos'],
+                highlighted=html,
+                highlight_status=(
+                    Snippet.HIGHLIGHT_PENDING if pending
+                    else Snippet.HIGHLIGHT_READY
+                ),
+            ))
+        SourceCode.objects.filter(
+            id__in=[item[2].pk for item in items if item[2].pk not in snippets]
+        ).delete()
+
+        objs = [item[2] for item in snippets.values()]
+        Snippet.objects.bulk_create(objs)
+        # The source codes of failed items were deleted and uncounted.
+        UserStats.adjust(
+            user.id,
+            source_codes=len(items),
+            snippets=len(objs),
+            code_bytes=sum(
+                UserStats.code_size(item[2].code) for item in items
+            ),
+        )
+        if objs and objs[0].pk is None:
+            for source_code_id, snippet_id in Snippet.objects.filter(
+                source_code_id__in=snippets,
+            ).values_list('source_code_id', 'id'):
+                snippets[source_code_id][2].pk = snippet_id
+        if pending:
+            HighlightJob.objects.bulk_create(
+                [HighlightJob(snippet=snippet) for snippet in objs]
+            )
+
+        names = {
+            tag['name'] for _, data, _ in snippets.values()
+            for tag in data.get('tags', [])
+        }
+        tags = self._resolve_tags(user, names)
+        Snippet.tags.through.objects.bulk_create([
+            Snippet.tags.through(snippet_id=snippet.pk, tag_id=tag.pk)
+            for _, data, snippet in snippets.values()
+            for tag in {tags[item['name']] for item in data.get('tags', [])}
+        ])
+
+        created = [None] * len(self.validated_data['create'])
+        for index, _, snippet in snippets.values():
+            created[index] = snippet.pk
+        return created
+
+    def _delete(self, user, ids):
+        """Delete snippets with their source codes."""
+        snippets = Snippet.objects.filter(user=user, id__in=ids)
+        source_code_ids = list(
+            snippets.exclude(source_code=None).values_list(
+                'source_code_id', flat=True,
+            )
+        )
+        _, deleted = snippets.delete()
+        SourceCode.objects.filter(user=user, id__in=source_code_ids).delete()
+        return deleted.get(Snippet._meta.label, 0)
+
+    def save(self, **kwargs):
+        user = self.context.get('user') or self.context['request'].user
+        self.errors_list = []
+        data = self.validated_data
+
+        create = []
+        valid = self._validate_items('create', data['create'])
+        for index, serializer in valid:
+            if 'source_code' not in serializer.validated_data:
+                self.errors_list.append({
+                    'operation': 'create', 'index': index,
+                    'errors': {'source_code': ['This field is required.']},
+                })
+            else:
+                create.append((index, serializer))
+
+        instances = Snippet.objects.filter(user=user).in_bulk([
+            item['id'] for item in data['update']
+            if isinstance(item.get('id'), int)
+        ])
+        update = self._validate_items('update', data['update'], instances)
+
+        with transaction.atomic():
+            created = self._create(user, create)
+            updated = [serializer.save().id for _, serializer in update]
+            deleted = self._delete(user, data['delete'])
+            # bulk_create sends no signals.
+            invalidate_user(user.id)
+
+        self.result = {
+            'created': created,
+            'updated': updated,
+            'deleted': deleted,
+            'errors': sorted(
+                self.errors_list,
+                key=lambda error: (error['operation'], error['index']),
+            ),
+        }
+        return self.result
+
+
 class SnippetImageSerializer(serializers.ModelSerializer):
     """Serializer for uploading images to snippet."""
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Snippet
-        fields = ['id', 'image']
+        fields = ['id', 'image', 'image_variants']
         read_only_fields = ['id']
         extra_kwargs = {'image': {'required': 'True'}}
+
+    def validate_image(self, value):
+        return images.validate_image(value)
+
+    def get_image_variants(self, obj):
+        return images.variant_urls(obj, self.context.get('request'))
+
+    def update(self, instance, validated_data):
+        """Store the image once per content and render its variants."""
+        upload = validated_data['image']
+        image_format, width = upload.image.format, upload.image.width
+        instance.image = upload
+        instance.image.save(upload.name, upload, save=False)
+        instance.image_variants = images.make_variants(
+            instance.image, image_format, width,
+        )
+        instance.save()
+        return instance
@@ -0,0 +1,26 @@
+"""
+Signal handlers keeping the per-user list cache current.
+"""
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import Snippet, SourceCode, Tag
+from snippet.listcache import invalidate_user
+
+
+@receiver(post_save, sender=Snippet)
+@receiver(post_save, sender=SourceCode)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Snippet)
+@receiver(post_delete, sender=SourceCode)
+@receiver(post_delete, sender=Tag)
+def invalidate_lists(sender, instance, **kwargs):
+    """Drop the cached lists of the owner of a changed row."""
+    invalidate_user(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Snippet.tags.through)
+def invalidate_lists_on_tags(sender, instance, action, **kwargs):
+    """Drop the cached lists of a user when snippet tags change."""
+    if action.startswith('post_'):
+        invalidate_user(instance.user_id)
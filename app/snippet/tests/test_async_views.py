@@ -0,0 +1,99 @@
+"""
+Tests for the async views of the snippet APIs.
+"""
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.urls import Resolver404
+from django.urls.resolvers import RegexPattern, URLResolver
+
+from rest_framework import status
+from rest_framework.test import force_authenticate
+
+from core.models import Snippet, SourceCode
+from snippet import async_views
+
+
+@override_settings(ASYNC_VIEW_THREADS=0)
+class AsyncViewTests(TestCase):
+    """Test the async views serve the viewsets."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.source_code = SourceCode.objects.create(
+            user=self.user, title='Sample', code='print(1)',
+        )
+        self.snippet = Snippet.objects.create(
+            user=self.user, source_code=self.source_code,
+        )
+        self.factory = AsyncRequestFactory()
+
+    def request(self, method, path, **kwargs):
+        request = getattr(self.factory, method)(path, **kwargs)
+        force_authenticate(request, self.user)
+        return request
+
+    async def test_snippet_list(self):
+        """Test listing snippets through the async view."""
+        request = self.request('get', '/api/snippet/snippets/')
+
+        res = await async_views.snippet_list(request)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        results = json.loads(res.content)['results']
+        self.assertEqual(results[0]['source_code']['title'], 'Sample')
+
+    async def test_source_code_detail(self):
+        """Test retrieving a source code through the async view."""
+        request = self.request('get', '/api/snippet/source_codes/')
+
+        res = await async_views.source_code_detail(
+            request, pk=self.source_code.id,
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(res.content)['code'], 'print(1)')
+        self.assertTrue(res.has_header('ETag'))
+
+    async def test_write_methods_passed_to_viewset(self):
+        """Test non read methods still reach the viewset."""
+        request = self.request(
+            'patch', '/api/snippet/tags/',
+            data={'title': 'Changed'}, content_type='application/json',
+        )
+
+        res = await async_views.source_code_detail(
+            request, pk=self.source_code.id,
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(res.content)['title'], 'Changed')
+
+    @override_settings(ASYNC_VIEW_THREADS=2)
+    async def test_thread_pool_renders_response(self):
+        """Test views run in the thread pool return rendered responses."""
+        request = AsyncRequestFactory().get('/api/snippet/tags/')
+
+        res = await async_views.tag_list(request)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertTrue(res.is_rendered)
+
+
+class AsyncUrlTests(TestCase):
+    """Test the async url patterns leave list actions to the router."""
+
+    def test_list_actions_not_matched(self):
+        resolver = URLResolver(RegexPattern(r'^'), async_views.urlpatterns)
+
+        self.assertEqual(
+            resolver.resolve('snippets/1/').func, async_views.snippet_detail,
+        )
+        with self.assertRaises(Resolver404):
+            resolver.resolve('snippets/bulk/')
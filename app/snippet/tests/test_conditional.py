@@ -0,0 +1,178 @@
+"""
+Tests for conditional requests on the snippet APIs.
+"""
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Snippet, SourceCode
+
+
+SNIPPETS_URL = reverse('snippet:snippet-list')
+SOURCE_CODE_URL = reverse('snippet:sourcecode-list')
+
+
+def snippet_url(snippet_id):
+    return reverse('snippet:snippet-detail', args=[snippet_id])
+
+
+def source_code_url(source_code_id):
+    return reverse('snippet:sourcecode-detail', args=[source_code_id])
+
+
+class ConditionalRequestTests(TestCase):
+    """Test ETag and Last-Modified handling."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.source_code = SourceCode.objects.create(
+            user=self.user, title='Sample', code='print(1)',
+        )
+        self.snippet = Snippet.objects.create(
+            user=self.user, source_code=self.source_code,
+        )
+
+    def test_snippet_detail_not_modified(self):
+        """Test a matching If-None-Match skips the serializer."""
+        url = snippet_url(self.snippet.id)
+        res = self.client.get(url)
+        etag = res['ETag']
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.has_header('Last-Modified'))
+
+        with self.assertNumQueries(2):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+        self.assertEqual(res.content, b'')
+
+    def test_detail_etags_differ_per_renderer(self):
+        """Test a JSON ETag does not validate the browsable API page."""
+        for url in (snippet_url(self.snippet.id),
+                    source_code_url(self.source_code.id)):
+            etag = self.client.get(url, HTTP_ACCEPT='application/json')['ETag']
+
+            res = self.client.get(
+                url, HTTP_ACCEPT='text/html', HTTP_IF_NONE_MATCH=etag,
+            )
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertNotEqual(res['ETag'], etag)
+
+    def test_snippet_etag_changes_with_source_code(self):
+        """Test editing the source code changes the snippet ETag."""
+        url = snippet_url(self.snippet.id)
+        etag = self.client.get(url)['ETag']
+
+        self.source_code.notes = 'Changed'
+        self.source_code.save()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_source_code_if_modified_since(self):
+        """Test If-Modified-Since answers 304 for an unchanged row."""
+        url = source_code_url(self.source_code.id)
+        res = self.client.get(url)
+
+        res = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=res['Last-Modified'],
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_etag_changes_on_create_and_delete(self):
+        """Test list ETags change with added and removed rows."""
+        res = self.client.get(SOURCE_CODE_URL)
+        etag = res['ETag']
+        res = self.client.get(SOURCE_CODE_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        other = SourceCode.objects.create(user=self.user, code='print(2)')
+        res = self.client.get(SOURCE_CODE_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+        etag = res['ETag']
+        other.delete()
+        res = self.client.get(SOURCE_CODE_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_list_validation_reads_the_list_version(self):
+        """Test a 304 on a list reads the user version, not the rows."""
+        etag = self.client.get(SNIPPETS_URL)['ETag']
+        cache.clear()
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(SNIPPETS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(len(queries), 1)
+        self.assertIn('"core_userstats"', queries[0]['sql'])
+
+    def test_snippet_list_etag_changes_on_update(self):
+        """Test the snippet list ETag follows edited snippets."""
+        etag = self.client.get(SNIPPETS_URL)['ETag']
+
+        self.snippet.language_name = 'c'
+        self.snippet.save()
+        res = self.client.get(SNIPPETS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_list_etag_is_per_user(self):
+        """Test ETags of another user's list do not match."""
+        etag = self.client.get(SNIPPETS_URL)['ETag']
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'testpass123',
+        )
+        self.client.force_authenticate(other)
+
+        res = self.client.get(SNIPPETS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_update_with_stale_if_match_fails(self):
+        """Test If-Match with an old ETag refuses the update."""
+        url = source_code_url(self.source_code.id)
+        etag = self.client.get(url)['ETag']
+        res = self.client.patch(url, {'title': 'First'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+        res = self.client.patch(url, {'title': 'Second'}, HTTP_IF_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.source_code.refresh_from_db()
+        self.assertEqual(self.source_code.title, 'First')
+
+    def test_snippet_update_with_current_if_match(self):
+        """Test If-Match with the current ETag allows the update."""
+        url = snippet_url(self.snippet.id)
+        etag = self.client.get(url)['ETag']
+
+        res = self.client.patch(
+            url, {'linenos': False}, format='json', HTTP_IF_MATCH=etag,
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.snippet.refresh_from_db()
+        self.assertFalse(self.snippet.linenos)
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
@@ -0,0 +1,118 @@
+"""
+Tests for the snippet export API.
+"""
+import gzip
+import json
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Snippet, SourceCode, Tag
+
+
+EXPORT_URL = reverse('snippet:export')
+
+
+def create_snippet(user, code, tags=()):
+    """Create and return a snippet with source code and tags."""
+    source_code = SourceCode.objects.create(user=user, code=code)
+    snippet = Snippet.objects.create(user=user, source_code=source_code)
+    for name in tags:
+        snippet.tags.add(Tag.objects.create(user=user, name=name))
+    return snippet
+
+
+def read_ndjson(content):
+    """Return the records of NDJSON content."""
+    return [json.loads(line) for line in content.decode().splitlines()]
+
+
+class ExportApiTests(TestCase):
+    """Test exporting snippet libraries."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_auth_required(self):
+        """Test authentication is required to export."""
+        self.client.logout()
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_export_ndjson(self):
+        """Test exporting streams one line per snippet of the user."""
+        s1 = create_snippet(self.user, 'print(1)', tags=['b', 'a'])
+        s2 = create_snippet(self.user, 'print(2)')
+        other = get_user_model().objects.create_user('o@example.com', 'x')
+        create_snippet(other, 'print(3)')
+
+        res = self.client.get(EXPORT_URL, {'format': 'ndjson'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        records = read_ndjson(b''.join(res.streaming_content))
+        self.assertEqual([r['id'] for r in records], [s1.id, s2.id])
+        self.assertEqual(records[0]['tags'], ['a', 'b'])
+        self.assertEqual(records[0]['source_code']['code'], 'print(1)')
+        self.assertNotIn('highlighted', records[0])
+
+    def test_export_gzip(self):
+        """Test exporting with gzip compression."""
+        create_snippet(self.user, 'print(1)')
+
+        res = self.client.get(EXPORT_URL, {'compression': 'gzip'})
+
+        self.assertEqual(res['Content-Type'], 'application/gzip')
+        content = gzip.decompress(b''.join(res.streaming_content))
+        self.assertEqual(len(read_ndjson(content)), 1)
+
+    def test_export_command(self):
+        """Test the export_snippets command writes the same records."""
+        for i in range(3):
+            create_snippet(self.user, f'print({i})', tags=[f'tag {i}'])
+
+        with tempfile.NamedTemporaryFile(suffix='.ndjson') as output:
+            call_command(
+                'export_snippets', self.user.email,
+                '--output', output.name, '--chunk-size', '2',
+            )
+            records = read_ndjson(output.read())
+
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[2]['tags'], ['tag 2'])
+
+
+class AsgiExportTests(TestCase):
+    """Test the export API under the ASGI handler."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.token = Token.objects.create(user=self.user)
+        create_snippet(self.user, 'print(1)')
+
+    async def test_export_refused(self):
+        """Test exports are refused instead of failing mid stream."""
+        res = await self.async_client.get(
+            EXPORT_URL, AUTHORIZATION=f'Token {self.token.key}',
+        )
+
+        # A streamed export would run its queries on the event loop.
+        self.assertFalse(res.streaming)
+        self.assertEqual(res.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+        self.assertIn(b'WSGI', res.content)
@@ -0,0 +1,119 @@
+"""
+Tests for the highlight cache.
+"""
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from snippet import highlight
+
+
+class HighlightCacheTests(SimpleTestCase):
+    """Test the content-addressed highlight cache."""
+
+    def test_key_depends_on_every_input(self):
+        """Test changing any render input changes the key."""
+        base = ('print(1)', 'python', 'default', True, 'title')
+        key = highlight.make_key(*base)
+        for i, value in enumerate(['print(2)', 'perl', 'vim', False, 'x']):
+            args = list(base)
+            args[i] = value
+            self.assertNotEqual(highlight.make_key(*args), key)
+
+    def test_same_inputs_render_once(self):
+        """Test a repeated render is served from cache."""
+        cache = highlight.HighlightCache(highlight.LRUBackend(1024 * 1024))
+        with patch('snippet.highlight.render_highlighted',
+                   return_value='<html></html>') as patched_render:
+            cache.get_or_render('x = 1', 'python', 'default', False)
+            html = cache.get_or_render('x = 1', 'python', 'default', False)
+
+        self.assertEqual(html, '<html></html>')
+        patched_render.assert_called_once()
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+
+    def test_formats_cached_apart(self):
+        """Test alternate formats are cached apart from the html."""
+        cache = highlight.HighlightCache(highlight.LRUBackend(1024 * 1024))
+        args = ('x = 1', 'python', 'default', False)
+        html = cache.get_or_render(*args)
+        ansi = cache.get_or_render_format(*args, 'ansi')
+
+        self.assertEqual(cache.get_or_render_format(*args, 'fragment'), html)
+        self.assertEqual(cache.get_or_render_format(*args, 'ansi'), ansi)
+        self.assertIn('\x1b[', ansi)
+        self.assertEqual(cache.hits, 2)
+        self.assertEqual(cache.misses, 2)
+
+    def test_render_tokens(self):
+        """Test tokens carry the css classes of the html markup."""
+        tokens = highlight.render_tokens('def f():  pass\n', 'python')
+
+        self.assertEqual(tokens[:3], [['k', 'def'], ' ', ['nf', 'f']])
+        self.assertEqual(
+            ''.join(t if isinstance(t, str) else t[1] for t in tokens),
+            'def f():  pass\n',
+        )
+
+    def test_lru_evicts_by_size(self):
+        """Test the least recently used entries are evicted past max size."""
+        backend = highlight.LRUBackend(max_bytes=10)
+        backend.set('a', 'aaaa')
+        backend.set('b', 'bbbb')
+        backend.get('a')
+        backend.set('c', 'cccc')
+
+        self.assertEqual(backend.get('b'), None)
+        self.assertEqual(backend.get('a'), 'aaaa')
+        self.assertEqual(backend.get('c'), 'cccc')
+        self.assertEqual(backend.size, 8)
+
+    def test_django_backend_clear(self):
+        """Test clearing the django cache backend drops entries."""
+        backend = highlight.DjangoCacheBackend()
+        backend.set('key', '<html></html>')
+        self.assertEqual(backend.get('key'), '<html></html>')
+
+        backend.clear()
+
+        self.assertEqual(backend.get('key'), None)
+
+
+class InstancePoolTests(SimpleTestCase):
+    """Test the lexer and formatter instance pools."""
+
+    def test_instances_reused(self):
+        """Test released instances are handed out again."""
+        pool = highlight.InstancePool(lambda name: object())
+        with pool.borrow(('a',)) as first:
+            with pool.borrow(('a',)) as second:
+                self.assertIsNot(first, second)
+        with pool.borrow(('a',)) as third:
+            self.assertIn(third, (first, second))
+
+        self.assertEqual(pool.stats(), {
+            'created': 2, 'reused': 1, 'keys': 1,
+        })
+
+    def test_pool_bounded(self):
+        """Test the pool drops the least recently used keys."""
+        pool = highlight.InstancePool(lambda name: object(), max_keys=2)
+        for name in ['a', 'b', 'a', 'c']:
+            with pool.borrow((name,)):
+                pass
+
+        self.assertEqual(list(pool._idle), [('a',), ('c',)])
+
+    def test_render_uses_pools(self):
+        """Test rendering twice reuses the lexer and formatter."""
+        highlight.lexer_pool.clear()
+        highlight.formatter_pool.clear()
+
+        first = highlight.render_highlighted('x = 1', 'python', 'vim', True)
+        second = highlight.render_highlighted('x = 1', 'python', 'vim', True)
+
+        self.assertEqual(first, second)
+        stats = highlight.pool_stats()
+        self.assertEqual(stats['lexers']['reused'], 1)
+        self.assertEqual(stats['formatters']['reused'], 1)
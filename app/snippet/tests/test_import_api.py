@@ -0,0 +1,116 @@
+"""
+Tests for the snippet import API.
+"""
+import gzip
+import io
+import json
+import tempfile
+import zipfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Snippet, SourceCode
+
+
+IMPORT_URL = reverse('snippet:import')
+
+
+def ndjson(records):
+    """Return records encoded as NDJSON."""
+    return ''.join(json.dumps(record) + '\n' for record in records).encode()
+
+
+class ImportApiTests(TestCase):
+    """Test importing snippet archives."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _upload(self, content, name='archive'):
+        upload = SimpleUploadedFile(name, content)
+        return self.client.post(IMPORT_URL, {'file': upload})
+
+    def test_import_ndjson(self):
+        """Test importing exported records, skipping duplicate code."""
+        SourceCode.objects.create(user=self.user, code='existing')
+        records = [
+            {
+                'language_name': 'python',
+                'style': 'vim',
+                'linenos': False,
+                'source_code': {'title': 'one', 'code': 'print(1)'},
+                'tags': ['imported'],
+            },
+            {'language_name': 'python', 'source_code': {'code': 'existing'}},
+            {'language_name': 'nope', 'source_code': {'code': 'bad'}},
+        ]
+        content = ndjson(records) + b'not json\n'
+
+        res = self._upload(content)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['processed'], 4)
+        self.assertEqual(res.data['created'], 1)
+        self.assertEqual(res.data['duplicates'], 1)
+        self.assertEqual(res.data['failed'], 2)
+        self.assertEqual(
+            [error['item'] for error in res.data['errors']],
+            ['line 4', 'line 3'],
+        )
+        snippet = Snippet.objects.get(source_code__title='one')
+        self.assertEqual(snippet.style, 'vim')
+        self.assertEqual(snippet.tags.get().name, 'imported')
+
+    def test_import_gzipped_ndjson(self):
+        """Test importing a gzip compressed NDJSON archive."""
+        records = [{'source_code': {'code': f'x = {i}'}} for i in range(3)]
+
+        res = self._upload(gzip.compress(ndjson(records)))
+
+        self.assertEqual(res.data['created'], 3)
+
+    def test_import_zip_infers_language(self):
+        """Test importing a zip of source files."""
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            archive.writestr('src/main.go', 'package main')
+            archive.writestr('src/script.rb', 'puts 1')
+            archive.writestr('README', 'plain text')
+
+        res = self._upload(buffer.getvalue(), 'archive.zip')
+
+        self.assertEqual(res.data['created'], 3)
+        languages = dict(Snippet.objects.values_list(
+            'source_code__title', 'language_name',
+        ))
+        self.assertEqual(languages, {
+            'main.go': 'go', 'script.rb': 'ruby', 'README': 'text',
+        })
+
+    def test_import_command(self):
+        """Test the import_snippets command reports progress."""
+        records = [{'source_code': {'code': f'x = {i}'}} for i in range(5)]
+        out = io.StringIO()
+
+        with tempfile.NamedTemporaryFile(suffix='.ndjson') as archive:
+            archive.write(ndjson(records))
+            archive.flush()
+            call_command(
+                'import_snippets', self.user.email, archive.name,
+                '--batch-size', '2', stdout=out,
+            )
+
+        self.assertEqual(Snippet.objects.filter(user=self.user).count(), 5)
+        self.assertIn('Processed 4, created 4', out.getvalue())
@@ -0,0 +1,112 @@
+"""
+Tests for the per-user list response cache.
+"""
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Snippet, SourceCode, Tag
+
+
+SNIPPETS_URL = reverse('snippet:snippet-list')
+SOURCE_CODE_URL = reverse('snippet:sourcecode-list')
+TAGS_URL = reverse('snippet:tag-list')
+BULK_URL = reverse('snippet:snippet-bulk')
+
+
+class ListCacheTests(TestCase):
+    """Test list responses are cached and invalidated on writes."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.source_code = SourceCode.objects.create(
+            user=self.user, title='First', code='print(1)',
+        )
+        self.snippet = Snippet.objects.create(
+            user=self.user, source_code=self.source_code,
+        )
+
+    def test_repeated_list_runs_no_queries(self):
+        """Test a cached list is served without database queries."""
+        for url in (SNIPPETS_URL, SOURCE_CODE_URL, TAGS_URL):
+            first = self.client.get(url)
+
+            with self.assertNumQueries(0):
+                res = self.client.get(url)
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(res.data, first.data)
+
+    def test_cached_list_not_modified(self):
+        """Test If-None-Match is checked against the cached ETag."""
+        etag = self.client.get(SNIPPETS_URL)['ETag']
+
+        with self.assertNumQueries(0):
+            res = self.client.get(SNIPPETS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_list_updated_after_source_code_change(self):
+        """Test saving a source code invalidates the lists."""
+        self.client.get(SOURCE_CODE_URL)
+
+        self.source_code.title = 'Changed'
+        self.source_code.save()
+        res = self.client.get(SOURCE_CODE_URL)
+
+        self.assertEqual(res.data['results'][0]['title'], 'Changed')
+
+    def test_list_updated_after_delete(self):
+        """Test deleting a snippet through the API invalidates the lists."""
+        self.client.get(SNIPPETS_URL)
+
+        url = reverse('snippet:snippet-detail', args=[self.snippet.id])
+        self.client.delete(url)
+        res = self.client.get(SNIPPETS_URL)
+
+        self.assertEqual(res.data['results'], [])
+
+    def test_assigned_tags_updated_after_m2m_change(self):
+        """Test adding a tag to a snippet invalidates assigned tags."""
+        tag = Tag.objects.create(user=self.user, name='Python')
+        res = self.client.get(TAGS_URL, {'assigned_only': 1})
+        self.assertEqual(res.data['results'], [])
+
+        self.snippet.tags.add(tag)
+        res = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        self.assertEqual(res.data['results'][0]['name'], 'Python')
+
+    def test_list_updated_after_bulk_create(self):
+        """Test the bulk endpoint invalidates the lists."""
+        self.client.get(SOURCE_CODE_URL)
+
+        self.client.post(BULK_URL, {'create': [
+            {'source_code': {'code': 'print(2)'}},
+        ]}, format='json')
+        res = self.client.get(SOURCE_CODE_URL)
+
+        self.assertEqual(len(res.data['results']), 2)
+
+    def test_lists_cached_per_user(self):
+        """Test another user is not served a cached list."""
+        self.client.get(SOURCE_CODE_URL)
+        other = get_user_model().objects.create_user(
+            'other@example.com', 'testpass123',
+        )
+        self.client.force_authenticate(other)
+
+        res = self.client.get(SOURCE_CODE_URL)
+
+        self.assertEqual(res.data['results'], [])
@@ -0,0 +1,115 @@
+"""
+Tests for keyset pagination of the list APIs.
+"""
+import base64
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Snippet, SourceCode, Tag
+
+
+SNIPPETS_URL = reverse('snippet:snippet-list')
+SOURCE_CODE_URL = reverse('snippet:sourcecode-list')
+TAGS_URL = reverse('snippet:tag-list')
+
+
+class KeysetPaginationTests(TestCase):
+    """Test paginating list endpoints with cursors."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _get_all(self, url, params):
+        """Follow next links and return the ids of every page."""
+        pages = []
+        res = self.client.get(url, params)
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            pages.append([item['id'] for item in res.data['results']])
+            if not res.data['next']:
+                return pages
+            res = self.client.get(res.data['next'])
+
+    def _create_source_codes(self, count):
+        """Create source codes and return their ids."""
+        return [
+            SourceCode.objects.create(user=self.user, code=f'code {i}').id
+            for i in range(count)
+        ]
+
+    def test_pages_follow_ordering(self):
+        """Test paging through source codes returns every row once."""
+        ids = self._create_source_codes(5)
+
+        pages = self._get_all(SOURCE_CODE_URL, {'page_size': 2})
+
+        self.assertEqual(pages, [ids[4:2:-1], ids[2:0:-1], ids[:1]])
+
+    def test_duplicate_ordering_values(self):
+        """Test tags with the same name are not skipped between pages."""
+        tags = [Tag.objects.create(user=self.user, name='same')
+                for i in range(3)]
+        Tag.objects.create(user=self.user, name='another')
+
+        pages = self._get_all(TAGS_URL, {'page_size': 2})
+
+        flat = [tag_id for page in pages for tag_id in page]
+        self.assertEqual(len(flat), 4)
+        self.assertEqual(flat[:3], [tag.id for tag in reversed(tags)])
+
+    def test_insert_does_not_shift_pages(self):
+        """Test new rows do not change the next page."""
+        ids = self._create_source_codes(4)
+        res = self.client.get(SOURCE_CODE_URL, {'page_size': 2})
+
+        SourceCode.objects.create(user=self.user, code='new code')
+        res = self.client.get(res.data['next'])
+
+        self.assertEqual(
+            [item['id'] for item in res.data['results']],
+            [ids[1], ids[0]],
+        )
+
+    @override_settings(MAX_PAGE_SIZE=3)
+    def test_page_size_capped(self):
+        """Test the requested page size is capped."""
+        for i in range(5):
+            Snippet.objects.create(user=self.user)
+
+        res = self.client.get(SNIPPETS_URL, {'page_size': 100})
+
+        self.assertEqual(len(res.data['results']), 3)
+        self.assertIsNotNone(res.data['next'])
+
+    def test_invalid_cursor(self):
+        """Test an invalid cursor returns an error."""
+        res = self.client.get(SNIPPETS_URL, {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_malformed_cursor_values(self):
+        """Test cursors with values of the wrong type return an error."""
+        for values in (['abc'], [{'a': 1}], [None], [[1]]):
+            cursor = base64.urlsafe_b64encode(
+                json.dumps(values).encode()
+            ).decode()
+            res = self.client.get(SNIPPETS_URL, {'cursor': cursor})
+
+            self.assertEqual(
+                res.status_code, status.HTTP_404_NOT_FOUND, values,
+            )
+
+        cursor = base64.urlsafe_b64encode(b'[{"a":1},1]').decode()
+        res = self.client.get(TAGS_URL, {'cursor': cursor})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,102 @@
+"""
+Tests for the number of queries run by the snippet APIs.
+"""
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Snippet, SourceCode, Tag
+
+
+SNIPPETS_URL = reverse('snippet:snippet-list')
+SOURCE_CODE_URL = reverse('snippet:sourcecode-list')
+TAGS_URL = reverse('snippet:tag-list')
+
+
+def create_snippets(user, count, start=0):
+    """Create snippets with source code and a tag."""
+    tag = Tag.objects.create(user=user, name=f'tag {start}')
+    for i in range(start, start + count):
+        source_code = SourceCode.objects.create(user=user, code=f'code {i}')
+        snippet = Snippet.objects.create(user=user, source_code=source_code)
+        snippet.tags.add(tag)
+    return snippet
+
+
+class QueryCountTests(TestCase):
+    """
+    Test listing endpoints run a constant number of queries.
+    Snippet and source code lists read the list version of the user for
+    their ETag.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertConstantQueries(self, url, num, params=None):
+        """Check the query count does not grow with the number of rows."""
+        with self.assertNumQueries(num):
+            res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        create_snippets(self.user, 5, start=100)
+
+        with self.assertNumQueries(num):
+            res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res
+
+    def test_snippet_list_queries(self):
+        """Test listing snippets with source codes."""
+        create_snippets(self.user, 3)
+
+        res = self.assertConstantQueries(SNIPPETS_URL, 2)
+
+        for item in res.data['results']:
+            self.assertIsNotNone(item['source_code']['snippet_id'])
+
+    def test_snippet_list_filtered_by_tags_queries(self):
+        """Test listing snippets filtered by tag."""
+        create_snippets(self.user, 3)
+        tag_ids = ','.join(str(tag.id) for tag in Tag.objects.all())
+
+        self.assertConstantQueries(SNIPPETS_URL, 2, {'tags': tag_ids})
+
+    def test_source_code_list_queries(self):
+        """Test listing source codes with their snippet ids."""
+        snippet = create_snippets(self.user, 3)
+
+        res = self.assertConstantQueries(SOURCE_CODE_URL, 2)
+
+        item = next(
+            item for item in res.data['results']
+            if item['id'] == snippet.source_code.id
+        )
+        self.assertEqual(item['snippet_id'], snippet.id)
+
+    def test_tag_list_queries(self):
+        """Test listing assigned tags."""
+        create_snippets(self.user, 3)
+
+        self.assertConstantQueries(TAGS_URL, 1, {'assigned_only': 1})
+
+    def test_snippet_detail_queries(self):
+        """Test retrieving a snippet with source code and tags."""
+        snippet = create_snippets(self.user, 1)
+        url = reverse('snippet:snippet-detail', args=[snippet.id])
+
+        with self.assertNumQueries(2):
+            res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['tags']), 1)
@@ -1,26 +1,37 @@
 """
 Tests for snippet APIs
 """
+import io
 import tempfile
+import time
 import os
+import shutil
+from unittest import skipUnless
+from unittest.mock import patch
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
 from rest_framework.test import APIClient
 from rest_framework import status
 
-from core.models import Snippet, Tag, SourceCode
+from core.models import HighlightJob, Snippet, Tag, SourceCode, UserStats
 
+from snippet import highlight, images, render
 from snippet.serializers import (
+    DUPLICATE_CODE_ERROR,
     SnippetSerializer,
     SnippetDetailSerializer,
 )
 
 from PIL import Image
+from pygments.formatters.img import FontNotFound, ImageFormatter
 
 SNIPPETS_URL = reverse('snippet:snippet-list')
+BULK_URL = reverse('snippet:snippet-bulk')
 
 
 def image_upload_url(snippet_id):
@@ -33,6 +44,25 @@ def detail_url(snippet_id):
     return reverse('snippet:snippet-detail', args=[snippet_id])
 
 
+def wait_url(snippet_id):
+    """Create and return a snippet wait url"""
+    return reverse('snippet:snippet-wait', args=[snippet_id])
+
+
+def render_url(snippet_id, image_format):
+    """Create and return a snippet image url"""
+    return reverse('snippet:snippet-render', args=[snippet_id, image_format])
+
+
+def png_fonts_available():
+    """Return whether PNG images can be rendered here."""
+    try:
+        ImageFormatter()
+    except (FontNotFound, OSError):
+        return False
+    return True
+
+
 def create_snippet(user, **params):
     """Create and return a sample snippet"""
     defaults = {
@@ -80,7 +110,7 @@ class PrivateSnippetApiTests(TestCase):
         snippets = Snippet.objects.all().order_by('-id')
         serializer = SnippetSerializer(snippets, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_snippet_list_limited_to_user(self):
         """Test list of snippets is limited to authenticated user."""
@@ -93,7 +123,7 @@ class PrivateSnippetApiTests(TestCase):
         snippets = Snippet.objects.filter(user=self.user)
         serializer = SnippetSerializer(snippets, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_get_snippet_detail(self):
         """Test get snippet detail."""
@@ -187,6 +217,158 @@ class PrivateSnippetApiTests(TestCase):
         snippet.refresh_from_db()
         self.assertEqual(snippet.user, self.user)
 
+    def create_highlighted(self, code="print('first')"):
+        """Create a snippet through the API and return its data."""
+        payload = {
+            'language_name': 'python',
+            'style': 'colorful',
+            'linenos': True,
+            'source_code': {'code': code},
+            'tags': [{'name': 'Python'}],
+        }
+        res = self.client.post(SNIPPETS_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return res.data
+
+    def test_update_render_input_rehighlights(self):
+        """Test changing linenos renders the snippet again."""
+        data = self.create_highlighted()
+        self.assertIn('highlighttable', data['highlighted'])
+
+        res = self.client.patch(detail_url(data['id']), {'linenos': False})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('highlighttable', res.data['highlighted'])
+        snippet = Snippet.objects.get(id=data['id'])
+        self.assertEqual(snippet.highlighted, res.data['highlighted'])
+
+    def test_update_tags_skips_highlighting(self):
+        """Test tag-only and rating-only updates do not render."""
+        data = self.create_highlighted()
+        payload = {
+            'tags': [{'name': 'Other'}],
+            'source_code': {'rating': 5},
+        }
+
+        with patch('snippet.serializers.get_highlight_cache') as cache:
+            res = self.client.patch(
+                detail_url(data['id']), payload, format='json',
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        cache.assert_not_called()
+        self.assertEqual(res.data['highlighted'], data['highlighted'])
+        self.assertEqual(res.data['source_code']['rating'], 5)
+        self.assertEqual(
+            [tag['name'] for tag in res.data['tags']], ['Other'],
+        )
+
+    def test_update_source_code_rehighlights_in_place(self):
+        """Test new code updates the source code and the highlighting."""
+        data = self.create_highlighted()
+        payload = {'source_code': {'code': "print('second')"}}
+
+        res = self.client.patch(
+            detail_url(data['id']), payload, format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['source_code']['id'],
+                         data['source_code']['id'])
+        self.assertIn('second', res.data['highlighted'])
+        self.assertEqual(SourceCode.objects.count(), 1)
+
+    def test_update_source_code_endpoint_rehighlights_snippet(self):
+        """Test editing the code of a source code renders its snippet."""
+        data = self.create_highlighted()
+        url = reverse(
+            'snippet:sourcecode-detail', args=[data['source_code']['id']],
+        )
+
+        res = self.client.patch(url, {'code': "print('edited')"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        snippet = Snippet.objects.get(id=data['id'])
+        self.assertIn('edited', snippet.highlighted)
+
+    def test_update_source_code_duplicate_code(self):
+        """Test changing code to code stored elsewhere is refused."""
+        self.create_highlighted("print('taken')")
+        data = self.create_highlighted()
+        payload = {'source_code': {'code': "print('taken')"}}
+
+        res = self.client.patch(
+            detail_url(data['id']), payload, format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('source_code', res.data)
+
+    def test_add_source_code_duplicate_code(self):
+        """Test giving a snippet code stored elsewhere is refused."""
+        self.create_highlighted("print('taken')")
+        snippet = create_snippet(user=self.user)
+        payload = {'source_code': {'code': "print('taken')"}}
+
+        res = self.client.patch(
+            detail_url(snippet.id), payload, format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.data['source_code']['code'], [DUPLICATE_CODE_ERROR],
+        )
+        snippet.refresh_from_db()
+        self.assertIsNone(snippet.source_code_id)
+
+    def test_create_snippet_duplicate_code(self):
+        """Test creating a snippet with stored code is refused."""
+        self.create_highlighted("print('taken')")
+        payload = {
+            'language_name': 'python',
+            'style': 'colorful',
+            'linenos': True,
+            'source_code': {'code': "print('taken')", 'title': 'Other'},
+        }
+
+        res = self.client.post(SNIPPETS_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.data['source_code']['code'], [DUPLICATE_CODE_ERROR],
+        )
+        self.assertEqual(Snippet.objects.filter(user=self.user).count(), 1)
+
+    def test_create_snippet_reuses_unused_source_code(self):
+        """Test a source code without a snippet is shown by a new one."""
+        source_code = SourceCode.objects.create(
+            user=self.user, code="print('kept')", title='Kept',
+            notes='', url='',
+        )
+        payload = {
+            'language_name': 'python',
+            'style': 'colorful',
+            'linenos': True,
+            'source_code': {'code': "print('kept')", 'title': 'Kept'},
+        }
+
+        res = self.client.post(SNIPPETS_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        snippet = Snippet.objects.get(id=res.data['id'])
+        self.assertEqual(snippet.source_code_id, source_code.id)
+
+    @override_settings(HIGHLIGHT_ASYNC=True)
+    def test_update_render_input_queues_async_highlight(self):
+        """Test async mode queues a changed snippet for the worker."""
+        snippet = create_snippet(user=self.user, highlighted='<pre></pre>')
+
+        res = self.client.patch(detail_url(snippet.id), {'style': 'monokai'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['highlight_status'], 'pending')
+        self.assertTrue(HighlightJob.objects.filter(snippet=snippet).exists())
+
     def test_delete_snippet(self):
         """Test deleting a snippet is successful."""
         snippet = create_snippet(user=self.user)
@@ -197,6 +379,25 @@ class PrivateSnippetApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(Snippet.objects.filter(id=snippet.id).exists())
 
+    def test_delete_snippet_updates_stats(self):
+        """Test deleting a snippet uncounts it and its source code once."""
+        payload = {
+            'language_name': 'python',
+            'source_code': {'code': 'print(1)'},
+        }
+        res = self.client.post(SNIPPETS_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        res = self.client.delete(detail_url(res.data['id']))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual(
+            (stats.snippets, stats.source_codes, stats.code_bytes),
+            (0, 0, 0),
+        )
+        self.assertFalse(SourceCode.objects.filter(user=self.user).exists())
+
     def test_delete_other_users_snippet_error(self):
         """Test trying deleting another users snippet gives error."""
         new_user = create_user(email='user2@example.com', password='test123')
@@ -403,9 +604,212 @@ class PrivateSnippetApiTests(TestCase):
         s1 = SnippetSerializer(r1)
         s2 = SnippetSerializer(r2)
         s3 = SnippetSerializer(r3)
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
+
+    @override_settings(HIGHLIGHT_ASYNC=True)
+    def test_create_snippet_async_highlight(self):
+        """Test async mode queues highlighting for the worker."""
+        payload = {
+            'language_name': 'python',
+            'style': 'colorful',
+            'linenos': False,
+            'source_code': {'code': "print('queued')"},
+        }
+        res = self.client.post(SNIPPETS_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['highlight_status'], 'pending')
+        self.assertEqual(res.data['highlighted'], '')
+        self.assertTrue(
+            HighlightJob.objects.filter(snippet__id=res.data['id']).exists()
+        )
+
+        call_command('highlight_worker', '--once', '--processes', '0')
+
+        res = self.client.get(wait_url(res.data['id']), {'timeout': 0})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['highlight_status'], 'ready')
+        self.assertIn('queued', res.data['highlighted'])
+        self.assertFalse(HighlightJob.objects.exists())
+
+    @override_settings(
+        HIGHLIGHT_WAIT_DEFAULT=0.3, HIGHLIGHT_WAIT_POLL=(0.05, 0.1),
+    )
+    def test_wait_defaults_to_a_short_poll(self):
+        """Test wait backs off and gives up after the default timeout."""
+        snippet = create_snippet(
+            user=self.user, highlight_status=Snippet.HIGHLIGHT_PENDING,
+        )
+        delays = []
+        sleep = time.sleep
+
+        def record(delay):
+            delays.append(delay)
+            sleep(delay)
+
+        with patch('snippet.views.time.sleep', side_effect=record):
+            res = self.client.get(wait_url(snippet.id))
+
+        self.assertEqual(res.data['highlight_status'], 'pending')
+        self.assertEqual(delays[:2], [0.05, 0.1])
+        self.assertLessEqual(max(delays), 0.1)
+        self.assertLess(sum(delays), 0.31)
+
+    def test_wait_returns_once_highlighted(self):
+        """Test wait returns the html as soon as the worker is done."""
+        snippet = create_snippet(
+            user=self.user, highlight_status=Snippet.HIGHLIGHT_PENDING,
+        )
+
+        def finish(delay):
+            Snippet.objects.filter(id=snippet.id).update(
+                highlighted='<pre>done</pre>',
+                highlight_status=Snippet.HIGHLIGHT_READY,
+            )
+
+        with patch('snippet.views.time.sleep', side_effect=finish) as sleep:
+            res = self.client.get(wait_url(snippet.id), {'timeout': 5})
+
+        self.assertEqual(sleep.call_count, 1)
+        self.assertEqual(res.data['highlight_status'], 'ready')
+        self.assertEqual(res.data['highlighted'], '<pre>done</pre>')
+
+    def test_highlight_worker_marks_failed(self):
+        """Test a job that cannot be rendered marks the snippet failed."""
+        snippet = create_snippet(
+            user=self.user,
+            highlight_status=Snippet.HIGHLIGHT_PENDING,
+        )
+        Snippet.objects.filter(id=snippet.id).update(language_name='nope')
+        HighlightJob.objects.create(snippet=snippet)
+        etag = self.client.get(SNIPPETS_URL)['ETag']
+
+        call_command('highlight_worker', '--once', '--processes', '0')
+
+        snippet.refresh_from_db()
+        self.assertEqual(snippet.highlight_status, Snippet.HIGHLIGHT_FAILED)
+        self.assertFalse(HighlightJob.objects.exists())
+        res = self.client.get(SNIPPETS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_create_snippet_stores_compact_html(self):
+        """Test the stored html has no page boilerplate or stylesheet."""
+        payload = {
+            'language_name': 'python',
+            'style': 'colorful',
+            'linenos': False,
+            'source_code': {'code': "print('compact')"},
+        }
+        res = self.client.post(SNIPPETS_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(
+            res.data['highlighted'].startswith('<div class="highlight">')
+        )
+        self.assertNotIn('<style', res.data['highlighted'])
+
+    def test_style_stylesheet(self):
+        """Test the style stylesheet is cacheable and supports ETags."""
+        url = reverse('snippet:style-css', args=['colorful'])
+        self.client.logout()
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'text/css')
+        self.assertIn('.highlight', res.content.decode())
+        self.assertIn('max-age', res['Cache-Control'])
+        # Every rule, line numbers included, is scoped to the snippet.
+        for rule in res.content.decode().splitlines():
+            self.assertTrue(rule.startswith('.highlight'), rule)
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_style_stylesheet_unknown_style(self):
+        """Test requesting the stylesheet of an unknown style fails."""
+        url = reverse('snippet:style-css', args=['not-a-style'])
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_create_snippet_unknown_language(self):
+        """Test creating a snippet with an unknown language fails."""
+        payload = {'language_name': 'not-a-language', 'style': 'default'}
+        res = self.client.post(SNIPPETS_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('language_name', res.data)
+
+    def test_bulk_create_snippets(self):
+        """Test creating many snippets in one request."""
+        Tag.objects.create(user=self.user, name='existing')
+        payload = {'create': [
+            {
+                'language_name': 'python',
+                'style': 'colorful',
+                'linenos': False,
+                'source_code': {'code': f'print({i})'},
+                'tags': [{'name': 'existing'}, {'name': 'bulk'}],
+            }
+            for i in range(3)
+        ]}
+        with self.assertNumQueries(16):
+            res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['errors'], [])
+        self.assertEqual(len(res.data['created']), 3)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual(
+            (stats.source_codes, stats.snippets, stats.tags), (3, 3, 2),
+        )
+        for i, snippet_id in enumerate(res.data['created']):
+            snippet = Snippet.objects.get(id=snippet_id, user=self.user)
+            self.assertEqual(snippet.source_code.code, f'print({i})')
+            self.assertIn('print', snippet.highlighted)
+            self.assertEqual(
+                sorted(tag.name for tag in snippet.tags.all()),
+                ['bulk', 'existing'],
+            )
+
+    def test_bulk_reports_item_errors(self):
+        """Test invalid items are reported and valid items are saved."""
+        SourceCode.objects.create(user=self.user, code='duplicate')
+        snippet = create_snippet(user=self.user)
+        deleted = create_snippet(user=self.user)
+        payload = {
+            'create': [
+                {'language_name': 'nope', 'source_code': {'code': 'x'}},
+                {'language_name': 'python', 'source_code': {'code': 'ok'}},
+                {'language_name': 'python',
+                 'source_code': {'code': 'duplicate'}},
+                {'language_name': 'python'},
+            ],
+            'update': [
+                {'id': snippet.id, 'style': 'vim'},
+                {'id': 0, 'style': 'vim'},
+            ],
+            'delete': [deleted.id],
+        }
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        created = res.data['created']
+        self.assertEqual(created[0], None)
+        self.assertTrue(Snippet.objects.filter(id=created[1]).exists())
+        self.assertEqual(created[2:], [None, None])
+        self.assertEqual(
+            [(e['operation'], e['index']) for e in res.data['errors']],
+            [('create', 0), ('create', 2), ('create', 3), ('update', 1)],
+        )
+        self.assertEqual(res.data['updated'], [snippet.id])
+        snippet.refresh_from_db()
+        self.assertEqual(snippet.style, 'vim')
+        self.assertEqual(res.data['deleted'], 1)
+        self.assertFalse(Snippet.objects.filter(id=deleted.id).exists())
 
 
 class ImageUploadTests(TestCase):
@@ -445,3 +849,352 @@ class ImageUploadTests(TestCase):
         res = self.client.post(url, payload, format='multipart')
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def upload(self, snippet, size=(1200, 600), image_format='PNG'):
+        """Upload a generated image to snippet and return the response."""
+        suffix = f'.{image_format.lower()}'
+        with tempfile.NamedTemporaryFile(suffix=suffix) as image_file:
+            Image.linear_gradient('L').resize(size).save(
+                image_file, format=image_format,
+            )
+            image_file.seek(0)
+            return self.client.post(
+                image_upload_url(snippet.id), {'image': image_file},
+                format='multipart',
+            )
+
+    def test_upload_image_variants(self):
+        """Test thumbnails narrower than the image are made."""
+        res = self.upload(self.snippet)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.snippet.refresh_from_db()
+        variants = self.snippet.image_variants
+        self.assertIn('320', variants)
+        self.assertIn('960', variants)
+        self.assertEqual(
+            sorted(res.data['image_variants']), sorted(variants),
+        )
+        self.assertTrue(res.data['image_variants']['320'].startswith(
+            'http://testserver/'
+        ))
+        storage = self.snippet.image.storage
+        with storage.open(variants['320']) as thumbnail:
+            self.assertEqual(Image.open(thumbnail).size, (320, 160))
+        if images.webp_enabled():
+            self.assertIn('320_webp', variants)
+            self.assertIn('webp', variants)
+
+    @override_settings(IMAGE_UPLOAD={
+        **settings.IMAGE_UPLOAD, 'THREADS': 0, 'THUMBNAIL_WIDTHS': [320],
+    })
+    def test_upload_small_image_has_no_thumbnail(self):
+        """Test images narrower than every thumbnail are kept as is."""
+        res = self.upload(self.snippet, size=(100, 50))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('320', res.data['image_variants'])
+
+    def test_upload_same_image_stored_once(self):
+        """Test identical uploads share one file named by its hash."""
+        other = create_snippet(user=self.user)
+
+        self.upload(self.snippet)
+        self.upload(other)
+
+        self.snippet.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.snippet.image.name, other.image.name)
+        self.assertEqual(
+            self.snippet.image_variants, other.image_variants,
+        )
+        self.assertRegex(
+            self.snippet.image.name, r'^uploads/snippet/[0-9a-f]{64}\.png$',
+        )
+
+    @override_settings(IMAGE_UPLOAD={
+        **settings.IMAGE_UPLOAD, 'MAX_BYTES': 100,
+    })
+    def test_upload_image_too_large(self):
+        """Test files over the size limit are refused."""
+        res = self.upload(self.snippet)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', res.data)
+
+    @override_settings(IMAGE_UPLOAD={
+        **settings.IMAGE_UPLOAD, 'MAX_WIDTH': 1000,
+    })
+    def test_upload_image_too_wide(self):
+        """Test images over the dimension limits are refused."""
+        res = self.upload(self.snippet)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', res.data)
+
+    def test_upload_image_format_refused(self):
+        """Test formats that are not accepted are refused."""
+        res = self.upload(self.snippet, image_format='BMP')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', res.data)
+
+
+class RenderImageTests(TestCase):
+    """Tests for the snippet image API."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email='user@example.com',
+            password='password123',
+        )
+        self.client.force_authenticate(self.user)
+        self.source_code = SourceCode.objects.create(
+            user=self.user,
+            code='def f(x):\n    return x * 2\n',
+        )
+        self.snippet = create_snippet(
+            user=self.user, source_code=self.source_code,
+        )
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.configure()
+
+    def configure(self, **config):
+        """Override RENDER_IMAGE for the rest of the test."""
+        override = override_settings(RENDER_IMAGE={
+            **settings.RENDER_IMAGE,
+            'DIRECTORY': self.directory,
+            'PROCESSES': 0,
+            **config,
+        })
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_render_svg(self):
+        """Test rendering a snippet as an SVG image."""
+        res = self.client.get(render_url(self.snippet.id, 'svg'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'image/svg+xml')
+        self.assertIn(b'<svg', b''.join(res.streaming_content))
+        self.assertIn('private', res['Cache-Control'])
+        self.assertIn(
+            f"max-age={settings.RENDER_IMAGE['MAX_AGE']}",
+            res['Cache-Control'],
+        )
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+
+    @patch('snippet.render.render_image', wraps=render.render_image)
+    def test_render_cached_on_disk(self, mock_render):
+        """Test an image is rendered once for the same inputs."""
+        other = create_snippet(
+            user=self.user,
+            source_code=SourceCode.objects.create(
+                user=self.user, code=self.source_code.code + '\n',
+            ),
+        )
+        first = self.client.get(render_url(self.snippet.id, 'svg'))
+        second = self.client.get(render_url(self.snippet.id, 'svg'))
+        self.client.get(render_url(other.id, 'svg'))
+
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertEqual(mock_render.call_count, 2)
+
+    def test_render_not_modified(self):
+        """Test a matching If-None-Match is answered with 304."""
+        url = render_url(self.snippet.id, 'svg')
+        etag = self.client.get(url)['ETag']
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.source_code.code = 'print(1)\n'
+        self.source_code.save()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    @skipUnless(png_fonts_available(), 'no fonts for PNG images')
+    def test_render_png(self):
+        """Test rendering a snippet as a PNG image."""
+        res = self.client.get(render_url(self.snippet.id, 'png'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'image/png')
+        self.assertTrue(
+            b''.join(res.streaming_content).startswith(b'\x89PNG')
+        )
+
+    @patch('snippet.render.ImageFormatter', side_effect=FontNotFound)
+    def test_render_png_unavailable(self, mock_formatter):
+        """Test PNG images are refused when no font is installed."""
+        res = self.client.get(render_url(self.snippet.id, 'png'))
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertNotIn('Retry-After', res)
+
+    def test_render_busy(self):
+        """Test requests past the render limit are refused."""
+        self.configure(MAX_PENDING=0)
+        res = self.client.get(render_url(self.snippet.id, 'svg'))
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res['Retry-After'], '1')
+
+    def test_render_too_long(self):
+        """Test snippets over the line limit are refused."""
+        self.configure(MAX_LINES=2)
+        self.source_code.code = 'a = 1\n' * 3
+        self.source_code.save()
+
+        res = self.client.get(render_url(self.snippet.id, 'svg'))
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_render_unknown_format(self):
+        """Test formats other than png and svg are not found."""
+        res = self.client.get(render_url(self.snippet.id, 'gif'))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_render_other_users_snippet(self):
+        """Test images of other users' snippets are not found."""
+        other_user = create_user(
+            email='other@example.com',
+            password='password123',
+        )
+        snippet = create_snippet(user=other_user)
+
+        res = self.client.get(render_url(snippet.id, 'svg'))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_render_process_pool(self):
+        """Test images are rendered on the process pool."""
+        self.configure(PROCESSES=1)
+        self.addCleanup(setattr, render, '_executor', None)
+        self.addCleanup(lambda: render._executor.shutdown())
+
+        res = self.client.get(render_url(self.snippet.id, 'svg'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn(b'<svg', b''.join(res.streaming_content))
+
+    def write_image(self, name, size, age):
+        """Store a rendered image last requested age seconds ago."""
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as image:
+            image.write(b'x' * size)
+        used = time.time() - age
+        os.utime(path, (used, used))
+        return path
+
+    def test_render_marks_image_requested(self):
+        """Test serving a stored image keeps it from being pruned."""
+        self.client.get(render_url(self.snippet.id, 'svg'))
+        path = os.path.join(self.directory, os.listdir(self.directory)[0])
+        os.utime(path, (0, 0))
+
+        self.client.get(render_url(self.snippet.id, 'svg'))
+
+        self.assertGreater(os.path.getmtime(path), time.time() - 60)
+
+    def test_prune_renders(self):
+        """Test pruning deletes unused, then least recently used images."""
+        self.write_image('expired.svg', 10, age=100)
+        self.write_image('old.svg', 10, age=50)
+        self.write_image('new.svg', 10, age=10)
+        self.write_image('partial.1234.tmp', 10, age=40)
+        out = io.StringIO()
+
+        call_command(
+            'prune_renders', '--max-age', '90', '--max-bytes', '25',
+            stdout=out,
+        )
+
+        self.assertEqual(
+            sorted(os.listdir(self.directory)),
+            ['new.svg', 'partial.1234.tmp'],
+        )
+        self.assertIn('Deleted 2 rendered images (20 bytes)', out.getvalue())
+
+
+class HighlightFormatTests(TestCase):
+    """Tests for the alternate formats of snippet details."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            email='user@example.com',
+            password='password123',
+        )
+        self.client.force_authenticate(self.user)
+        self.source_code = SourceCode.objects.create(
+            user=self.user,
+            code='def f(x):\n    return x * 2\n' * 20,
+        )
+        self.snippet = create_snippet(
+            user=self.user, source_code=self.source_code,
+        )
+        highlight.get_highlight_cache().clear()
+
+    def test_tokens_format(self):
+        """Test the token format is smaller than the html."""
+        url = detail_url(self.snippet.id)
+        html = self.client.get(url, {'highlight': 'fragment'})
+        res = self.client.get(url, {'highlight': 'tokens'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['highlighted'][0], ['k', 'def'])
+        self.assertLess(len(res.content), len(html.content) / 2)
+
+    def test_ansi_accept(self):
+        """Test Accept: text/x-ansi returns terminal output alone."""
+        res = self.client.get(
+            detail_url(self.snippet.id), HTTP_ACCEPT='text/x-ansi',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['Content-Type'].startswith('text/x-ansi'))
+        self.assertIn(b'\x1b[', res.content)
+        self.assertIn('Accept', res['Vary'])
+
+    def test_latex_format_parameter(self):
+        """Test ?format=latex returns a LaTeX document."""
+        res = self.client.get(detail_url(self.snippet.id), {'format': 'latex'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn(b'\\documentclass', res.content)
+
+    def test_format_rendered_once(self):
+        """Test a format is rendered on first request only."""
+        url = detail_url(self.snippet.id)
+        with patch('snippet.highlight.render_format',
+                   wraps=highlight.render_format) as mock_render:
+            self.client.get(url)
+            self.assertEqual(mock_render.call_count, 0)
+            self.client.get(url, {'highlight': 'ansi'})
+            self.client.get(url, {'highlight': 'ansi'})
+
+        self.assertEqual(mock_render.call_count, 1)
+        self.snippet.refresh_from_db()
+        self.assertNotIn('\x1b[', self.snippet.highlighted)
+
+    def test_format_etags_differ(self):
+        """Test each format has its own ETag."""
+        url = detail_url(self.snippet.id)
+        html = self.client.get(url)
+        tokens = self.client.get(url, {'highlight': 'tokens'})
+
+        self.assertNotEqual(html['ETag'], tokens['ETag'])
+        res = self.client.get(
+            url, {'highlight': 'tokens'}, HTTP_IF_NONE_MATCH=html['ETag'],
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_unknown_format(self):
+        """Test unknown formats are refused."""
+        res = self.client.get(detail_url(self.snippet.id), {'highlight': 'x'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('highlight', res.data)
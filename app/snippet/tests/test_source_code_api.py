@@ -2,17 +2,22 @@
 Test for the Source API.
 """
 from django.contrib.auth import get_user_model
+from unittest.mock import patch
+
 from django.urls import reverse
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import SourceCode
+from snippet import search
 from snippet.serializers import SourceCodeBriefSerializer
 
 
 SOURCE_CODE_URL = reverse('snippet:sourcecode-list')
+SEARCH_URL = reverse('snippet:sourcecode-search')
+LOOKUP_URL = reverse('snippet:sourcecode-lookup')
 
 
 def detail_url(source_code_id):
@@ -75,7 +80,7 @@ class PrivateSourceApiTests(TestCase):
         source_codes = SourceCode.objects.all().order_by('-id')
         serializer = SourceCodeBriefSerializer(source_codes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_sources_limited_to_user(self):
         """
@@ -88,9 +93,9 @@ class PrivateSourceApiTests(TestCase):
         res = self.client.get(SOURCE_CODE_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['title'], source_code_1.title)
-        self.assertEqual(res.data[0]['id'], source_code_1.id)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['title'], source_code_1.title)
+        self.assertEqual(res.data['results'][0]['id'], source_code_1.id)
 
     def test_update_source_code(self):
         """
@@ -118,3 +123,70 @@ class PrivateSourceApiTests(TestCase):
 
         sc = SourceCode.objects.filter(user=self.user)
         self.assertFalse(sc.exists())
+
+    def test_search_source_codes(self):
+        """Test searching source codes ranks and highlights matches."""
+        title_match = create_source_code(
+            user=self.user, title='parse json files', code='code 1',
+        )
+        code_match = create_source_code(
+            user=self.user, title='loader', code='data = json.loads(raw)',
+        )
+        create_source_code(user=self.user, title='other', code='code 3')
+        create_source_code(
+            user=create_user(email='user2@example.com'),
+            title='json for user2', code='code 4',
+        )
+
+        res = self.client.get(SEARCH_URL, {'q': 'json'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [item['id'] for item in res.data]
+        self.assertEqual(ids, [title_match.id, code_match.id])
+        self.assertIn('<mark>json</mark>', res.data[0]['fragments']['title'])
+        self.assertIn('<mark>json</mark>', res.data[1]['fragments']['code'])
+
+    @patch('snippet.search.MAX_CACHED_INDEXES', 1)
+    def test_search_indexes_bounded(self):
+        """Test the fallback search keeps a bounded number of indexes."""
+        other_user = create_user(email='user2@example.com')
+        search.get_inverted_index(self.user)
+        search.get_inverted_index(other_user)
+
+        self.assertEqual(list(search._indexes), [other_user.id])
+
+    def test_search_requires_query(self):
+        """Test searching without a query fails."""
+        res = self.client.get(SEARCH_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_lookup_source_code_by_hash(self):
+        """Test looking up an existing source code by its sha256."""
+        sc = create_source_code(user=self.user, code='print("dedupe")')
+        other = create_source_code(
+            user=create_user(email='user2@example.com'),
+            code='print("other user")',
+        )
+
+        res = self.client.get(LOOKUP_URL, {'sha256': sc.code_sha256})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {
+            'exists': True, 'id': sc.id, 'snippet_id': None,
+        })
+
+        res = self.client.get(LOOKUP_URL, {'sha256': other.code_sha256})
+        self.assertEqual(res.data, {'exists': False})
+
+        res = self.client.get(LOOKUP_URL, {'sha256': 'abc'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SearchHelperTests(SimpleTestCase):
+    """Tests for the search helpers."""
+
+    def test_like_pattern_escapes_wildcards(self):
+        """Test LIKE wildcards in a query match literally."""
+        self.assertEqual(
+            search.like_pattern('a_b%c\\d'), '%a\\_b\\%c\\\\d%',
+        )
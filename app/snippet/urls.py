@@ -2,6 +2,7 @@
 URL maping for snippet app.
 """
 
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from snippet import views
@@ -15,5 +16,25 @@ router.register('source_codes', views.SourceCodeViewSet)
 app_name = 'snippet'
 
 urlpatterns = [
-    path('', include(router.urls)),
+    path(
+        'styles/<str:style>.css',
+        views.style_stylesheet,
+        name='style-css',
+    ),
+    path('export/', views.ExportView.as_view(), name='export'),
+    path('import/', views.ImportView.as_view(), name='import'),
 ]
+
+if settings.ASYNC_VIEWS:
+    from snippet.async_views import urlpatterns as async_urlpatterns
+    urlpatterns += async_urlpatterns
+else:
+    urlpatterns.append(path(
+        'snippets/<int:pk>/render.<str:image_format>',
+        views.SnippetViewSet.as_view(
+            {'get': 'render_image'}, basename='snippet', detail=True,
+        ),
+        name='snippet-render',
+    ))
+
+urlpatterns.append(path('', include(router.urls)))
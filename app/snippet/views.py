@@ -1,6 +1,9 @@
 """
 Views for the snippet APIs
 """
+import re
+import time
+
 from drf_spectacular.utils import (
     extend_schema_view,
     extend_schema,
@@ -9,18 +12,55 @@ from drf_spectacular.utils import (
 )
 
 from rest_framework import (
-    authentication,
     permissions,
     viewsets,
     mixins,
     status
 )
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+
+from pygments.util import ClassNotFound
 
 from core.models import Snippet, Tag, SourceCode
-from snippet import serializers
-from django.http import Http404
+from snippet import images, render, serializers
+from snippet.conditional import (
+    ConditionalMixin,
+    make_etag,
+    snippet_version,
+    source_code_version,
+)
+from snippet.export import (
+    NDJSONRenderer,
+    iter_gzip,
+    iter_ndjson,
+    iter_snippet_records,
+)
+from snippet.highlight import ALTERNATE_FORMATS, style_css
+from snippet.importer import import_archive
+from snippet.listcache import CachedListMixin
+from snippet.pagination import KeysetPagination
+from snippet.renderers import ANSIRenderer, LaTeXRenderer
+from snippet.search import search_source_codes
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import F
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseNotModified,
+    StreamingHttpResponse,
+)
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import quote_etag
 
 
 @extend_schema_view(
@@ -34,12 +74,73 @@ from django.http import Http404
         ]
     )
 )
-class SnippetViewSet(viewsets.ModelViewSet):
+class SnippetViewSet(CachedListMixin, ConditionalMixin,
+                     viewsets.ModelViewSet):
     """View for manage snippet APIs."""
     serializer_class = serializers.SnippetDetailSerializer
     queryset = Snippet.objects.all()
-    authentication_classes = [authentication.TokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    ordering = ('-id',)
+
+    def get_object_version(self, instance):
+        etag, last_modified = snippet_version(
+            instance, self.request.accepted_renderer.format,
+        )
+        highlight_format = self.get_highlight_format()
+        if highlight_format:
+            etag = make_etag(etag, highlight_format)
+        return etag, last_modified
+
+    def get_renderers(self):
+        """Offer the terminal and LaTeX renderers on snippet details."""
+        renderers = super().get_renderers()
+        if self.action == 'retrieve':
+            renderers += [ANSIRenderer(), LaTeXRenderer()]
+        return renderers
+
+    def get_highlight_format(self):
+        """
+        Return the format the highlighted code of a snippet detail is
+        requested in, or None for the stored html.
+        """
+        if self.action != 'retrieve':
+            return None
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        if isinstance(renderer, (ANSIRenderer, LaTeXRenderer)):
+            return renderer.format
+        highlight_format = self.request.query_params.get('highlight')
+        if highlight_format is None or highlight_format == 'html':
+            return None
+        if highlight_format not in ALTERNATE_FORMATS:
+            raise ValidationError({'highlight': [
+                'Expected one of: ' + ', '.join(
+                    ('html',) + ALTERNATE_FORMATS
+                ) + '.'
+            ]})
+        return highlight_format
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['highlight_format'] = self.get_highlight_format()
+        return context
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'highlight',
+                OpenApiTypes.STR,
+                enum=('html',) + ALTERNATE_FORMATS,
+                description='Format of the highlighted code, rendered on '
+                            'first request. Accept: text/x-ansi or '
+                            'application/x-latex return it alone.',
+            ),
+        ]
+    )
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        patch_vary_headers(response, ['Accept'])
+        return response
 
     def _params_to_ints(self, qs):
         """Convert a list of strings to integers."""
@@ -53,6 +154,17 @@ class SnippetViewSet(viewsets.ModelViewSet):
             tag_ids = self._params_to_ints(tags)
             queryset = queryset.filter(tags__id__in=tag_ids)
 
+        if self.action == 'list':
+            # The source code brief reads the snippet id from the reverse
+            # one-to-one cache filled by select_related.
+            queryset = queryset.select_related(
+                'source_code'
+            ).defer('highlighted')
+        else:
+            queryset = queryset.select_related(
+                'source_code'
+            ).prefetch_related('tags')
+
         return queryset.filter(
             user=self.request.user
         ).order_by('-id').distinct()
@@ -63,9 +175,71 @@ class SnippetViewSet(viewsets.ModelViewSet):
             return serializers.SnippetSerializer
         elif self.action == 'upload_image':
             return serializers.SnippetImageSerializer
+        elif self.action == 'bulk':
+            return serializers.SnippetBulkSerializer
 
         return self.serializer_class
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'timeout',
+                OpenApiTypes.FLOAT,
+                description=(
+                    'Seconds to wait for highlighting to finish, at most '
+                    'HIGHLIGHT_WAIT_MAX (5)'
+                ),
+            ),
+        ]
+    )
+    @action(methods=['GET'], detail=True, url_path='wait')
+    def wait(self, request, pk=None):
+        """Wait until the snippet is no longer pending highlighting."""
+        snippet = self.get_object()
+        try:
+            timeout = float(request.query_params.get(
+                'timeout', settings.HIGHLIGHT_WAIT_DEFAULT,
+            ))
+        except ValueError:
+            timeout = 0
+        timeout = max(0, min(timeout, settings.HIGHLIGHT_WAIT_MAX))
+        deadline = time.monotonic() + timeout
+        delay, max_delay = settings.HIGHLIGHT_WAIT_POLL
+
+        # Poll the status alone, backing off, and read the html once done.
+        statuses = Snippet.objects.filter(id=snippet.id).values_list(
+            'highlight_status', flat=True,
+        )
+        highlight_status = snippet.highlight_status
+        while highlight_status == Snippet.HIGHLIGHT_PENDING:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, max_delay)
+            highlight_status = statuses.first()
+            if highlight_status is None:
+                raise Http404('No Snippet matches the given query.')
+        if highlight_status != snippet.highlight_status:
+            snippet.refresh_from_db(
+                fields=['highlighted', 'highlight_status']
+            )
+
+        serializer = self.get_serializer(snippet)
+        return Response(serializer.data)
+
+    @extend_schema(
+        request=serializers.SnippetBulkSerializer,
+        responses=OpenApiTypes.OBJECT,
+    )
+    @action(methods=['POST'], detail=False, url_path='bulk')
+    def bulk(self, request):
+        """Create, update and delete many snippets in one request."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = serializer.save()
+        return Response(result, status=status.HTTP_200_OK)
+
     # def perform_create(self, serializer):
     #     """Create a new Snippet."""
     #     if serializer.is_valid():
@@ -75,6 +249,10 @@ class SnippetViewSet(viewsets.ModelViewSet):
     def upload_image(self, request, pk=None):
         """Upload an image to snippet."""
         snippet = self.get_object()
+        # Parse the upload into a temporary file, never into memory.
+        request._request.upload_handlers = [
+            images.ImageUploadHandler(request._request),
+        ]
         serializer = self.get_serializer(snippet, data=request.data)
 
         if serializer.is_valid():
@@ -84,14 +262,68 @@ class SnippetViewSet(viewsets.ModelViewSet):
         return Response(serializer.errors,
                         status=status.HTTP_400_BAD_REQUEST)
 
+    @extend_schema(
+        operation_id='snippet_snippets_render_retrieve',
+        responses={
+            (200, 'image/png'): OpenApiTypes.BINARY,
+            (200, 'image/svg+xml'): OpenApiTypes.STR,
+        },
+    )
+    def render_image(self, request, pk=None, image_format=None):
+        """Serve a PNG or SVG image of the highlighted snippet."""
+        if image_format not in render.IMAGE_FORMATS:
+            raise Http404('Unknown image format')
+        snippet = self.get_object()
+        args = render.render_args(snippet, image_format)
+        max_lines = settings.RENDER_IMAGE['MAX_LINES']
+        if args[0].count('\n') >= max_lines:
+            return Response(
+                {'detail': f'Images are limited to {max_lines} lines.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        name = render.render_name(*args)
+        etag = quote_etag(name)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            try:
+                storage = render.get_or_render(name, args)
+            except render.RenderBusy:
+                return Response(
+                    {'detail': 'Too many images are being rendered.'},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    headers={'Retry-After': '1'},
+                )
+            except render.RenderUnavailable as exc:
+                return Response(
+                    {'detail': str(exc)},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                )
+            response = FileResponse(
+                storage.open(name, 'rb'),
+                content_type=render.IMAGE_FORMATS[image_format],
+                filename=f'snippet-{snippet.id}.{image_format}',
+            )
+        response['ETag'] = etag
+        # The image of a snippet changes when it is edited, so clients
+        # revalidate with the ETag once MAX_AGE is over.
+        patch_cache_control(
+            response, private=True,
+            max_age=settings.RENDER_IMAGE['MAX_AGE'],
+        )
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
     def destroy(self, request, *args, **kwargs):
         """Delete snippet and source code related to snippet."""
         try:
             instance = self.get_object()
-            if instance.source_code:
-                SourceCode.objects.get(
-                    id=instance.source_code.id).delete()
-            self.perform_destroy(instance)
+            # Deleting the source code cascades to the snippet, deleting
+            # both separately would uncount the snippet twice.
+            if instance.source_code_id:
+                SourceCode.objects.get(id=instance.source_code_id).delete()
+            else:
+                self.perform_destroy(instance)
         except Http404:
             pass
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -103,14 +335,16 @@ class BaseSnippetAttrViewSet(mixins.RetrieveModelMixin,
                              mixins.ListModelMixin,
                              viewsets.GenericViewSet):
     """Base viewset for recipe attributes."""
-    authentication_classes = [authentication.TokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    ordering = ('-id',)
 
 
-class TagViewSet(BaseSnippetAttrViewSet):
+class TagViewSet(CachedListMixin, BaseSnippetAttrViewSet):
     """Manage tags in the database."""
     serializer_class = serializers.TagSerializer
     queryset = Tag.objects.all()
+    ordering = ('-name', '-id')
 
     def get_queryset(self):
         """Filter queryset to authenticated user."""
@@ -124,20 +358,180 @@ class TagViewSet(BaseSnippetAttrViewSet):
 
         return queryset.filter(
             user=self.request.user
-        ).order_by('-name').distinct()
+        ).order_by(*self.ordering).distinct()
 
 
-class SourceCodeViewSet(BaseSnippetAttrViewSet):
+class SourceCodeViewSet(CachedListMixin, ConditionalMixin,
+                        BaseSnippetAttrViewSet):
     """Manage sources in the database."""
     serializer_class = serializers.SourceCodeSerializer
     queryset = SourceCode.objects.all()
 
+    def get_object_version(self, instance):
+        return source_code_version(
+            instance, self.request.accepted_renderer.format,
+        )
+
     def get_queryset(self):
         """Retrieve source code for authenticated user."""
-        return self.queryset.filter(user=self.request.user).order_by('-id')
+        queryset = self.queryset
+        if self.action == 'list':
+            queryset = queryset.annotate(snippet_pk=F('snippet__id'))
+
+        return queryset.filter(user=self.request.user).order_by('-id')
 
     def get_serializer_class(self):
         """Return the serializer class for request."""
         if self.action == 'list':
             return serializers.SourceCodeBriefSerializer
+        elif self.action == 'search':
+            return serializers.SourceCodeSearchSerializer
         return self.serializer_class
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'q',
+                OpenApiTypes.STR,
+                description='Words to search in title, author, notes, code',
+            ),
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                description='Largest number of results to return',
+            ),
+        ]
+    )
+    @action(methods=['GET'], detail=False, url_path='search')
+    def search(self, request):
+        """Search the source codes of the authenticated user."""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {'q': ['This query parameter is required.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            limit = 20
+        limit = max(1, min(limit, settings.MAX_PAGE_SIZE))
+
+        results = search_source_codes(request.user, query, limit)
+        serializer = self.get_serializer(results, many=True)
+        return Response(serializer.data)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'sha256',
+                OpenApiTypes.STR,
+                description='Hex sha256 of the source code to look up',
+            ),
+        ]
+    )
+    @action(methods=['GET'], detail=False, url_path='lookup')
+    def lookup(self, request):
+        """Check if the authenticated user already stored a code."""
+        code_sha256 = request.query_params.get('sha256', '').lower()
+        if not re.fullmatch(r'[0-9a-f]{64}', code_sha256):
+            return Response(
+                {'sha256': ['A 64 character hex digest is required.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        source_code = self.get_queryset().filter(
+            code_sha256=code_sha256
+        ).annotate(snippet_pk=F('snippet__id')).values('id', 'snippet_pk')
+        source_code = source_code.first()
+        if source_code is None:
+            return Response({'exists': False})
+        return Response({
+            'exists': True,
+            'id': source_code['id'],
+            'snippet_id': source_code['snippet_pk'],
+        })
+
+
+@extend_schema_view(
+    get=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'compression',
+                OpenApiTypes.STR,
+                enum=['gzip'],
+                description='Compress the export with gzip',
+            ),
+        ],
+        responses={(200, 'application/x-ndjson'): OpenApiTypes.STR},
+    )
+)
+class ExportView(APIView):
+    """Stream every snippet of the authenticated user as NDJSON."""
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [NDJSONRenderer]
+
+    def get(self, request, format=None):
+        # Django 3.2 iterates streamed responses on the event loop under
+        # ASGI, where the queries of the export generator are refused.
+        if isinstance(request._request, ASGIRequest):
+            return Response(
+                {'detail': 'Exports are only streamed by WSGI workers, use '
+                           'SERVER_MODE=wsgi or manage.py export_snippets.'},
+                status=status.HTTP_501_NOT_IMPLEMENTED,
+            )
+        stream = iter_ndjson(iter_snippet_records(request.user))
+        filename = 'snippets.ndjson'
+        if request.query_params.get('compression') == 'gzip':
+            stream = iter_gzip(stream)
+            filename += '.gz'
+            content_type = 'application/gzip'
+        else:
+            content_type = NDJSONRenderer.media_type
+
+        response = StreamingHttpResponse(stream, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class ImportView(APIView):
+    """Import snippets from an NDJSON or zip archive."""
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    @extend_schema(
+        request={
+            'multipart/form-data': {
+                'type': 'object',
+                'properties': {'file': {'type': 'string', 'format': 'binary'}},
+            },
+        },
+        responses=OpenApiTypes.OBJECT,
+    )
+    def post(self, request, format=None):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {'file': ['This field is required.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        summary = import_archive(request.user, upload.file)
+        return Response(summary, status=status.HTTP_200_OK)
+
+
+def style_stylesheet(request, style):
+    """Serve the stylesheet used by compact highlighted snippets."""
+    try:
+        css, etag = style_css(style)
+    except ClassNotFound:
+        raise Http404('Unknown style')
+
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(css, content_type='text/css')
+    response['ETag'] = etag
+    patch_cache_control(
+        response, public=True, max_age=settings.HIGHLIGHT_CSS_MAX_AGE
+    )
+    return response
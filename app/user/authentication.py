@@ -0,0 +1,57 @@
+"""
+Token authentication backed by the cache.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+def get_cache():
+    return caches[settings.AUTH_TOKEN_CACHE['CACHE_ALIAS']]
+
+
+def token_cache_key(key):
+    """Return the cache key of a token, without the token in clear."""
+    return 'auth-token:' + hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def user_cache_key(user_id):
+    return f'auth-token:user:{user_id}'
+
+
+def invalidate_token(key):
+    """Drop a cached token."""
+    get_cache().delete(token_cache_key(key))
+
+
+def invalidate_user(user_id):
+    """Drop the cached token of a user."""
+    cache = get_cache()
+    key = cache.get(user_cache_key(user_id))
+    if key is not None:
+        cache.delete_many([token_cache_key(key), user_cache_key(user_id)])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication keeping recently used tokens and their users in the
+    cache for AUTH_TOKEN_CACHE['TIMEOUT'] seconds. Deleting a token or
+    saving its user drops the entry at once (see user.signals).
+    """
+
+    def authenticate_credentials(self, key):
+        cache = get_cache()
+        cache_key = token_cache_key(key)
+        user = cache.get(cache_key)
+        if user is not None:
+            return user, Token(key=key, user=user)
+
+        user, token = super().authenticate_credentials(key)
+        cache.set_many(
+            {cache_key: user, user_cache_key(user.id): key},
+            settings.AUTH_TOKEN_CACHE['TIMEOUT'],
+        )
+        return user, token
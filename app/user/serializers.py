@@ -10,6 +10,8 @@ from django.contrib.auth import (
 from django.utils.translation import gettext as _
 from rest_framework import serializers
 
+from core.models import UserStats
+
 
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for the user object."""
@@ -34,6 +36,26 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
+class UserStatsSerializer(serializers.ModelSerializer):
+    """Serializer for the row counts of a user."""
+
+    class Meta:
+        model = UserStats
+        fields = ['source_codes', 'snippets', 'tags', 'code_bytes']
+        read_only_fields = fields
+
+
+class ManageUserSerializer(UserSerializer):
+    """Serializer for the authenticated user, with their stats."""
+    stats = serializers.SerializerMethodField()
+
+    class Meta(UserSerializer.Meta):
+        fields = UserSerializer.Meta.fields + ['stats']
+
+    def get_stats(self, obj):
+        return UserStatsSerializer(UserStats.for_user(obj.id)).data
+
+
 class AuthTokenSerializer(serializers.Serializer):
     """Serializer for the user auth token."""
     email = serializers.EmailField()
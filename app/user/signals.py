@@ -0,0 +1,21 @@
+"""
+Signal handlers keeping the token authentication cache current.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from user.authentication import invalidate_token, invalidate_user
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Stop accepting a deleted token from the cache."""
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_saved_user(sender, instance, **kwargs):
+    """Reload a changed or deactivated user on the next request."""
+    invalidate_user(instance.id)
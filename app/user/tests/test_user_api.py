@@ -7,6 +7,8 @@ from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from core.models import SourceCode, Tag
+
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
 ME_URL = reverse('user:me')
@@ -125,6 +127,26 @@ class PrivateUserApiTests(TestCase):
         self.assertEqual(res.data, {
             'name': self.user.name,
             'email': self.user.email,
+            'stats': {
+                'source_codes': 0,
+                'snippets': 0,
+                'tags': 0,
+                'code_bytes': 0,
+            },
+        })
+
+    def test_retrieve_profile_stats(self):
+        """Test the profile shows the counts of the user's rows."""
+        SourceCode.objects.create(user=self.user, code='print(1)')
+        Tag.objects.create(user=self.user, name='tag')
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['stats'], {
+            'source_codes': 1,
+            'snippets': 0,
+            'tags': 1,
+            'code_bytes': 8,
         })
 
     def test_post_me_not_allowed(self):
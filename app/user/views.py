@@ -4,13 +4,14 @@ Views for the user API.
 from rest_framework.response import Response
 from django.contrib.auth import get_user_model
 from rest_framework import (
-    generics, authentication, permissions,
+    generics, permissions,
     mixins, viewsets
 )
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
 
 from user.serializers import (
+    ManageUserSerializer,
     UserSerializer,
     AuthTokenSerializer,
 )
@@ -29,8 +30,7 @@ class CreateTokenView(ObtainAuthToken):
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """Manage the authenticated user."""
-    serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    serializer_class = ManageUserSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
@@ -46,7 +46,6 @@ class ListUsersView(mixins.ListModelMixin, viewsets.GenericViewSet):
     * Only admin users are able to access this view.
     """
 
-    authentication_classes = [authentication.TokenAuthentication]
     permission_classes = [permissions.IsAdminUser]
     serializer_class = UserSerializer
     queryset = get_user_model().objects.all()
@@ -0,0 +1,10 @@
+#!/bin/sh
+# Entry point of the production image, see docker-compose-deploy.yml.
+
+set -e
+
+python manage.py wait_for_db
+python manage.py collectstatic --noinput
+python manage.py migrate
+
+exec gunicorn --config gunicorn.conf.py